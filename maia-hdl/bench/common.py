@@ -0,0 +1,200 @@
+#
+# Copyright (C) 2024 Daniel Estevez <daniel@destevez.net>
+#
+# This file is part of maia-sdr
+#
+# SPDX-License-Identifier: MIT
+#
+
+import amaranth
+import numpy as np
+
+import argparse
+import datetime
+import fnmatch
+import json
+import os
+import platform
+
+
+class Metric:
+    """Description of a benchmark metric
+
+    Parameters
+    ----------
+    name : str
+        Name of the metric, used as key in the results.
+    unit : str
+        Unit, used when printing the results.
+    higher_is_better : bool
+        Whether higher values of the metric are better.
+    noise : float
+        Absolute differences with respect to the baseline up to this value
+        are not considered regressions. This avoids reporting changes in
+        small timings, which are dominated by noise.
+    """
+    def __init__(self, name, unit='', higher_is_better=False, noise=0.0):
+        self.name = name
+        self.unit = unit
+        self.higher_is_better = higher_is_better
+        self.noise = noise
+
+    @property
+    def title(self):
+        return f'{self.name} ({self.unit})' if self.unit else self.name
+
+    def change(self, value, baseline):
+        """Relative change of a value with respect to the baseline
+
+        The change is positive when the value is worse than the baseline.
+        """
+        if not baseline:
+            return 0.0
+        change = (value - baseline) / baseline
+        return -change if self.higher_is_better else change
+
+
+def argument_parser(description, default_baseline):
+    """Argument parser for the benchmark runners"""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        'select', nargs='*',
+        help='Names or shell-style patterns of the benchmarks to run '
+        '(default: all)')
+    parser.add_argument(
+        '--baseline', default=default_baseline,
+        help='Baseline file to compare against [default=%(default)r]')
+    parser.add_argument(
+        '--save-baseline', action='store_true',
+        help='Store the results in the baseline file instead of comparing '
+        'against it')
+    parser.add_argument(
+        '--tolerance', type=float, default=25.0,
+        help='Maximum degradation of a metric with respect to the baseline, '
+        'in percent [default=%(default)r]')
+    parser.add_argument(
+        '--output',
+        help='Write the results to this JSON file')
+    parser.add_argument(
+        '--list', action='store_true',
+        help='List the benchmarks and exit')
+    return parser
+
+
+def select(names, patterns):
+    """Selects names using shell-style patterns
+
+    All the names are selected if ``patterns`` is empty. A ``ValueError`` is
+    raised if a pattern does not match any name.
+    """
+    if not patterns:
+        return list(names)
+    for pattern in patterns:
+        if not any(fnmatch.fnmatchcase(name, pattern) for name in names):
+            raise ValueError(f'no benchmark matches {pattern!r}')
+    return [name for name in names
+            if any(fnmatch.fnmatchcase(name, p) for p in patterns)]
+
+
+def environment():
+    """Description of the environment where the benchmarks run"""
+    return {
+        'timestamp': datetime.datetime.now(
+            datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'amaranth': amaranth.__version__,
+        'numpy': np.__version__,
+    }
+
+
+def print_results(results, metrics, baseline=None):
+    """Prints a table of results, with the changes relative to a baseline"""
+    width = max((len(name) for name in results), default=0)
+    header = ''.join(f'  {m.title:>20}' for m in metrics)
+    print(f'{"benchmark":<{width}}{header}')
+    for name, values in results.items():
+        line = f'{name:<{width}}'
+        for m in metrics:
+            value = values[m.name]
+            cell = f'{value:.4g}'
+            base = (baseline or {}).get(name, {}).get(m.name)
+            if base is not None:
+                cell += f' ({m.change(value, base):+.0%})'
+            line += f'  {cell:>20}'
+        print(line)
+
+
+def regressions(results, metrics, baseline, tolerance):
+    """Lists the metrics that are worse than the baseline
+
+    Parameters
+    ----------
+    results : Dict[str, Dict[str, float]]
+        Results of each benchmark.
+    metrics : List[Metric]
+        Metrics to compare.
+    baseline : Dict[str, Dict[str, float]]
+        Baseline results. Benchmarks that are not in the baseline are not
+        compared.
+    tolerance : float
+        Maximum degradation, in percent.
+
+    Returns
+    -------
+    List[str]
+        Description of each metric that has degraded more than the
+        tolerance.
+    """
+    found = []
+    for name, values in results.items():
+        if name not in baseline:
+            continue
+        for m in metrics:
+            base = baseline[name].get(m.name)
+            if base is None or abs(values[m.name] - base) <= m.noise:
+                continue
+            change = m.change(values[m.name], base)
+            if change > tolerance / 100:
+                found.append(
+                    f'{name}: {m.name} {values[m.name]:.4g} vs baseline '
+                    f'{base:.4g} ({change:+.0%} worse)')
+    return found
+
+
+def finish(args, results, metrics):
+    """Stores or compares the results according to the arguments
+
+    Returns the exit code of the benchmark runner, which is 1 if there are
+    regressions with respect to the baseline.
+    """
+    document = {'environment': environment(), 'results': results}
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=2)
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)['results']
+        baseline.update(results)
+        document['results'] = baseline
+        os.makedirs(os.path.dirname(args.baseline) or '.', exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(document, f, indent=2)
+        print_results(results, metrics)
+        print(f'baseline stored in {args.baseline}')
+        return 0
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+    print_results(results, metrics, baseline)
+    if baseline is None:
+        print(f'no baseline found in {args.baseline}')
+        return 0
+    found = regressions(results, metrics, baseline, args.tolerance)
+    for r in found:
+        print(f'REGRESSION {r}')
+    return 1 if found else 0
@@ -0,0 +1,175 @@
+#
+# Copyright (C) 2024 Daniel Estevez <daniel@destevez.net>
+#
+# This file is part of maia-sdr
+#
+# SPDX-License-Identifier: MIT
+#
+
+"""Elaboration and conversion benchmarks
+
+This measures, for several modules over their parameter spaces, the time
+taken to elaborate the design, to convert it to RTLIL and to convert it to
+Verilog (with ``amaranth.back.verilog.convert``, which also elaborates the
+design and converts it to RTLIL before running Yosys), the size of the
+netlist (cells and wires in the RTLIL) and the peak memory use. Usage (from
+the maia-hdl directory)::
+
+    python3 -m bench.elaboration [-j JOBS] [--save-baseline] [select ...]
+
+The results are compared against a stored baseline (see ``--baseline``),
+and the exit code is 1 if some metric is worse than the baseline by more
+than the tolerance. Each configuration runs in a fresh process, so that
+the peak memory use can be measured and that the configurations do not
+affect each other.
+"""
+
+from amaranth import *
+from amaranth.back import rtlil, verilog
+from amaranth.hdl import Fragment
+
+import concurrent.futures
+import functools
+import multiprocessing
+import re
+import resource
+import sys
+import time
+
+from maia_hdl.fft import FFT
+from maia_hdl.fir import FIR4DSP
+from maia_hdl.maia_sdr import MaiaSDR
+from maia_hdl.pluto_platform import PlutoPlatform
+from maia_hdl.spectrum_integrator import SpectrumIntegrator
+
+from .common import Metric, argument_parser, finish, select
+
+METRICS = [
+    Metric('elaborate_s', 's', noise=0.05),
+    Metric('rtlil_s', 's', noise=0.05),
+    Metric('verilog_s', 's', noise=0.05),
+    Metric('cells'),
+    Metric('wires'),
+    Metric('peak_rss_mib', 'MiB', noise=8),
+]
+
+
+def fft(order_log2, radix):
+    return FFT(12, order_log2, radix)
+
+
+def fir4dsp(len_log2):
+    return FIR4DSP(len_log2=len_log2)
+
+
+def spectrum_integrator(fft_order_log2):
+    return SpectrumIntegrator('clk3x', 22, 18, 10, fft_order_log2)
+
+
+def maia_sdr():
+    top = MaiaSDR()
+    return top, top.ports()
+
+
+def configurations():
+    """Benchmark configurations
+
+    Returns a dictionary that maps the name of each configuration to a
+    function that constructs the top-level elaboratable. The function
+    returns either the elaboratable, in which case all its signal
+    attributes are used as ports, or a tuple of the elaboratable and its
+    ports.
+    """
+    configs = {}
+    for radix in [2, 4, 'R22']:
+        for order_log2 in range(6, 15):
+            if radix != 2 and order_log2 % 2:
+                # Radix-4 FFTs need an even order
+                continue
+            configs[f'fft_radix{radix}_order{order_log2}'] = functools.partial(
+                fft, order_log2, radix)
+    for len_log2 in range(5, 11):
+        configs[f'fir4dsp_len{len_log2}'] = functools.partial(
+            fir4dsp, len_log2)
+    for fft_order_log2 in range(6, 15):
+        configs[f'spectrum_integrator_order{fft_order_log2}'] = (
+            functools.partial(spectrum_integrator, fft_order_log2))
+    configs['maia_sdr'] = maia_sdr
+    return configs
+
+
+def construct_top(construct):
+    """Constructs the top-level elaboratable and its ports"""
+    top = construct()
+    if isinstance(top, tuple):
+        return top
+    return top, [v for v in vars(top).values() if isinstance(v, Signal)]
+
+
+def measure(construct):
+    """Measures the elaboration and conversion of a configuration"""
+    top, ports = construct_top(construct)
+    platform = PlutoPlatform()
+
+    start = time.perf_counter()
+    fragment = Fragment.get(top, platform)
+    elaborated = time.perf_counter()
+    rtlil_text, _ = rtlil.convert_fragment(
+        fragment, ports, 'top', emit_src=False)
+    converted = time.perf_counter()
+    # The Verilog conversion starts again from a new elaboratable, since
+    # there is no public API to run only the Yosys step.
+    top, ports = construct_top(construct)
+    verilog_start = time.perf_counter()
+    verilog.convert(top, platform=platform, ports=ports, emit_src=False)
+    finished = time.perf_counter()
+
+    return {
+        'elaborate_s': elaborated - start,
+        'rtlil_s': converted - elaborated,
+        'verilog_s': finished - verilog_start,
+        'cells': len(re.findall(r'^\s*cell ', rtlil_text, re.MULTILINE)),
+        'wires': len(re.findall(r'^\s*wire ', rtlil_text, re.MULTILINE)),
+        # ru_maxrss is given in KiB on Linux
+        'peak_rss_mib': (
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024),
+    }
+
+
+def measure_in_new_process(construct):
+    """Runs measure in a new process
+
+    A new process is used for each configuration (which requires the spawn
+    start method), so that its peak memory use can be measured.
+    """
+    with concurrent.futures.ProcessPoolExecutor(
+            1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(measure, construct).result()
+
+
+def main():
+    parser = argument_parser('Elaboration and conversion benchmarks',
+                             'bench/baselines/elaboration.json')
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=1,
+        help='Number of worker processes. Running several benchmarks in '
+        'parallel affects the timings [default=%(default)r]')
+    args = parser.parse_args()
+    configs = configurations()
+    if args.list:
+        print('\n'.join(configs))
+        return 0
+    names = select(configs, args.select)
+
+    with concurrent.futures.ThreadPoolExecutor(args.jobs) as pool:
+        futures = {name: pool.submit(measure_in_new_process, configs[name])
+                   for name in names}
+        results = {}
+        for name, future in futures.items():
+            results[name] = future.result()
+            print(f'finished {name}', flush=True)
+    return finish(args, results, METRICS)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
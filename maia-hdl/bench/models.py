@@ -0,0 +1,284 @@
+#
+# Copyright (C) 2024 Daniel Estevez <daniel@destevez.net>
+#
+# This file is part of maia-sdr
+#
+# SPDX-License-Identifier: MIT
+#
+
+"""Golden model benchmarks
+
+This measures the throughput, in input samples per second, of the
+``model()`` methods of the ``maia_hdl`` modules at realistic sizes (the
+4096-point FFT of the spectrometer, 256-tap FIR filters, and spectrum
+integrations of up to 1023 FFTs). Usage (from the maia-hdl directory)::
+
+    python3 -m bench.models [--repeat N] [--save-baseline] [select ...]
+
+Each benchmark is run several times and the best time is used. The results
+are compared against a stored baseline (see ``--baseline``), and the exit
+code is 1 if the throughput of some model has dropped with respect to the
+baseline by more than the tolerance.
+"""
+
+from amaranth.hdl import UnusedElaboratable
+import numpy as np
+
+import functools
+import sys
+import time
+import warnings
+
+from maia_hdl.cpwr import Cpwr, CpwrPeak
+from maia_hdl.ddc import DDC
+from maia_hdl.fft import R2SDF, R4SDF, R22SDF, Twiddle, TwiddleI, Window, FFT
+from maia_hdl.fir import FIR4DSP, FIR2DSP, FIRDecimator3Stage
+from maia_hdl.floating_point import IQToFloatingPoint, MakeCommonExponent
+from maia_hdl.mixer import Mixer
+from maia_hdl.spectrometer import Spectrometer
+from maia_hdl.spectrum_integrator import SpectrumIntegrator
+
+from .common import Metric, argument_parser, finish, select
+
+METRICS = [
+    Metric('samples_per_s', 'samples/s', higher_is_better=True),
+]
+
+# Number of input samples used for the models that do not have a natural
+# input size.
+NUM_SAMPLES = 2**18
+
+# Register values of the DDC decimator, as used in test_ddc.
+DDC_REGISTERS = {
+    'decimation1': 5, 'decimation2': 3, 'decimation3': 2,
+    'operations_minus_one1': 3, 'operations_minus_one2': 5,
+    'operations_minus_one3': 9,
+    'odd_operations1': True, 'odd_operations3': False,
+    'bypass2': False, 'bypass3': False,
+}
+
+_rng = np.random.default_rng(0)
+
+
+def random_iq(width, size):
+    """Random IQ samples of a given width"""
+    return tuple(_rng.integers(-2**(width - 1), 2**(width - 1), size=size)
+                 for _ in range(2))
+
+
+def random_taps(width, size):
+    """Random FIR taps of a given width"""
+    return _rng.integers(-2**(width - 1), 2**(width - 1), size=size)
+
+
+# Each of the following functions constructs a model benchmark. They return
+# a function without arguments that runs the model and the number of input
+# samples that it processes.
+
+def fft_stage(stage, width=16):
+    re_in, im_in = random_iq(width, NUM_SAMPLES)
+    return functools.partial(stage.model, re_in, im_in), NUM_SAMPLES
+
+
+def fft(radix, window=None, cmult3x=False):
+    order_log2 = 12
+    width = 16
+    kwargs = {}
+    if window is not None:
+        kwargs.update(window=window, domain_2x='clk2x')
+    if cmult3x:
+        kwargs.update(cmult3x=True, domain_3x='clk3x')
+    dut = FFT(width, order_log2, radix, **kwargs)
+    re_in, im_in = random_iq(width, NUM_SAMPLES)
+    return functools.partial(dut.model, re_in, im_in), NUM_SAMPLES
+
+
+def fir4dsp(num_taps, decimation):
+    dut = FIR4DSP(len_log2=8)
+    taps = random_taps(dut.coeff_width, num_taps)
+    re_in, im_in = random_iq(dut.iw, NUM_SAMPLES)
+    return (functools.partial(dut.model, taps, decimation, re_in, im_in),
+            NUM_SAMPLES)
+
+
+def fir2dsp(num_taps, decimation):
+    dut = FIR2DSP(len_log2=8)
+    taps = random_taps(dut.coeff_width, num_taps)
+    re_in, im_in = random_iq(dut.iw, NUM_SAMPLES)
+    return (functools.partial(dut.model, taps, decimation, re_in, im_in),
+            NUM_SAMPLES)
+
+
+def fir_decimator_3stage():
+    dut = FIRDecimator3Stage()
+    coeffs = random_taps(dut.coeff_width, 768)
+    re_in, im_in = random_iq(dut.iw, NUM_SAMPLES)
+    return (functools.partial(dut.model, coeffs, re_in, im_in,
+                              **DDC_REGISTERS),
+            NUM_SAMPLES)
+
+
+def ddc():
+    dut = DDC('clk3x')
+    frequency = round(-0.123 * 2**dut.nco_width)
+    coeffs = random_taps(dut.coeff_width, 768)
+    re_in, im_in = random_iq(dut.iw, NUM_SAMPLES)
+    return (functools.partial(dut.model, frequency, coeffs, re_in, im_in,
+                              **DDC_REGISTERS),
+            NUM_SAMPLES)
+
+
+def mixer():
+    width = 16
+    dut = Mixer('clk3x', width)
+    frequency = round(0.01 * 2**dut.nco_width)
+    re_in, im_in = random_iq(width, NUM_SAMPLES)
+    return functools.partial(dut.model, frequency, re_in, im_in), NUM_SAMPLES
+
+
+def iq_to_floating_point():
+    # Configuration used in the spectrum integrator
+    dut = IQToFloatingPoint(22, 18)
+    re_in, im_in = random_iq(22, NUM_SAMPLES)
+    return functools.partial(dut.model, re_in, im_in), NUM_SAMPLES
+
+
+def make_common_exponent():
+    # Configuration used in the spectrum integrator
+    a_width, b_width, max_exponent = 18, 47, 4
+    dut = MakeCommonExponent(a_width, b_width, 3, max_exponent,
+                             a_complex=True, b_power=True, b_signed=False)
+    re_a, im_a = random_iq(a_width, NUM_SAMPLES)
+    b = _rng.integers(0, 2**b_width, size=NUM_SAMPLES)
+    exp_a, exp_b = (_rng.integers(0, max_exponent + 1, size=NUM_SAMPLES)
+                    for _ in range(2))
+    return (functools.partial(dut.model, re_a, im_a, exp_a,
+                              b, np.zeros_like(b), exp_b),
+            NUM_SAMPLES)
+
+
+def cpwr():
+    width, add_width = 16, 24
+    dut = Cpwr(width=width, add_width=add_width, add_shift=8)
+    re_in, im_in = random_iq(width, NUM_SAMPLES)
+    add_in = random_taps(add_width, NUM_SAMPLES)
+    return (functools.partial(dut.model, re_in, im_in, add_in),
+            NUM_SAMPLES)
+
+
+def cpwr_peak(peak_detect):
+    # Configuration used in the spectrum integrator
+    width, real_width = 18, 47
+    dut = CpwrPeak('clk3x', width, real_width)
+    re_in, im_in = random_iq(width, NUM_SAMPLES)
+    real_in = _rng.integers(0, 2**(real_width - 1), size=NUM_SAMPLES)
+    return (functools.partial(dut.model, re_in, im_in, real_in, peak_detect),
+            NUM_SAMPLES)
+
+
+def spectrum_integrator(nint, peak_detect):
+    # Configuration used in the spectrometer
+    width = 22
+    dut = SpectrumIntegrator('clk3x', width, 18, 10, 12)
+    # One complete integration, plus one more for short integrations
+    size = max(nint, 2) * 2**12
+    re_in, im_in = random_iq(width, size)
+    return (functools.partial(dut.model, nint, re_in, im_in, peak_detect),
+            size)
+
+
+def spectrometer(nint, peak_detect):
+    dut = Spectrometer(0x1000_0000, 5)
+    size = max(nint, 2) * 2**dut.fft_order_log2
+    re_in, im_in = random_iq(dut.width_in, size)
+    return (functools.partial(dut.model, nint, re_in, im_in, peak_detect),
+            size)
+
+
+def configurations():
+    """Benchmark configurations
+
+    Returns a dictionary that maps the name of each benchmark to a function
+    that constructs it.
+    """
+    configs = {
+        # Butterflies and twiddles of the first stage of a 4096-point FFT
+        'r2sdf': lambda: fft_stage(R2SDF(12, 16)),
+        'r4sdf': lambda: fft_stage(R4SDF(6, 16)),
+        'r22sdf': lambda: fft_stage(R22SDF(6, 16)),
+        'twiddle_radix2': lambda: fft_stage(Twiddle(12, 1, 17, 18)),
+        'twiddle_radix4': lambda: fft_stage(Twiddle(6, 2, 18, 18)),
+        'twiddle_r22': lambda: fft_stage(
+            Twiddle(6, 2, 18, 18, r22_mode=True)),
+        'twiddle_i': lambda: fft_stage(TwiddleI(17)),
+        'window': lambda: fft_stage(Window('clk2x', 12, 16, 9)),
+    }
+    for radix in [2, 4, 'R22']:
+        configs[f'fft_radix{radix}'] = functools.partial(fft, radix)
+    # FFT configuration used in the spectrometer
+    configs['fft_radixR22_window_cmult3x'] = functools.partial(
+        fft, 'R22', window='blackmanharris', cmult3x=True)
+    for decimation in [2, 8, 32]:
+        configs[f'fir4dsp_256taps_dec{decimation}'] = functools.partial(
+            fir4dsp, 256, decimation)
+        configs[f'fir2dsp_256taps_dec{decimation}'] = functools.partial(
+            fir2dsp, 256, decimation)
+    configs['fir_decimator_3stage'] = fir_decimator_3stage
+    configs['ddc'] = ddc
+    configs['mixer'] = mixer
+    configs['iq_to_floating_point'] = iq_to_floating_point
+    configs['make_common_exponent'] = make_common_exponent
+    configs['cpwr'] = cpwr
+    modes = {'average': False, 'peak': True}
+    for mode, peak_detect in modes.items():
+        configs[f'cpwr_peak_{mode}'] = functools.partial(
+            cpwr_peak, peak_detect)
+    for mode, peak_detect in modes.items():
+        for nint in [1, 64, 1023]:
+            configs[f'spectrum_integrator_nint{nint}_{mode}'] = (
+                functools.partial(spectrum_integrator, nint, peak_detect))
+    for mode, peak_detect in modes.items():
+        configs[f'spectrometer_nint64_{mode}'] = functools.partial(
+            spectrometer, 64, peak_detect)
+    return configs
+
+
+def measure(construct, repeat):
+    """Measures the throughput of a model benchmark"""
+    run, samples = construct()
+    # Run once to warm up caches (such as those of the twiddle factors and
+    # window coefficients)
+    run()
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        elapsed.append(time.perf_counter() - start)
+    return {'samples_per_s': samples / min(elapsed)}
+
+
+def main():
+    parser = argument_parser('Golden model benchmarks',
+                             'bench/baselines/models.json')
+    parser.add_argument(
+        '--repeat', type=int, default=5,
+        help='Number of timed runs of each benchmark (the best is used) '
+        '[default=%(default)r]')
+    args = parser.parse_args()
+    configs = configurations()
+    if args.list:
+        print('\n'.join(configs))
+        return 0
+    names = select(configs, args.select)
+
+    # The models are used without elaborating the modules.
+    warnings.simplefilter('ignore', UnusedElaboratable)
+    results = {}
+    for name in names:
+        results[name] = measure(configs[name], args.repeat)
+        print(f'finished {name}', flush=True)
+    return finish(args, results, METRICS)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
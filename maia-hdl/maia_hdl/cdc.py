@@ -11,6 +11,8 @@ import amaranth.back.verilog
 from amaranth.lib.cdc import FFSynchronizer, PulseSynchronizer
 
 from .fifo import AsyncFifo18_36
+from .verilog_cache import (
+    VerilogVariant, argument_parser, generate_variants)
 
 
 class RegisterCDC(Elaboratable):
@@ -227,31 +229,58 @@ class RxIQCDC(Elaboratable):
         return m
 
 
-def gen_verilog_register():
+def verilog_variants():
+    """Variants of the CDC modules for which Verilog code is generated"""
+    return [
+        VerilogVariant(
+            'register_cdc', _gen_verilog_register,
+            key={'name': 'register_cdc', 'i_domain': 'sync',
+                 'o_domain': 'register', 'address_width': 4},
+            modules=[__name__]),
+        VerilogVariant(
+            'rxiq_cdc', _gen_verilog_rxiq,
+            key={'name': 'rxiq_cdc', 'i_domain': 'sync',
+                 'o_domain': 'internal', 'width': 18},
+            modules=[__name__]),
+    ]
+
+
+def gen_verilog(select=None, jobs=None, cache=True):
+    return generate_variants(
+        verilog_variants(), select=select, jobs=jobs, cache=cache)
+
+
+def gen_verilog_register(cache=True):
+    return gen_verilog(['register_cdc'], jobs=1, cache=cache)
+
+
+def gen_verilog_rxiq(cache=True):
+    return gen_verilog(['rxiq_cdc'], jobs=1, cache=cache)
+
+
+def _gen_verilog_register():
     m = Module()
     register = ClockDomain()
     m.domains += register
     m.submodules.cdc = cdc = RegisterCDC('sync', 'register', 4)
-    with open('register_cdc.v', 'w') as f:
-        f.write(amaranth.back.verilog.convert(
-            m, ports=cdc.ports() + [register.clk, register.rst],
-            emit_src=False))
+    return amaranth.back.verilog.convert(
+        m, ports=cdc.ports() + [register.clk, register.rst],
+        emit_src=False)
 
 
-def gen_verilog_rxiq():
+def _gen_verilog_rxiq():
     m = Module()
     internal = ClockDomain()
     m.domains += internal
     m.submodules.cdc = cdc = RxIQCDC('sync', 'internal', 18)
-    with open('rxiq_cdc.v', 'w') as f:
-        f.write(amaranth.back.verilog.convert(
-            m, ports=[
-                cdc.re_in, cdc.im_in, cdc.reset, cdc.strobe_out,
-                cdc.re_out, cdc.im_out, internal.clk, internal.rst,
-            ],
-            emit_src=False))
+    return amaranth.back.verilog.convert(
+        m, ports=[
+            cdc.re_in, cdc.im_in, cdc.reset, cdc.strobe_out,
+            cdc.re_out, cdc.im_out, internal.clk, internal.rst,
+        ],
+        emit_src=False)
 
 
 if __name__ == '__main__':
-    gen_verilog_register()
-    gen_verilog_rxiq()
+    args = argument_parser(variants=True).parse_args()
+    gen_verilog(args.variants, args.jobs, args.cache)
@@ -20,6 +20,23 @@ class MaiaSDRConfig:
         # spectrometer
         self.spectrometer_address = 0x1a00_0000
         self.spectrometer_buffers = 8
+        # computing the average and peak power at the same time doubles the
+        # size of the spectrometer DMA buffers
+        self.spectrometer_dual = False
+        # converting the spectra to 16-bit log-power in the FPGA needs an
+        # additional BRAM buffer
+        self.spectrometer_log_power = False
+        # log2 of the maximum number of adjacent spectrometer bins that can be
+        # pooled (0 disables pooling, which needs an additional BRAM buffer)
+        self.spectrometer_pooling_log2_max = 0
+        # log2 of the minimum FFT size that can be selected at runtime (None
+        # fixes the FFT size to 4096, which avoids the logic needed to bypass
+        # the first FFT stages)
+        self.spectrometer_fft_order_log2_min = None
+        # log2 of the maximum overlap factor of the spectrometer FFTs (0
+        # disables overlapping, which needs an additional BRAM buffer and
+        # delays the input samples)
+        self.spectrometer_overlap_log2_max = 0
 
         # IQ recorder
         self.recorder_address_range = (0x0100_0000, 0x1a00_0000)
@@ -28,5 +45,9 @@ class MaiaSDRConfig:
         assert self.platform >= 0 and self.platform < 256
         assert self.spectrometer_buffers > 0
         assert self.spectrometer_buffers.bit_count() == 1
+        assert 0 <= self.spectrometer_pooling_log2_max <= 4
+        assert (self.spectrometer_fft_order_log2_min is None
+                or 4 <= self.spectrometer_fft_order_log2_min <= 12)
+        assert 0 <= self.spectrometer_overlap_log2_max <= 2
         assert self.recorder_address_range[0] < self.recorder_address_range[1]
         # TODO: check that spectrometer and recorder buffers do not overlap
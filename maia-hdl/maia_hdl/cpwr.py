@@ -9,8 +9,10 @@
 from amaranth import *
 import amaranth.cli
 from amaranth.vendor import XilinxPlatform
+import numpy as np
 
 from .pluto_platform import PlutoPlatform
+from .util import model_dtype
 
 
 class Cpwr(Elaboratable):
@@ -88,6 +90,9 @@ class Cpwr(Elaboratable):
         return self.re_delay + 3
 
     def model(self, re_in, im_in, add_in):
+        dtype = model_dtype(self.outw + self.truncate)
+        re_in, im_in, add_in = (
+            np.asarray(x, dtype) for x in [re_in, im_in, add_in])
         return (
             re_in**2 + im_in**2 + (add_in << self.add_shift)
             ) >> self.truncate
@@ -218,6 +223,9 @@ class CpwrPeak(Elaboratable):
         return 3
 
     def model(self, re_in, im_in, real_in, peak_detect):
+        dtype = model_dtype(self.outw + self.truncate)
+        re_in, im_in, real_in = (
+            np.asarray(x, dtype) for x in [re_in, im_in, real_in])
         pwr = re_in**2 + im_in**2
         real = real_in << self.real_shift
         out = (pwr if peak_detect else pwr + real) >> self.truncate
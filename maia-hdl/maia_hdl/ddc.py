@@ -10,7 +10,7 @@ from amaranth import *
 import amaranth.cli
 
 from .buffer import SkidBuffer
-from .fir import FIRDecimator3Stage
+from .fir import FIRDecimator3Stage, FIRDecimator3StageModel
 from .mixer import Mixer
 
 
@@ -145,11 +145,24 @@ class DDC(Elaboratable):
         self.im_out = Signal(signed(self.ow[-1]), reset_less=True)
         self.strobe_out = Signal()
 
+        self.mixer = Mixer(self._3x, self.iw, nco_width=self.nco_width)
+        self.decimator = FIRDecimator3Stage(
+            in_width=self.iw, out_width=self.ow,
+            coeff_width=self.coeff_width, decim_width=self.decim_width,
+            oper_width=self.oper_width, macc_trunc=self.macc_trunc)
+
+    def model(self, frequency, coeffs, re_in, im_in, **registers):
+        """Model the DDC.
+
+        See ``DDCModel`` for the meaning of the parameters.
+        """
+        return DDCModel(
+            self, frequency, coeffs, **registers).process(re_in, im_in)
+
     def elaborate(self, platform):
         m = Module()
 
-        m.submodules.mixer = mixer = Mixer(
-            self._3x, self.iw, nco_width=self.nco_width)
+        m.submodules.mixer = mixer = self.mixer
 
         m.d.comb += [
             mixer.common_edge.eq(self.common_edge),
@@ -160,11 +173,7 @@ class DDC(Elaboratable):
         ]
 
         clk3x_renamer = DomainRenamer({'sync': self._3x})
-        m.submodules.decimator = decimator = clk3x_renamer(
-            FIRDecimator3Stage(
-                in_width=self.iw, out_width=self.ow,
-                coeff_width=self.coeff_width, decim_width=self.decim_width,
-                oper_width=self.oper_width, macc_trunc=self.macc_trunc))
+        m.submodules.decimator = decimator = clk3x_renamer(self.decimator)
         for port in ['coeff_waddr', 'coeff_wren', 'coeff_wdata', 'decimation1',
                      'decimation2', 'decimation3', 'bypass2', 'bypass3',
                      'operations_minus_one1', 'operations_minus_one2',
@@ -203,6 +212,90 @@ class DDC(Elaboratable):
         return m
 
 
+class DDCModel:
+    """Streaming model of a DDC
+
+    This class models a ``DDC`` configured with the given register values,
+    over an input that is supplied in chunks. The mixer phase and the state
+    of the FIR decimator are kept between calls to ``process``. Only the
+    input samples that the DDC reads (those for which ``enable_input`` and
+    ``strobe_in`` are asserted) should be supplied.
+
+    After a reset, the mixer of the DDC outputs zeros for the first 2 input
+    samples, because its lookup table pipeline is not loaded yet, and its
+    pipeline delays the samples by ``mixer.delay``. Besides, the decimation
+    phase of the decimator differs from that of the model (see
+    ``FIRDecimator3StageModel``). The outputs of the DDC are equal to those
+    of the model when the first 2 input samples are dropped and
+    ``input_offset`` zeros are supplied to the decimator of the model
+    before the input, as in ``model.decimator.process(zeros, zeros)``. The
+    NCO phase of the DDC is zero for its input sample of index 2, which is
+    the first sample supplied to the model. If the zeros are not supplied,
+    the outputs of the model can only be equal to those of the DDC (with a
+    suitable alignment of the input) after the first ``warmup`` outputs,
+    which depend on the samples before the input.
+
+    Parameters
+    ----------
+    ddc : DDC
+        DDC to model.
+    frequency : int
+        Value of the ``frequency`` input of the DDC.
+    coeffs : List[int]
+        Contents of the FIR coefficient address space. The element
+        ``coeffs[n]`` is the value written to ``coeff_waddr = n``.
+    **registers
+        Values of the remaining control inputs of the DDC (``decimation1``,
+        ``bypass2``, ``operations_minus_one3``, etc.). See
+        ``FIRDecimator3StageModel``.
+    """
+    def __init__(self, ddc, frequency, coeffs, **registers):
+        self.ddc = ddc
+        self.frequency = frequency
+        self.decimator = FIRDecimator3StageModel(
+            ddc.decimator, coeffs, **registers)
+        self.reset()
+
+    @property
+    def shard_alignment(self):
+        return self.decimator.shard_alignment
+
+    @property
+    def shard_history(self):
+        return self.decimator.shard_history
+
+    @property
+    def input_offset(self):
+        """Number of zeros to supply to the decimator to match the DDC"""
+        return self.decimator.input_offset + self.ddc.mixer.delay + 2
+
+    @property
+    def warmup(self):
+        """Number of outputs that depend on the history before the input"""
+        return self.decimator.warmup
+
+    def reset(self, offset=0):
+        """Reset the mixer phase and the state of the decimator
+
+        The mixer phase is set to the value that it has for the input sample
+        of index ``offset``.
+        """
+        self.phase = offset * self.frequency % 2**self.ddc.nco_width
+        self.decimator.reset()
+
+    def process(self, re_in, im_in):
+        """Process a chunk of input samples
+
+        Returns the real and imaginary parts of the output samples that
+        can be computed after this chunk.
+        """
+        re, im = self.ddc.mixer.model(
+            self.frequency, re_in, im_in, phase=self.phase)
+        self.phase = ((self.phase + len(re_in) * self.frequency)
+                      % 2**self.ddc.nco_width)
+        return self.decimator.process(re, im)
+
+
 if __name__ == '__main__':
     ddc = DDC('clk3x')
     amaranth.cli.main(
@@ -12,6 +12,8 @@ import amaranth.back.verilog
 from math import log2
 
 from . import axi
+from .verilog_cache import (
+    VerilogVariant, argument_parser, generate_variants)
 
 
 class DmaBRAMWrite(Elaboratable):
@@ -26,7 +28,9 @@ class DmaBRAMWrite(Elaboratable):
         that the BRAM is read, it is written to a different buffer in a
         ring-buffer.
 
-        The write address to use is hardcoded at synthesis time.
+        The write address to use is hardcoded at synthesis time. Each buffer
+        has a size of ``2**bram_awidth`` words, but the number of words that
+        are transferred can be reduced at runtime with the ``length`` input.
 
         Parameters
         ----------
@@ -56,6 +60,11 @@ class DmaBRAMWrite(Elaboratable):
             behaviour to pulse this signal while the module is busy.
         busy : Signal(), out
             This signal is asserted while the DMA transfer is in progress.
+        length : Signal(bram_awidth + 1), in
+            Number of words to transfer, starting by BRAM address 0. It must
+            be a non-zero multiple of the burst length (16 words) and at most
+            ``2**bram_awidth``. It is latched when ``start`` is pulsed. By
+            default, the whole BRAM is transferred.
         last_buffer : Signal(num_buffers_log2), out
             Contains the buffer index of the buffer that was transferred
             previously.
@@ -81,6 +90,7 @@ class DmaBRAMWrite(Elaboratable):
             axi.AxiVersion.AXI3, name=name)
         self.start = Signal()
         self.busy = Signal()
+        self.length = Signal(bram_awidth + 1, init=2**bram_awidth)
         self.last_buffer = Signal(num_buffers_log2, init=-1)
         # BRAM ports
         self.bram_latency = bram_latency
@@ -90,7 +100,7 @@ class DmaBRAMWrite(Elaboratable):
 
     def ports(self):
         return self.axi.ports() + [
-            self.start, self.busy, self.last_buffer,
+            self.start, self.busy, self.length, self.last_buffer,
             self.raddr, self.rdata, self.ren]
 
     def elaborate(self, platform):
@@ -99,18 +109,36 @@ class DmaBRAMWrite(Elaboratable):
         # 16-word burst
         burst_len_log2 = 4
 
+        length = Signal.like(self.length)
+        num_bursts = length[burst_len_log2:]
+        with m.If(self.start):
+            m.d.sync += length.eq(self.length)
+
         # Addresses are generated independently of writes, since we know all
-        # the addresses we will use beforehand.
+        # the addresses we will use beforehand. All the addresses of a
+        # transfer are issued as soon as the transfer starts.
         assert len(self.raddr) > burst_len_log2
-        axi_addr_counter = Signal(
-            self.num_buffers_log2 + len(self.raddr) - burst_len_log2)
-        m.d.comb += self.axi.awaddr.eq(
-            Cat(axi_addr_counter
-                << (burst_len_log2 + self.bytes_per_word_log2),
-                Const(self.base_address >> self.address_shift,
-                      self.axi_awidth - self.address_shift)))
+        axi_addr_burst = Signal(len(self.raddr) - burst_len_log2)
+        axi_addr_burst_next = Signal(len(axi_addr_burst) + 1)
+        axi_addr_buffer = Signal(self.num_buffers_log2)
+        m.d.comb += [
+            axi_addr_burst_next.eq(axi_addr_burst + 1),
+            self.axi.awaddr.eq(
+                Cat(Const(0, burst_len_log2 + self.bytes_per_word_log2),
+                    axi_addr_burst, axi_addr_buffer,
+                    Const(self.base_address >> self.address_shift,
+                          self.axi_awidth - self.address_shift))),
+        ]
         with m.If(self.axi.aw_handshake()):
-            m.d.sync += axi_addr_counter.eq(axi_addr_counter + 1)
+            m.d.sync += axi_addr_burst.eq(axi_addr_burst_next)
+            with m.If(axi_addr_burst_next == num_bursts):
+                m.d.sync += self.axi.awvalid.eq(0)
+        with m.If(self.start):
+            m.d.sync += [
+                axi_addr_burst.eq(0),
+                axi_addr_buffer.eq(self.last_buffer + 1),
+                self.axi.awvalid.eq(1),
+            ]
 
         # Beat counter to determine the end of bursts
         beat_counter = Signal(burst_len_log2)
@@ -119,7 +147,7 @@ class DmaBRAMWrite(Elaboratable):
         m.d.comb += beat_counter_next.eq(beat_counter + 1)
 
         raddr_next = Signal(len(self.raddr) + 1)
-        last_bram_addr = raddr_next[-1]
+        last_bram_addr = raddr_next == length
         m.d.comb += raddr_next.eq(self.raddr + 1)
 
         with m.If(self.ren):
@@ -140,10 +168,7 @@ class DmaBRAMWrite(Elaboratable):
             self.axi.wlast.eq(last_beat),
         ]
 
-        m.d.sync += [
-            self.axi.bready.eq(1),
-            self.axi.awvalid.eq(1),
-        ]
+        m.d.sync += self.axi.bready.eq(1)
 
         start_del = Signal(self.bram_latency)
         last_bram_addr_del = Signal(self.bram_latency)
@@ -157,7 +182,7 @@ class DmaBRAMWrite(Elaboratable):
 
         bvalid_counter = Signal(len(self.raddr) - burst_len_log2)
         bvalid_counter_next = Signal(len(bvalid_counter) + 1)
-        last_bvalid = bvalid_counter_next[-1]
+        last_bvalid = bvalid_counter_next == num_bursts
         m.d.comb += bvalid_counter_next.eq(bvalid_counter + 1)
         # We use bvalid instead of b_handshake() here and below because bready
         # is always asserted except when in reset.
@@ -165,7 +190,10 @@ class DmaBRAMWrite(Elaboratable):
             m.d.sync += bvalid_counter.eq(bvalid_counter_next)
 
         with m.If(self.start):
-            m.d.sync += self.busy.eq(1)
+            m.d.sync += [
+                self.busy.eq(1),
+                bvalid_counter.eq(0),
+            ]
         with m.If(last_bvalid & self.axi.bvalid):
             m.d.sync += [
                 self.busy.eq(0),
@@ -372,24 +400,45 @@ class DmaStreamWrite(Elaboratable):
         return m
 
 
-def gen_verilog():
-    with open('dma.v', 'w') as f:
-        m = DmaBRAMWrite(0x08000000, 6, 12)
-        f.write(
-            amaranth.back.verilog.convert(
-                m,
-                name='dma_bram_write',
-                ports=m.ports(),
-                emit_src=False))
-    with open('dma_stream.v', 'w') as f:
-        m = DmaStreamWrite(0x03000000, 0x1a000000)
-        f.write(
-            amaranth.back.verilog.convert(
-                m,
-                name='dma_stream_write',
-                ports=m.ports(),
-                emit_src=False))
+def verilog_variants():
+    """Variants of the DMA modules for which Verilog code is generated"""
+    return [
+        VerilogVariant(
+            'dma', _gen_verilog_bram_write,
+            key={'name': 'dma_bram_write', 'base_address': 0x08000000,
+                 'num_buffers_log2': 6, 'bram_awidth': 12},
+            modules=[__name__]),
+        VerilogVariant(
+            'dma_stream', _gen_verilog_stream_write,
+            key={'name': 'dma_stream_write', 'start_address': 0x03000000,
+                 'end_address': 0x1a000000},
+            modules=[__name__]),
+    ]
+
+
+def gen_verilog(select=None, jobs=None, cache=True):
+    return generate_variants(
+        verilog_variants(), select=select, jobs=jobs, cache=cache)
+
+
+def _gen_verilog_bram_write():
+    m = DmaBRAMWrite(0x08000000, 6, 12)
+    return amaranth.back.verilog.convert(
+        m,
+        name='dma_bram_write',
+        ports=m.ports(),
+        emit_src=False)
+
+
+def _gen_verilog_stream_write():
+    m = DmaStreamWrite(0x03000000, 0x1a000000)
+    return amaranth.back.verilog.convert(
+        m,
+        name='dma_stream_write',
+        ports=m.ports(),
+        emit_src=False)
 
 
 if __name__ == '__main__':
-    gen_verilog()
+    args = argument_parser(variants=True).parse_args()
+    gen_verilog(args.variants, args.jobs, args.cache)
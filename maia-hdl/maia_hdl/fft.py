@@ -12,12 +12,101 @@ import amaranth.back.verilog
 import numpy as np
 import scipy.signal
 
+import functools
 import operator
 
 from .cmult import Cmult, Cmult3x
 from .mult2x import Mult2x
 from .pluto_platform import PlutoPlatform
-from .util import clamp_nbits
+from .util import model_dtype
+from .verilog_cache import (
+    VerilogVariant, argument_parser, generate_variants)
+
+
+# The twiddle factor and window tables are cached, since they are needed
+# each time that a module is elaborated or modelled, and several modules
+# often share the same table.
+
+@functools.lru_cache(maxsize=64)
+def _twiddles_table(order, radix_log2, scale_clog2, r22_mode):
+    # See Twiddle for the definition of the twiddle factors
+    j = np.array(
+        range(2**radix_log2)
+        if not r22_mode
+        else [0, 2, 1, 3])
+    k = np.arange(2**(radix_log2*(order-1)))
+    twiddle_complex = np.exp(
+        -1j*np.pi*j[:, np.newaxis]*k/2**(radix_log2*order-1)).ravel()
+    twiddle_scale = 1 << scale_clog2
+    tables = tuple(
+        np.round(twiddle_scale * x).astype('int')
+        for x in [twiddle_complex.real, twiddle_complex.imag])
+    for table in tables:
+        table.flags.writeable = False
+    return tables
+
+
+@functools.lru_cache(maxsize=64)
+def _window_table(window, order_log2, coeff_width):
+    # We use fftbins=False to get a symmetric window. Even though we want
+    # the window for an FFT, we prefer a symmetric window because this
+    # allows us to store only the left half of the window.
+    w = scipy.signal.get_window(window, 2**order_log2, fftbins=False)
+    if np.any(w < 0):
+        raise ValueError(
+            'windows with negative coefficients not supported')
+    scale = 2**coeff_width - 1
+    table = np.round(scale * w).astype('int')
+    table.flags.writeable = False
+    return table
+
+
+def _model_stages(stages, vlen, re_in, im_in):
+    # Runs the models of several FFT stages in sequence. The input is copied
+    # to a buffer that is processed in place by each stage. The dtype of this
+    # buffer is chosen according to the widest stage. Each stage can use two
+    # scratch buffers with the same shape as the input.
+    dtype = model_dtype(max(stage.model_width for stage in stages))
+    re, im = (np.array(x, dtype).reshape(-1, vlen)
+              for x in [re_in, im_in])
+    scratch = [np.empty_like(re) for _ in range(2)]
+    for stage in stages:
+        stage._model_inplace(re, im, scratch)
+    return re.ravel(), im.ravel()
+
+
+# np.negative() is avoided in the in-place models, because some NumPy
+# versions give wrong results with strided integer outputs. np.subtract(0, x)
+# is used instead.
+
+
+def _butterfly_inplace(a, b, scratch):
+    # a, b = a + b, a - b
+    np.subtract(a, b, out=scratch)
+    np.add(a, b, out=a)
+    np.copyto(b, scratch)
+
+
+def _truncate_inplace(x, truncate, width):
+    # Equivalent to x = clamp_nbits(x >> truncate, width)
+    offset = 2**(width - 1)
+    np.right_shift(x, truncate, out=x)
+    np.add(x, offset, out=x)
+    np.remainder(x, 2**width, out=x)
+    np.subtract(x, offset, out=x)
+
+
+class _ModelShift:
+    # Left shift of the samples, used in the model of an FFT that bypasses
+    # its first stages to place its input in the MSBs of the first butterfly
+    # that is used.
+    def __init__(self, shift, width):
+        self.shift = shift
+        self.model_width = width
+
+    def _model_inplace(self, re, im, scratch):
+        for x in [re, im]:
+            np.left_shift(x, self.shift, out=x)
 
 
 class R2SDF(Elaboratable):
@@ -128,18 +217,20 @@ class R2SDF(Elaboratable):
     def auto_storage_rule(self):
         return 'bram' if self.order >= 9 else 'distributed'
 
+    @property
+    def model_width(self):
+        return self.w + 1
+
     def model(self, re_in, im_in):
+        return _model_stages([self], self.model_vlen, re_in, im_in)
+
+    def _model_inplace(self, re, im, scratch):
         v = self.model_vlen
-        re_in, im_in = (np.array(x, 'int').reshape(-1, 2, v // 2)
-                        for x in [re_in, im_in])
-        re_out, im_out = [
-            clamp_nbits(
-                np.concatenate(
-                    (x[:, 0] + x[:, 1], x[:, 0] - x[:, 1]),
-                    axis=-1).ravel() >> self.trunc,
-                self.w_out)
-            for x in [re_in, im_in]]
-        return re_out, im_out
+        for x, s in zip([re, im], scratch):
+            x = x.reshape(-1, 2, v // 2)
+            s = s.reshape(-1, 2, v // 2)[:, 0]
+            _butterfly_inplace(x[:, 0], x[:, 1], s)
+            _truncate_inplace(x, self.trunc, self.w_out)
 
     def elaborate(self, platform):
         m = Module()
@@ -331,27 +422,44 @@ class R4SDF(Elaboratable):
     def auto_storage_rule(self):
         return 'bram' if self.order >= 4 else 'distributed'
 
+    @property
+    def model_width(self):
+        return self.w + 2
+
     def model(self, re_in, im_in):
+        return _model_stages([self], self.model_vlen, re_in, im_in)
+
+    def _model_inplace(self, re, im, scratch):
+        # The outputs are
+        # re: r0+r1+r2+r3, r0+i1-r2-i3, r0-r1+r2-r3, r0-i1-r2+i3
+        # im: i0+i1+i2+i3, i0-r1-i2+r3, i0-i1+i2-i3, i0+r1-i2-r3
+        # They are computed in place as radix-2 butterflies of the
+        # partial sums r0+-r2, r1+r3, i1-i3, i0+-i2, i1+i3, r3-r1.
         v = self.model_vlen
-        re_in, im_in = (np.array(x, 'int').reshape(-1, 4, v // 4)
-                        for x in [re_in, im_in])
-        re_out = clamp_nbits(
-            np.concatenate(
-                (re_in[:, 0] + re_in[:, 1] + re_in[:, 2] + re_in[:, 3],
-                 re_in[:, 0] + im_in[:, 1] - re_in[:, 2] - im_in[:, 3],
-                 re_in[:, 0] - re_in[:, 1] + re_in[:, 2] - re_in[:, 3],
-                 re_in[:, 0] - im_in[:, 1] - re_in[:, 2] + im_in[:, 3]),
-                axis=-1).ravel() >> self.trunc,
-            self.w_out)
-        im_out = clamp_nbits(
-            np.concatenate(
-                (im_in[:, 0] + im_in[:, 1] + im_in[:, 2] + im_in[:, 3],
-                 im_in[:, 0] - re_in[:, 1] - im_in[:, 2] + re_in[:, 3],
-                 im_in[:, 0] - im_in[:, 1] + im_in[:, 2] - im_in[:, 3],
-                 im_in[:, 0] + re_in[:, 1] - im_in[:, 2] - re_in[:, 3]),
-                axis=-1).ravel() >> self.trunc,
-            self.w_out)
-        return re_out, im_out
+        r0, r1, r2, r3 = re.reshape(-1, 4, v // 4).transpose(1, 0, 2)
+        i0, i1, i2, i3 = im.reshape(-1, 4, v // 4).transpose(1, 0, 2)
+        s = scratch[0].reshape(-1, 4, v // 4)[:, 0]
+        _butterfly_inplace(r0, r2, s)  # r0 + r2, r0 - r2
+        _butterfly_inplace(i0, i2, s)  # i0 + i2, i0 - i2
+        np.subtract(i1, i3, out=s)
+        np.add(i1, i3, out=i1)  # i1 + i3
+        np.subtract(r3, r1, out=i3)  # r3 - r1
+        np.add(r1, r3, out=r3)  # r1 + r3
+        np.copyto(r1, s)  # i1 - i3
+        _butterfly_inplace(r0, r3, s)  # re0, re2
+        _butterfly_inplace(r2, r1, s)  # re1, re3
+        _butterfly_inplace(i0, i1, s)  # im0, im2
+        _butterfly_inplace(i2, i3, s)  # im1, im3
+        # Put the outputs in their order
+        np.copyto(s, r1)
+        np.copyto(r1, r2)
+        np.copyto(r2, r3)
+        np.copyto(r3, s)
+        np.copyto(s, i1)
+        np.copyto(i1, i2)
+        np.copyto(i2, s)
+        for x in [re, im]:
+            _truncate_inplace(x, self.trunc, self.w_out)
 
     def elaborate(self, platform):
         m = Module()
@@ -584,41 +692,40 @@ class R22SDF(Elaboratable):
     def model_vlen(self):
         return 4**self.order
 
+    @property
+    def model_width(self):
+        return self.w_in + 2
+
     def model(self, re_in, im_in):
+        return _model_stages([self], self.model_vlen, re_in, im_in)
+
+    def _model_inplace(self, re, im, scratch):
         v = self.model_vlen
-        re_in, im_in = (np.array(x, 'int').reshape(-1, 4, v // 4)
-                        for x in [re_in, im_in])
-        re_inter = clamp_nbits(
-            np.concatenate(
-                (re_in[:, 0] + re_in[:, 2], re_in[:, 1] + re_in[:, 3],
-                 re_in[:, 0] - re_in[:, 2], im_in[:, 1] - im_in[:, 3]),
-                axis=-1).ravel() >> self.trunc0,
-            self.w_inter)
-        im_inter = clamp_nbits(
-            np.concatenate(
-                (im_in[:, 0] + im_in[:, 2], im_in[:, 1] + im_in[:, 3],
-                 im_in[:, 0] - im_in[:, 2], re_in[:, 1] - re_in[:, 3]),
-                axis=-1).ravel() >> self.trunc0,
-            self.w_inter)
-        re_inter, im_inter = (x.reshape(-1, 4, v // 4)
-                              for x in [re_inter, im_inter])
-        re_out = clamp_nbits(
-            np.concatenate(
-                (re_inter[:, 0] + re_inter[:, 1],
-                 re_inter[:, 0] - re_inter[:, 1],
-                 re_inter[:, 2] + re_inter[:, 3],
-                 re_inter[:, 2] - re_inter[:, 3]),
-                axis=-1).ravel() >> self.trunc1,
-            self.w_out)
-        im_out = clamp_nbits(
-            np.concatenate(
-                (im_inter[:, 0] + im_inter[:, 1],
-                 im_inter[:, 0] - im_inter[:, 1],
-                 im_inter[:, 2] - im_inter[:, 3],
-                 im_inter[:, 2] + im_inter[:, 3]),
-                axis=-1).ravel() >> self.trunc1,
-            self.w_out)
-        return re_out, im_out
+        r0, r1, r2, r3 = re.reshape(-1, 4, v // 4).transpose(1, 0, 2)
+        i0, i1, i2, i3 = im.reshape(-1, 4, v // 4).transpose(1, 0, 2)
+        s = scratch[0].reshape(-1, 4, v // 4)[:, 0]
+        # First butterfly. The outputs are
+        # re: r0+r2, r1+r3, r0-r2, i1-i3
+        # im: i0+i2, i1+i3, i0-i2, r1-r3
+        _butterfly_inplace(r0, r2, s)
+        _butterfly_inplace(i0, i2, s)
+        np.subtract(r1, r3, out=s)
+        np.add(r1, r3, out=r1)
+        np.subtract(i1, i3, out=r3)
+        np.add(i1, i3, out=i1)
+        np.copyto(i3, s)
+        for x in [re, im]:
+            _truncate_inplace(x, self.trunc0, self.w_inter)
+        # Second butterfly. The outputs are
+        # re: r0+r1, r0-r1, r2+r3, r2-r3
+        # im: i0+i1, i0-i1, i2-i3, i2+i3
+        _butterfly_inplace(r0, r1, s)
+        _butterfly_inplace(r2, r3, s)
+        _butterfly_inplace(i0, i1, s)
+        _butterfly_inplace(i3, i2, s)
+        np.subtract(0, i2, out=i2)
+        for x in [re, im]:
+            _truncate_inplace(x, self.trunc1, self.w_out)
 
     def elaborate(self, platform):
         m = Module()
@@ -729,15 +836,22 @@ class TwiddleI(Elaboratable):
     def model_vlen(self):
         return 4
 
+    @property
+    def model_width(self):
+        # + 1 because -re_in can overflow the width
+        return self.w + 1
+
     def model(self, re_in, im_in):
+        return _model_stages([self], self.model_vlen, re_in, im_in)
+
+    def _model_inplace(self, re, im, scratch):
         v = self.model_vlen
-        re_in, im_in = (np.array(x, 'int').reshape(-1, v)
-                        for x in [re_in, im_in])
-        re_out = re_in.copy()
-        im_out = im_in.copy()
-        re_out[:, 3] = im_in[:, 3]
-        im_out[:, 3] = -re_in[:, 3]
-        return re_out.ravel(), im_out.ravel()
+        re3 = re.reshape(-1, v)[:, 3]
+        im3 = im.reshape(-1, v)[:, 3]
+        s = scratch[0].reshape(-1, v)[:, 3]
+        np.copyto(s, re3)
+        np.copyto(re3, im3)
+        np.subtract(0, s, out=im3)
 
     def elaborate(self, platform):
         m = Module()
@@ -887,39 +1001,37 @@ class Twiddle(Elaboratable):
     def model_vlen(self):
         return 2**(self.radix_log2 * self.order)
 
+    @property
+    def model_width(self):
+        return self.sw + self.tw + 1
+
     def model(self, re_in, im_in):
+        return _model_stages([self], self.model_vlen, re_in, im_in)
+
+    def _model_inplace(self, re, im, scratch):
         v = self.model_vlen
-        re_in, im_in = (np.array(x, 'int').reshape(-1, v)
-                        for x in [re_in, im_in])
-        tw_re, tw_im = (np.array(x, 'int')
-                        for x in self.twiddles_full())
+        re, im, re_tw_im, im_tw_im = (
+            x.reshape(-1, v) for x in [re, im, *scratch])
+        tw_re, tw_im = (x.astype(re.dtype) for x in self._twiddles_table())
         trunc = self.twiddle_scale_clog2()
-        re_out = clamp_nbits(
-            (re_in * tw_re - im_in * tw_im).ravel() >> trunc,
-            self.outw)
-        im_out = clamp_nbits(
-            (im_in * tw_re + re_in * tw_im).ravel() >> trunc,
-            self.outw)
-        return re_out, im_out
+        np.multiply(re, tw_im, out=re_tw_im)
+        np.multiply(im, tw_im, out=im_tw_im)
+        np.multiply(re, tw_re, out=re)
+        np.subtract(re, im_tw_im, out=re)
+        np.multiply(im, tw_re, out=im)
+        np.add(im, re_tw_im, out=im)
+        for x in [re, im]:
+            _truncate_inplace(x, trunc, self.outw)
 
     def twiddle_scale_clog2(self):
         return self.tw - 2
 
     def twiddles_full(self):
-        j_iter = (
-            range(2**self.radix_log2)
-            if not self.r22_mode
-            else [0, 2, 1, 3])
-        twiddle_complex = np.array([
-            np.exp(-1j*np.pi*j*k/2**(self.radix_log2*self.order-1))
-            for j in j_iter
-            for k in range(2**(self.radix_log2*(self.order-1)))])
-        twiddle_scale = 1 << self.twiddle_scale_clog2()
-        twiddle_int_re = [int(a) for a in
-                          np.round(twiddle_scale * twiddle_complex.real)]
-        twiddle_int_im = [int(a) for a in
-                          np.round(twiddle_scale * twiddle_complex.imag)]
-        return twiddle_int_re, twiddle_int_im
+        return tuple(x.tolist() for x in self._twiddles_table())
+
+    def _twiddles_table(self):
+        return _twiddles_table(self.order, self.radix_log2,
+                               self.twiddle_scale_clog2(), self.r22_mode)
 
     def twiddles_elaborate(self):
         twiddles_re, twiddles_im = self.twiddles_full()
@@ -1079,26 +1191,30 @@ class Window(Elaboratable):
     def model_vlen(self):
         return 2**self.order_log2
 
+    @property
+    def model_width(self):
+        # + 1 because the coefficients are unsigned
+        return self.sw + self.cw + 1
+
     def model(self, re_in, im_in):
-        v = self.model_vlen
-        re_in, im_in = (np.array(x, 'int').reshape(-1, v)
-                        for x in [re_in, im_in])
-        w = self.window()
-        re_out = (re_in * w).ravel() >> self.truncate
-        im_out = (im_in * w).ravel() >> self.truncate
-        return re_out, im_out
+        return _model_stages([self], self.model_vlen, re_in, im_in)
+
+    def _model_inplace(self, re, im, scratch):
+        # The vectors can be shorter than the window when it is used in an
+        # FFT that bypasses its first stages. In this case one out of every
+        # model_vlen // v coefficients is used.
+        v = re.shape[-1]
+        w = _window_table(
+            self.window_name, self.order_log2, self.cw)[
+                ::self.model_vlen // v].astype(re.dtype)
+        for x in [re, im]:
+            x = x.reshape(-1, v)
+            np.multiply(x, w, out=x)
+            np.right_shift(x, self.truncate, out=x)
 
     def window(self):
-        # We use fftbins=False to get a symmetric window. Even though we want
-        # the window for an FFT, we prefer a symmetric window because this
-        # allows us to store only the left half of the window.
-        w = scipy.signal.get_window(self.window_name, 2**self.order_log2,
-                                    fftbins=False)
-        if np.any(w < 0):
-            raise ValueError(
-                'windows with negative coefficients not supported')
-        scale = 2**self.cw - 1
-        return [int(a) for a in np.round(scale * w)]
+        return _window_table(
+            self.window_name, self.order_log2, self.cw).tolist()
 
     def elaborate(self, platform):
         m = Module()
@@ -1155,6 +1271,11 @@ class FFTControl(Elaboratable):
         List of twiddle factor modules, ordered from input to output.
     window : Optional[Elaboratable]
         Window module (if present).
+    first_stages : List[int]
+        Stages in which the transform can start. The stages before the
+        first stage are bypassed, and the remaining stages compute an FFT of
+        size ``2**order_stage(first_stage)``. By default, the transform
+        always starts in stage 0.
 
     Attributes
     ----------
@@ -1162,6 +1283,11 @@ class FFTControl(Elaboratable):
         Delay (in samples) from input to output of the FFT.
     clken : Signal(), in
         Clock enable.
+    first_stage : Signal(range(stages)), in
+        Stage in which the transform starts. It must be one of the stages in
+        ``first_stages``. This is only present when there are several
+        possible first stages. The output is not valid during the first
+        transforms after this signal changes.
     mux_control : list[Optional[Signal()]], out
         List of ``mux_control`` output signals for each of the butterflies
         (and None in the positions corresponding to R22SDF butterflies).
@@ -1183,14 +1309,19 @@ class FFTControl(Elaboratable):
         presented at the output.
     """
     # butterflies and twiddles are passed ordered from input to output
-    def __init__(self, butterflies, twiddles, window):
+    def __init__(self, butterflies, twiddles, window, first_stages=[0]):
         assert len(butterflies) == len(twiddles) + 1
         self.butterflies = butterflies
         self.twiddles = twiddles
         self.window = window
         self.stages = len(butterflies)
+        self.first_stages = sorted(first_stages)
+        assert self.first_stages[0] == 0
+        assert self.first_stages[-1] < self.stages
 
         self.clken = Signal()
+        if self.variable_first_stage:
+            self.first_stage = Signal(range(self.stages))
         self._clken_out = Signal()  # used to connect clken of stages
         if self.window is not None:
             self.window_index = Signal(self.window.coeff_index.shape())
@@ -1215,10 +1346,21 @@ class FFTControl(Elaboratable):
                               for j in range(self.stages - 1)]
         self.out_last = Signal()
 
+    @property
+    def variable_first_stage(self):
+        return len(self.first_stages) > 1
+
     @property
     def fft_delay(self):
         return self.delay_butterflies_input()[-1] + self.butterflies[-1].delay
 
+    def delay_bypass(self, first_stage):
+        """Gives the delay of the stages that are bypassed when the transform
+        starts in a certain stage"""
+        delay_butterflies_input = self.delay_butterflies_input()
+        return (delay_butterflies_input[first_stage]
+                - delay_butterflies_input[0])
+
     @property
     def delay_window(self):
         return self.window.delay if self.window is not None else 0
@@ -1278,16 +1420,23 @@ class FFTControl(Elaboratable):
                 m.d.sync += [
                     counter_window.eq(counter_window_next),
                     mux_bfly0_delay[0].eq(
-                        self.butterfly_delay_in(counter_window, 0)),
+                        self.first_butterfly_delay_in(counter_window)),
                 ]
                 m.d.sync += [
                     mux_bfly0_delay[j].eq(mux_bfly0_delay[j - 1])
                     for j in range(1, len(mux_bfly0_delay))]
+            # When the first stages are bypassed, the window uses one out of
+            # every 2**(window.order_log2 - order) coefficients.
+            window_index = self.select_first_stage({
+                stage: Cat(
+                    Const(0, self.window.order_log2 - self.order_stage(stage)),
+                    counter_window[:self.order_stage(stage)])
+                for stage in self.first_stages})
             m.d.comb += [
                 counter_window_next.eq(counter_window + 1),
-                self.window_index.eq(counter_window),
-                self.control_output(0).eq(mux_bfly0_delay[-1]),
+                self.window_index.eq(window_index),
             ]
+            mux_first_bfly = mux_bfly0_delay[-1]
 
         # Counters to control the butterflies muxes.
         #
@@ -1306,11 +1455,8 @@ class FFTControl(Elaboratable):
                     m.d.sync += counter_bfly0_q.eq(counter_bfly0)
             with m.If(self.clken):
                 m.d.sync += counter_bfly0.eq(counter_bfly0_next)
-            m.d.comb += [
-                counter_bfly0_next.eq(counter_bfly0 + 1),
-                self.control_output(0).eq(
-                    self.butterfly_delay_in(counter_bfly0, 0)),
-            ]
+            m.d.comb += counter_bfly0_next.eq(counter_bfly0 + 1)
+            mux_first_bfly = self.first_butterfly_delay_in(counter_bfly0)
 
         mux_bfly_delay = [
             [Signal(2 if isinstance(self.butterflies[j], R22SDF) else 1,
@@ -1332,7 +1478,10 @@ class FFTControl(Elaboratable):
         out_last_counter = Signal(
             w := self.order_stage(0), init=(-self.fft_delay + 1) % 2**w)
         out_last_counter_next = Signal(self.order_stage(0) + 1)
-        out_last_counter_carry = out_last_counter_next[-1]
+        out_last_counter_carry = self.select_first_stage({
+            stage: (out_last_counter_next[-1] if stage == 0
+                    else out_last_counter[:self.order_stage(stage)].all())
+            for stage in self.first_stages})
 
         with m.If(self.clken):
             m.d.sync += [
@@ -1346,9 +1495,13 @@ class FFTControl(Elaboratable):
             m.d.sync += [
                 out_last_counter.eq(out_last_counter_next),
                 self.out_last.eq(out_last_counter_carry)]
+        m.d.comb += self.control_output(0).eq(mux_first_bfly)
         m.d.comb += [
             self.control_output(j).eq(
-                mux_bfly_delay[j - 1][-1])
+                Mux(self.first_stage == j, mux_first_bfly,
+                    mux_bfly_delay[j - 1][-1])
+                if j in self.first_stages
+                else mux_bfly_delay[j - 1][-1])
             for j in range(1, self.stages)]
         m.d.comb += [
             self.twiddle_index[j].eq(counters_twiddles[j])
@@ -1370,6 +1523,27 @@ class FFTControl(Elaboratable):
             counter0_next = counter_bfly0_next
             if any_bfly_bram:
                 counter0_q = counter_bfly0_q
+
+        if self.variable_first_stage:
+            # When the first stage changes, the twiddle and out_last counters
+            # are loaded with the values that correspond to the delay of the
+            # new first stage, using the window or butterfly0 counter as a
+            # reference. The counters only depend on their initial values,
+            # since they are all incremented together.
+            first_stage_q = Signal.like(self.first_stage)
+            counters = counters_twiddles + [out_last_counter]
+            with m.If(self.clken):
+                m.d.sync += first_stage_q.eq(self.first_stage)
+                with m.If(self.first_stage != first_stage_q):
+                    for counter in counters:
+                        offsets = {
+                            stage: (counter.init - counter0.init
+                                    + self.delay_bypass(stage))
+                            % 2**len(counter)
+                            for stage in self.first_stages}
+                        m.d.sync += counter.eq(
+                            counter0_next + self.select_first_stage(offsets))
+
         for j in range(self.stages):
             if (bfly := self.butterflies[j]).storage == 'bram':
                 w = len(bfly.bram_raddr)
@@ -1382,6 +1556,22 @@ class FFTControl(Elaboratable):
 
         return m
 
+    def select_first_stage(self, values):
+        """Selects a value according to the first stage
+
+        ``values`` is a dictionary that maps each of the possible first stages
+        to a value.
+        """
+        value = values[0]
+        for stage in self.first_stages[1:]:
+            value = Mux(self.first_stage == stage, values[stage], value)
+        return value
+
+    def first_butterfly_delay_in(self, counter):
+        return self.select_first_stage({
+            stage: self.butterfly_delay_in(counter, stage)
+            for stage in self.first_stages})
+
     def butterfly_counter(self, counter, stage):
         r = self.butterflies[stage].radix_log2
         o = self.order_stage(stage)
@@ -1405,6 +1595,25 @@ class FFTControl(Elaboratable):
             return self.butterflies[stage].mux_control
         return self.butterflies[stage].mux_count
 
+    def butterfly_input(self, stage, part):
+        """Gives the input of a butterfly other than the first
+
+        The input comes from the preceding twiddle, except when the transform
+        starts in this stage. In that case it comes from the window (or from
+        the input of the first butterfly if there is no window), and it is
+        shifted to the MSBs of the butterfly input.
+        """
+        twiddle_out = getattr(self.twiddles[stage - 1], f'{part}_out')
+        if stage not in self.first_stages:
+            return twiddle_out
+        if self.window is not None:
+            fft_in = getattr(self.window, f'{part}_out')
+        else:
+            fft_in = getattr(self.butterflies[0], f'{part}_in')
+        bfly_in = getattr(self.butterflies[stage], f'{part}_in')
+        shift = len(bfly_in) - len(fft_in)
+        return Mux(self.first_stage == stage, fft_in << shift, twiddle_out)
+
     def connect_stages(self, module):
         """Connects the FFTControl to the stages and the datapaths of the
         stages"""
@@ -1429,9 +1638,9 @@ class FFTControl(Elaboratable):
                if bfly.storage == 'bram']
             + [self.twiddles[j].twiddle_index.eq(self.twiddle_index[j])
                for j in range(self.stages - 1)]
-            + [self.butterflies[j].re_in.eq(self.twiddles[j-1].re_out)
+            + [self.butterflies[j].re_in.eq(self.butterfly_input(j, 're'))
                for j in range(1, self.stages)]
-            + [self.butterflies[j].im_in.eq(self.twiddles[j-1].im_out)
+            + [self.butterflies[j].im_in.eq(self.butterfly_input(j, 'im'))
                for j in range(1, self.stages)]
             + [self.twiddles[j].re_in.eq(self.butterflies[j].re_out)
                for j in range(self.stages - 1)]
@@ -1496,11 +1705,27 @@ class FFT(Elaboratable):
     domain_3x : Optional[str]
         Name of the clock domain of the 3x clock. This is only used when
         cmult3x is enabled.
+    order_log2_min : Optional[int]
+        If this is not ``None``, the FFT size can be selected at runtime
+        with the ``active_order_log2`` input. The sizes ``2**order`` that are
+        supported are those for which ``order_log2_min <= order <=
+        order_log2`` and ``order_log2 - order`` is a multiple of ``log2`` of
+        the radix. A smaller FFT is computed by bypassing the first stages of
+        the FFT and using one out of every ``2**(order_log2 - order)``
+        coefficients of the window. The input is placed in the MSBs of the
+        first stage that is used.
 
     Attributes
     ----------
+    orders : List[int]
+        The log2 of the FFT sizes that are supported, in decreasing order.
     clken : Signal(), in
         Clock enable.
+    active_order_log2 : Signal(range(order_log2 + 1)), in
+        log2 of the FFT size to use. This is only present when
+        ``order_log2_min`` is not ``None``. If it is not one of the supported
+        orders, the FFT size is ``2**order_log2``. The output is not valid
+        during the first transforms after this signal changes.
     common_edge_2x : Signal(), in
         A signal that toggles with the 2x clock and is high immediately
         after the rising edge of the 1x clock. This is only present when
@@ -1525,7 +1750,7 @@ class FFT(Elaboratable):
                  width_twiddle=None, truncates=None,
                  butterfly_storage='auto', twiddle_storage='auto',
                  use_bram_reg=True, window=None, cmult3x=False,
-                 domain_2x=None, domain_3x=None):
+                 domain_2x=None, domain_3x=None, order_log2_min=None):
         if radix not in [2, 4, 'R22']:
             raise ValueError(
                 f"invalid radix {radix} (radix can only be 2, 4 or 'R22')")
@@ -1539,6 +1764,14 @@ class FFT(Elaboratable):
         bfly_trunc = {2: 1, 4: 2, 'R22': [1, 1]}[radix]
         r22_mode = radix == 'R22'
         self.nstages = nstages = self.order_log2 // radix_log2
+        # Maps each supported order to the stage in which the FFT starts
+        self._first_stages = {
+            order_log2 - radix_log2 * j: j for j in range(nstages)
+            if order_log2_min is not None
+            and order_log2 - radix_log2 * j >= order_log2_min}
+        if not self._first_stages:
+            self._first_stages = {order_log2: 0}
+        self.orders = list(self._first_stages)
 
         if truncates is None:
             truncates = [bfly_trunc] * nstages
@@ -1559,6 +1792,9 @@ class FFT(Elaboratable):
         self.cmult3x = cmult3x
 
         self.clken = Signal()
+        if order_log2_min is not None:
+            self.active_order_log2 = Signal(range(order_log2 + 1),
+                                            init=order_log2)
         self.re_in = Signal(signed(width_in))
         self.im_in = Signal(signed(width_in))
         width_out = widths[-1]
@@ -1590,27 +1826,47 @@ class FFT(Elaboratable):
             else TwiddleI(widths[j + 1])  # use TwiddleI for last radix 2 stage
             for j in range(nstages - 1)]
         self._control = FFTControl(
-            self._butterflies, self._twiddles, self._window)
+            self._butterflies, self._twiddles, self._window,
+            list(self._first_stages.values()))
 
     @property
     def delay(self):
         return self._control.fft_delay
 
+    def delay_order(self, order_log2):
+        """Delay of the FFT when it uses a size of ``2**order_log2``"""
+        return self._control.fft_delay - self._control.delay_bypass(
+            self._first_stage(order_log2))
+
     @property
     def model_vlen(self):
         return 2**self.order_log2
 
-    def model(self, re_in, im_in):
-        v = self.model_vlen
-        re = re_in
-        im = im_in
-        if self._window is not None:
-            re, im = self._window.model(re, im)
-        for j in range(self.nstages):
-            re, im = self._butterflies[j].model(re, im)
+    def _first_stage(self, order_log2):
+        if order_log2 is None:
+            return 0
+        if order_log2 not in self._first_stages:
+            raise ValueError(f'unsupported FFT order {order_log2}')
+        return self._first_stages[order_log2]
+
+    def model(self, re_in, im_in, order_log2=None):
+        """Model the FFT.
+
+        The FFT size used by the model is ``2**order_log2``, which must be
+        one of the supported orders (by default, the maximum size is used).
+        """
+        first = self._first_stage(order_log2)
+        stages = [self._window] if self._window is not None else []
+        if first != 0:
+            bfly_in = self._butterflies[first].re_in
+            stages.append(_ModelShift(
+                len(bfly_in) - len(self.re_in), len(bfly_in)))
+        for j in range(first, self.nstages):
+            stages.append(self._butterflies[j])
             if j != self.nstages - 1:
-                re, im = self._twiddles[j].model(re, im)
-        return re, im
+                stages.append(self._twiddles[j])
+        vlen = self.model_vlen if order_log2 is None else 2**order_log2
+        return _model_stages(stages, vlen, re_in, im_in)
 
     def elaborate(self, platform):
         m = Module()
@@ -1629,6 +1885,11 @@ class FFT(Elaboratable):
                          for twiddle in self._twiddles
                          if not isinstance(twiddle, TwiddleI)]
         m.submodules.control = ctrl = self._control
+        if ctrl.variable_first_stage:
+            with m.Switch(self.active_order_log2):
+                for order, stage in self._first_stages.items():
+                    with m.Case(order):
+                        m.d.comb += ctrl.first_stage.eq(stage)
         ctrl.connect_stages(m)
         last_bfly = self._butterflies[-1]
         m.d.comb += [
@@ -1642,47 +1903,61 @@ class FFT(Elaboratable):
         return m
 
 
-def gen_verilog():
-    order_log2 = 12
+def verilog_variants(order_log2=12):
+    """Variants of the FFT for which Verilog code is generated"""
+    variants = []
     for radix in [2, 4, 'R22']:
         for window in [None, 'blackmanharris']:
             for cmult3x in [False, True]:
                 w = window if window is not None else 'nowindow'
-                truncates = {
-                    2: [0] * (order_log2 // 2) + [1] * (order_log2 // 2),
-                    4: [0] * (order_log2 // 4) + [2] * (order_log2 // 4),
-                    'R22': (
-                        [[0, 0]] * (order_log2 // 4)
-                        + [[1, 1]] * (order_log2 // 4)),
-                }[radix]
                 x3 = '_cmult3x' if cmult3x else ''
-                file_out = f'fft_radix{radix}_{w}{x3}.v'
-                m = FFT(12, order_log2, radix,
-                        width_twiddle=16,
-                        truncates=truncates,
-                        use_bram_reg=True,
-                        window=window,
-                        cmult3x=cmult3x,
-                        domain_2x='clk2x' if window is not None else None,
-                        domain_3x='clk3x' if cmult3x else None)
-                ports = [m.clken,
-                         m.re_in, m.im_in,
-                         m.re_out, m.im_out,
-                         m.out_last]
-                if window is not None:
-                    ports.append(m.common_edge_2x)
-                if cmult3x:
-                    ports.append(m.common_edge_3x)
-                with open(file_out, 'w') as f:
-                    platform = PlutoPlatform()
-                    f.write(
-                        amaranth.back.verilog.convert(
-                            m,
-                            name=f'fft_radix{radix}_{w}{x3}',
-                            ports=ports, platform=platform,
-                            emit_src=False))
-                print('wrote verilog to', file_out)
+                name = f'fft_radix{radix}_{w}{x3}'
+                variants.append(VerilogVariant(
+                    name,
+                    functools.partial(
+                        _gen_verilog_variant, name, order_log2, radix,
+                        window, cmult3x),
+                    key={'name': name, 'order_log2': order_log2,
+                         'radix': radix, 'window': window,
+                         'cmult3x': cmult3x},
+                    modules=[__name__]))
+    return variants
+
+
+def gen_verilog(select=None, jobs=None, cache=True):
+    return generate_variants(
+        verilog_variants(), select=select, jobs=jobs, cache=cache)
+
+
+def _gen_verilog_variant(name, order_log2, radix, window, cmult3x):
+    truncates = {
+        2: [0] * (order_log2 // 2) + [1] * (order_log2 // 2),
+        4: [0] * (order_log2 // 4) + [2] * (order_log2 // 4),
+        'R22': (
+            [[0, 0]] * (order_log2 // 4)
+            + [[1, 1]] * (order_log2 // 4)),
+    }[radix]
+    m = FFT(12, order_log2, radix,
+            width_twiddle=16,
+            truncates=truncates,
+            use_bram_reg=True,
+            window=window,
+            cmult3x=cmult3x,
+            domain_2x='clk2x' if window is not None else None,
+            domain_3x='clk3x' if cmult3x else None)
+    ports = [m.clken,
+             m.re_in, m.im_in,
+             m.re_out, m.im_out,
+             m.out_last]
+    if window is not None:
+        ports.append(m.common_edge_2x)
+    if cmult3x:
+        ports.append(m.common_edge_3x)
+    platform = PlutoPlatform()
+    return amaranth.back.verilog.convert(
+        m, name=name, ports=ports, platform=platform, emit_src=False)
 
 
 if __name__ == '__main__':
-    gen_verilog()
+    args = argument_parser(variants=True).parse_args()
+    gen_verilog(args.variants, args.jobs, args.cache)
@@ -11,8 +11,42 @@ from amaranth.lib.memory import Memory
 import amaranth.cli
 
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 
-from .util import clamp_nbits
+from .util import clamp_nbits, model_dtype
+
+
+def _polyphase_branch_sums(x, taps, nout):
+    """Compute the polyphase branch sums of a FIR decimator.
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        Input samples, preceded by ``taps.size - 1`` samples of history.
+    taps : numpy.ndarray
+        FIR taps, reshaped as ``(branches, decimation)``.
+    nout : int
+        Number of output samples to compute.
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape ``(nout, branches)``. The element ``[j, k]`` contains
+        the sum of the products of the taps of branch ``k`` with the input
+        samples that these taps multiply for output ``j``, which are
+        ``x[(j - k) * decimation - i + taps.size - 1]`` for
+        ``i = 0, ..., decimation - 1``.
+    """
+    branches, decimation = taps.shape
+    if nout == 0:
+        return np.zeros((0, branches), x.dtype)
+    # Each row of the strided view contains the input samples used to compute
+    # an output, in chronological order. They are reshaped by branches and
+    # reversed, so that the newest sample goes with the first tap.
+    windows = sliding_window_view(
+        x[:(nout - 1) * decimation + taps.size], taps.size)[::decimation]
+    windows = windows.reshape(nout, branches, decimation)[:, ::-1, ::-1]
+    return np.einsum('jkd,kd->jk', windows, taps)
 
 
 class Macc(Elaboratable):
@@ -338,39 +372,44 @@ class FIR4DSP(Elaboratable):
         self.strobe_out = Signal()
 
     def model(self, taps, decimation, re_in, im_in):
-        assert len(taps) % decimation == 0
-        taps = np.array(taps).reshape(-1, decimation)
-        history = np.zeros(taps.size - 1, 'int')
-        re_out = np.zeros(len(re_in) // decimation, 'int')
-        im_out = np.zeros(len(re_in) // decimation, 'int')
-        re_in = np.concatenate((history, re_in))
-        im_in = np.concatenate((history, im_in))
-        for j in range(re_out.size):
-            # initial values for rounding
-            acc_init = (2**(self.macc_trunc - 1)
-                        if self.macc_trunc >= 1
-                        else 0)
-            re0, im0, re1, im1 = [acc_init] * 4
-            for k in range(taps.shape[0]):
-                wr = re_in[(j + taps.shape[0] - k - 1)
-                           * decimation:][:decimation]
-                wi = im_in[(j + taps.shape[0] - k - 1)
-                           * decimation:][:decimation]
-                sr = np.sum(wr[::-1] * taps[k])
-                si = np.sum(wi[::-1] * taps[k])
-                if k % 2 == 0:
-                    re0 += sr
-                    im0 += si
-                else:
-                    re1 += sr
-                    im1 += si
-            re0 = clamp_nbits(re0 >> self.macc_trunc, self.ow)
-            im0 = clamp_nbits(im0 >> self.macc_trunc, self.ow)
-            re1 = clamp_nbits(re1 >> self.macc_trunc, self.ow)
-            im1 = clamp_nbits(im1 >> self.macc_trunc, self.ow)
-            re_out[j] = clamp_nbits(re0 + re1, self.ow)
-            im_out[j] = clamp_nbits(im0 + im1, self.ow)
-        return re_out, im_out
+        return FIRModel(self, taps, decimation).process(re_in, im_in)
+
+    def model_taps(self, coeffs, decimation, operations_minus_one,
+                   odd_operations):
+        """Compute the FIR taps from the coefficient memory contents.
+
+        The element ``coeffs[n]`` is the value written to ``coeff_waddr =
+        n``. The taps returned can be passed to ``model``.
+        """
+        coeffs = clamp_nbits(np.array(coeffs, 'int'), self.coeff_width)
+        assert coeffs.size == 2**self.len_log2
+        operations = operations_minus_one + 1
+        half = coeffs.size // 2
+        assert operations * decimation <= half
+        # For each operation, the coefficients of the polyphase branch
+        # corresponding to each MACC are stored with a stride equal to the
+        # number of operations and in reverse order.
+        index = (np.arange(operations)
+                 + operations * np.arange(decimation)[::-1, np.newaxis])
+        taps = np.empty((2 * operations, decimation), 'int')
+        taps[0::2] = coeffs[:half][index].T
+        taps[1::2] = coeffs[half:][index].T
+        if odd_operations:
+            taps = taps[:-1]
+        return taps.ravel()
+
+    def _model_accumulate(self, branch_sums):
+        # initial value for rounding
+        acc_init = (2**(self.macc_trunc - 1)
+                    if self.macc_trunc >= 1
+                    else 0)
+        # MACC0 accumulates the even polyphase branches and MACC1 accumulates
+        # the odd branches. Each MACC output is truncated separately.
+        acc0 = acc_init + np.sum(branch_sums[:, 0::2], axis=1)
+        acc1 = acc_init + np.sum(branch_sums[:, 1::2], axis=1)
+        acc0 = clamp_nbits(acc0 >> self.macc_trunc, self.ow)
+        acc1 = clamp_nbits(acc1 >> self.macc_trunc, self.ow)
+        return clamp_nbits(acc0 + acc1, self.ow)
 
     def elaborate(self, platform):
         m = Module()
@@ -618,29 +657,32 @@ class FIR2DSP(Elaboratable):
         self.strobe_out = Signal()
 
     def model(self, taps, decimation, re_in, im_in):
-        assert len(taps) % decimation == 0
-        taps = np.array(taps).reshape(-1, decimation)
-        history = np.zeros(taps.size - 1, 'int')
-        re_out = np.zeros(len(re_in) // decimation, 'int')
-        im_out = np.zeros(len(re_in) // decimation, 'int')
-        re_in = np.concatenate((history, re_in))
-        im_in = np.concatenate((history, im_in))
-        for j in range(re_out.size):
-            # initial values for rounding
-            acc_init = (2**(self.macc_trunc - 1)
-                        if self.macc_trunc >= 1
-                        else 0)
-            re, im = [acc_init] * 2
-            for k in range(taps.shape[0]):
-                wr = re_in[(j + taps.shape[0] - k - 1)
-                           * decimation:][:decimation]
-                wi = im_in[(j + taps.shape[0] - k - 1)
-                           * decimation:][:decimation]
-                re += np.sum(wr[::-1] * taps[k])
-                im += np.sum(wi[::-1] * taps[k])
-            re_out[j] = clamp_nbits(re >> self.macc_trunc, self.ow)
-            im_out[j] = clamp_nbits(im >> self.macc_trunc, self.ow)
-        return re_out, im_out
+        return FIRModel(self, taps, decimation).process(re_in, im_in)
+
+    def model_taps(self, coeffs, decimation, operations_minus_one):
+        """Compute the FIR taps from the coefficient memory contents.
+
+        The element ``coeffs[n]`` is the value written to ``coeff_waddr =
+        n``. The taps returned can be passed to ``model``.
+        """
+        coeffs = clamp_nbits(np.array(coeffs, 'int'), self.coeff_width)
+        assert coeffs.size == 2**self.len_log2
+        operations = operations_minus_one + 1
+        assert operations * decimation <= coeffs.size
+        # The coefficients of the polyphase branch corresponding to each
+        # operation are stored with a stride equal to the number of operations
+        # and in reverse order.
+        index = (np.arange(operations)
+                 + operations * np.arange(decimation)[::-1, np.newaxis])
+        return coeffs[index].T.ravel()
+
+    def _model_accumulate(self, branch_sums):
+        # initial value for rounding
+        acc_init = (2**(self.macc_trunc - 1)
+                    if self.macc_trunc >= 1
+                    else 0)
+        acc = acc_init + np.sum(branch_sums, axis=1)
+        return clamp_nbits(acc >> self.macc_trunc, self.ow)
 
     def elaborate(self, platform):
         m = Module()
@@ -766,6 +808,72 @@ class FIR2DSP(Elaboratable):
         return m
 
 
+class FIRModel:
+    """Streaming model of a polyphase FIR decimator
+
+    This class models a ``FIR4DSP`` or ``FIR2DSP`` over an input that is
+    supplied in chunks. The filter history and the decimation phase are kept
+    between calls to ``process``, so the concatenation of the outputs for
+    all the chunks is identical to the output of the ``model`` method of
+    the FIR for the concatenation of all the chunks.
+
+    Only the last ``len(taps) - 1`` input samples, plus those samples that
+    have not been used yet to produce an output, are stored.
+
+    Parameters
+    ----------
+    fir : Union[FIR4DSP, FIR2DSP]
+        FIR to model.
+    taps : List[int]
+        FIR taps. The number of taps must be a multiple of the decimation.
+    decimation : int
+        Decimation factor.
+    """
+    def __init__(self, fir, taps, decimation):
+        assert len(taps) % decimation == 0
+        self.fir = fir
+        # The sum of len(taps) products of in_width and coeff_width bits
+        # (plus the rounding summand) fits in this width.
+        self.dtype = model_dtype(
+            fir.iw + fir.coeff_width + len(taps).bit_length())
+        self.taps = np.array(taps, self.dtype).reshape(-1, decimation)
+        self.decimation = decimation
+        self.reset()
+
+    @property
+    def shard_alignment(self):
+        return self.decimation
+
+    @property
+    def shard_history(self):
+        return self.taps.size - 1
+
+    def reset(self, offset=0):
+        """Reset the filter history and decimation phase to zero"""
+        history = np.zeros(self.taps.size - 1, self.dtype)
+        self._re = history
+        self._im = history.copy()
+
+    def process(self, re_in, im_in):
+        """Process a chunk of input samples
+
+        Returns the real and imaginary parts of the output samples that
+        can be computed after this chunk.
+        """
+        assert len(re_in) == len(im_in)
+        self._re = np.concatenate((self._re, np.array(re_in, self.dtype)))
+        self._im = np.concatenate((self._im, np.array(im_in, self.dtype)))
+        nout = (self._re.size - (self.taps.size - 1)) // self.decimation
+        out = tuple(
+            self.fir._model_accumulate(
+                _polyphase_branch_sums(x, self.taps, nout))
+            for x in [self._re, self._im])
+        consumed = nout * self.decimation
+        self._re = self._re[consumed:]
+        self._im = self._im[consumed:]
+        return out
+
+
 class FIRDecimator3Stage(Elaboratable):
     """Decimator with 3 FIR stages.
 
@@ -871,24 +979,36 @@ class FIRDecimator3Stage(Elaboratable):
         self.im_out = Signal(signed(self.ow[-1]), reset_less=True)
         self.strobe_out = Signal()
 
-    def elaborate(self, platform):
-        m = Module()
-
-        m.submodules.stage1 = stage1 = FIR4DSP(
+        self.stage1 = FIR4DSP(
             in_width=self.iw, out_width=self.ow[0],
             coeff_width=self.coeff_width, decim_width=self.decim_width[0],
             oper_width=self.oper_width[0], macc_trunc=self.macc_trunc[0],
             len_log2=8)
-        m.submodules.stage2 = stage2 = FIR2DSP(
+        self.stage2 = FIR2DSP(
             in_width=self.ow[0], out_width=self.ow[1],
             coeff_width=self.coeff_width, decim_width=self.decim_width[1],
             oper_width=self.oper_width[1], macc_trunc=self.macc_trunc[1],
             len_log2=7)
-        m.submodules.stage3 = stage3 = FIR4DSP(
+        self.stage3 = FIR4DSP(
             in_width=self.ow[1], out_width=self.ow[2],
             coeff_width=self.coeff_width, decim_width=self.decim_width[2],
             oper_width=self.oper_width[2], macc_trunc=self.macc_trunc[2],
             len_log2=8)
+
+    def model(self, coeffs, re_in, im_in, **registers):
+        """Model the decimator.
+
+        See ``FIRDecimator3StageModel`` for the meaning of the parameters.
+        """
+        return FIRDecimator3StageModel(
+            self, coeffs, **registers).process(re_in, im_in)
+
+    def elaborate(self, platform):
+        m = Module()
+
+        m.submodules.stage1 = stage1 = self.stage1
+        m.submodules.stage2 = stage2 = self.stage2
+        m.submodules.stage3 = stage3 = self.stage3
         stages = [stage1, stage2, stage3]
 
         for j, stage in enumerate(stages):
@@ -978,6 +1098,120 @@ class FIRDecimator3Stage(Elaboratable):
         return m
 
 
+class FIRDecimator3StageModel:
+    """Streaming model of a FIRDecimator3Stage
+
+    This class models a ``FIRDecimator3Stage`` configured with the given
+    values of its control inputs, over an input that is supplied in
+    chunks. Each stage is modelled with a ``FIRModel``. Bypassed stages are
+    omitted from the chain, as in the decimator.
+
+    The decimation phase of the decimator is not the same as that of the
+    model. The outputs of the decimator are equal to those of the model
+    when ``input_offset`` zeros are prepended to the input of the model.
+    Each active stage contributes one zero sample at its own input, which
+    amounts to the product of the decimations of the preceding stages at
+    the input of the decimator. Equivalently, if the first
+    ``shard_alignment - input_offset`` input samples are dropped instead,
+    the output of the model lags the output of the decimator by one sample
+    and it only becomes equal after the first ``warmup`` outputs, which
+    depend on the missing input samples.
+
+    Parameters
+    ----------
+    decimator : FIRDecimator3Stage
+        Decimator to model.
+    coeffs : List[int]
+        Contents of the coefficient address space. The element ``coeffs[n]``
+        is the value written to ``coeff_waddr = n``. The 2 MSBs of the
+        address select the stage. Addresses that are not present are assumed
+        to contain zeros.
+    decimation1, decimation2, decimation3 : int
+        Values of the ``decimation`` inputs of the decimator.
+    operations_minus_one1, operations_minus_one2, operations_minus_one3 : int
+        Values of the ``operations_minus_one`` inputs of the decimator.
+    odd_operations1, odd_operations3 : bool
+        Values of the ``odd_operations`` inputs of the decimator.
+    bypass2, bypass3 : bool
+        Values of the ``bypass`` inputs of the decimator.
+    """
+    def __init__(self, decimator, coeffs, *,
+                 decimation1, decimation2, decimation3,
+                 operations_minus_one1, operations_minus_one2,
+                 operations_minus_one3,
+                 odd_operations1=False, odd_operations3=False,
+                 bypass2=False, bypass3=False):
+        addr_width = len(decimator.coeff_waddr)
+        coeffs = np.array(coeffs, 'int')
+        assert coeffs.size <= 2**addr_width
+        coeffs = np.concatenate(
+            (coeffs, np.zeros(2**addr_width - coeffs.size, 'int')))
+        # The 2 MSBs of the address select the address space of each stage.
+        spaces = coeffs.reshape(4, -1)
+        stage1, stage2, stage3 = (
+            decimator.stage1, decimator.stage2, decimator.stage3)
+        self.stages = [
+            FIRModel(stage1, stage1.model_taps(
+                spaces[0][:2**stage1.len_log2], decimation1,
+                operations_minus_one1, odd_operations1), decimation1)]
+        if not bypass2:
+            self.stages.append(
+                FIRModel(stage2, stage2.model_taps(
+                    spaces[1][:2**stage2.len_log2], decimation2,
+                    operations_minus_one2), decimation2))
+        if not bypass3:
+            self.stages.append(
+                FIRModel(stage3, stage3.model_taps(
+                    spaces[2][:2**stage3.len_log2], decimation3,
+                    operations_minus_one3, odd_operations3), decimation3))
+
+    @property
+    def shard_alignment(self):
+        return int(np.prod([stage.decimation for stage in self.stages]))
+
+    @property
+    def shard_history(self):
+        # Each stage needs its history to produce correct outputs, and the
+        # next stage needs its own history of correct outputs from the
+        # stage.
+        history = 0
+        for stage in reversed(self.stages):
+            history = (-(-stage.shard_history // stage.decimation)
+                       + history) * stage.decimation
+        return history
+
+    @property
+    def input_offset(self):
+        """Number of zeros to prepend to the input to match the decimator"""
+        offset = 0
+        decimation = 1
+        for stage in self.stages:
+            offset += decimation
+            decimation *= stage.decimation
+        return offset
+
+    @property
+    def warmup(self):
+        """Number of outputs that depend on the history before the input"""
+        return -(-self.shard_history // self.shard_alignment)
+
+    def reset(self, offset=0):
+        """Reset the history and decimation phase of all the stages"""
+        for stage in self.stages:
+            stage.reset()
+
+    def process(self, re_in, im_in):
+        """Process a chunk of input samples
+
+        Returns the real and imaginary parts of the output samples that
+        can be computed after this chunk.
+        """
+        re, im = re_in, im_in
+        for stage in self.stages:
+            re, im = stage.process(re, im)
+        return re, im
+
+
 if __name__ == '__main__':
     fir = FIRDecimator3Stage()
     amaranth.cli.main(
@@ -20,6 +20,8 @@ from amaranth import *
 import amaranth.cli
 import numpy as np
 
+from .util import model_dtype, signed_width
+
 
 class ShiftRight(Elaboratable):
     """Shift right with a maximum shift
@@ -132,13 +134,10 @@ class IQToFloatingPoint(Elaboratable):
         return 2
 
     def model(self, re_in, im_in):
-        def calc_len(a):
-            return (int(a).bit_length() + 1 if a >= 0
-                    else (-(int(a)+1)).bit_length() + 1)
-
-        cl = np.vectorize(calc_len)
-        re_lens = cl(re_in)
-        im_lens = cl(im_in)
+        dtype = model_dtype(self.iw)
+        re_in, im_in = (np.asarray(x, dtype) for x in [re_in, im_in])
+        re_lens = signed_width(re_in)
+        im_lens = signed_width(im_in)
         re_exp, im_exp = (np.maximum(lens - self.ow, 0)
                           for lens in (re_lens, im_lens))
         exp = np.maximum(re_exp, im_exp)
@@ -317,13 +316,12 @@ class MakeCommonExponent(Elaboratable):
         return 2
 
     def model(self, re_a, im_a, exponent_a, re_b, im_b, exponent_b):
+        exponent_a, exponent_b = (
+            np.asarray(x, 'int') for x in [exponent_a, exponent_b])
         max_exponent = np.maximum(exponent_a, exponent_b)
-        diff_a = max_exponent - exponent_a
-        diff_b = max_exponent - exponent_b
-        if self.a_power:
-            diff_a *= 2
-        if self.b_power:
-            diff_b *= 2
+        # Power representations shift by 2 places per exponent unit.
+        diff_a = (max_exponent - exponent_a) << int(self.a_power)
+        diff_b = (max_exponent - exponent_b) << int(self.b_power)
         return (re_a >> diff_a, im_a >> diff_a,
                 re_b >> diff_b, im_b >> diff_b,
                 max_exponent)
@@ -0,0 +1,244 @@
+#
+# Copyright (C) 2024 Daniel Estevez <daniel@destevez.net>
+#
+# This file is part of maia-sdr
+#
+# SPDX-License-Identifier: MIT
+#
+
+from amaranth import *
+import amaranth.cli
+from amaranth.lib.memory import Memory
+import numpy as np
+
+import functools
+
+from .spectrum_stage import SpectrumStage
+
+
+class LogPower(Elaboratable):
+    """Log-power converter
+
+    This module reads the integrated power of a spectrum from a BRAM (such as
+    the BRAM of a ``SpectrumIntegrator``), converts it to a 16-bit fixed-point
+    power in dB and packs it as 4 bins per 64-bit word in a BRAM that can be
+    read by a ``DmaBRAMWrite``.
+
+    The input power is in the floating-point format used by the
+    ``SpectrumIntegrator``, which represents the integer ``value *
+    4**exponent``. The output is ``10*log10(value * 4**exponent)`` in units of
+    1/256 dB, as an unsigned integer (zero powers are converted to 0). The
+    leading one of the value is found, and the ``lut_bits`` bits that follow
+    it are used to look up the fractional part of the logarithm in a table,
+    so the output is truncated to at most ``10*log10(1 + 2**-lut_bits)`` dB
+    below the exact value. The bin ``4*n + j`` is placed in bits ``16*j`` to
+    ``16*j + 15`` of the word ``n``, so the packed words can be interpreted as
+    an array of little-endian 16-bit values.
+
+    The conversion starts when ``start`` is pulsed. The input BRAM is read
+    at one word per clock cycle, and ``done`` is pulsed when all the bins
+    have been written to the output BRAM. A ping-pong approach is used for
+    the output BRAM, so that its contents can be read while the next
+    conversion is being done.
+
+    Parameters
+    ----------
+    sum_width : int
+        Width of the value part of the input.
+    exponent_width : int
+        Width of the exponent part of the input.
+    order_log2 : int
+        Address width of the input BRAM. The maximum number of bins is
+        ``2**order_log2``.
+    lut_bits : int
+        Number of bits of the value after the leading one that are used to
+        look up the fractional part of the logarithm.
+
+    Attributes
+    ----------
+    start : Signal(), in
+        This signal should be pulsed for a clock cycle to start a conversion.
+        It is undefined behaviour to pulse this signal while a conversion is
+        in progress.
+    length : Signal(order_log2 + 1), in
+        Number of bins to convert. It must be a non-zero multiple of 4. It
+        is latched when ``start`` is pulsed.
+    done : Signal(), out
+        This signal is pulsed for one clock cycle when a conversion is
+        finished.
+    src_addr : Signal(order_log2), out
+        Read address for the input BRAM.
+    src_en : Signal(), out
+        Read enable for the input BRAM.
+    src_value : Signal(sum_width), in
+        Value part of the input BRAM read data. The read latency must be 2
+        cycles.
+    src_exponent : Signal(exponent_width), in
+        Exponent part of the input BRAM read data.
+    raddr : Signal(order_log2 - 2), in
+        Read address for the output BRAM that contains the previous
+        conversion.
+    rdata : Signal(64), out
+        Read data for the output BRAM. The read latency is 2 cycles.
+    rden : Signal(), in
+        Read enable for the output BRAM.
+    """
+    def __init__(self, sum_width, exponent_width, order_log2, lut_bits=8):
+        self.sumw = sum_width
+        self.ew = exponent_width
+        self.order_log2 = order_log2
+        self.lut_bits = lut_bits
+        self.int_table, self.frac_table = _log_tables(
+            sum_width, exponent_width, lut_bits)
+
+        self.start = Signal()
+        self.length = Signal(order_log2 + 1, init=2**order_log2)
+        self.done = Signal()
+        self.src_addr = Signal(order_log2)
+        self.src_en = Signal()
+        self.src_value = Signal(sum_width)
+        self.src_exponent = Signal(exponent_width)
+        self.raddr = Signal(order_log2 - 2)
+        self.rdata = Signal(64)
+        self.rden = Signal()
+
+    def model(self, value, exponent):
+        """Model the log-power conversion.
+
+        Returns the power in units of 1/256 dB as an array of 16-bit
+        integers. The contents of the output BRAM are given by
+        ``model(value, exponent).astype('<u2').view('<u8')``.
+        """
+        value = np.asarray(value, 'int64')
+        exponent = np.asarray(exponent, 'int64')
+        nonzero = value != 0
+        msb = np.frexp(value.astype('float'))[1].astype('int64') - 1
+        msb[~nonzero] = 0
+        index = (((value << (self.sumw - 1 - msb))
+                  >> (self.sumw - 1 - self.lut_bits))
+                 & (2**self.lut_bits - 1))
+        db = self.int_table[msb + 2 * exponent] + self.frac_table[index]
+        return np.where(nonzero, db, 0).astype('uint16')
+
+    def elaborate(self, platform):
+        m = Module()
+
+        m.submodules.int_mem = int_mem = Memory(
+            shape=16, depth=len(self.int_table),
+            init=self.int_table.tolist())
+        m.submodules.frac_mem = frac_mem = Memory(
+            shape=16, depth=len(self.frac_table),
+            init=self.frac_table.tolist())
+        int_rdport = int_mem.read_port()
+        frac_rdport = frac_mem.read_port()
+        m.submodules.stage = stage = SpectrumStage(
+            self.order_log2, 64, self.order_log2 - 2)
+
+        # Input BRAM read
+        m.d.comb += [
+            stage.start.eq(self.start),
+            stage.length.eq(self.length),
+            self.src_addr.eq(stage.src_addr),
+            self.src_en.eq(stage.src_en),
+        ]
+
+        # Stage A: find the leading one of the value
+        a_valid = Signal()
+        a_last = Signal()
+        a_value = Signal(self.sumw, reset_less=True)
+        a_exponent = Signal(self.ew, reset_less=True)
+        a_msb = Signal(range(self.sumw), reset_less=True)
+        a_zero = Signal(reset_less=True)
+        msb = Signal.like(a_msb)
+        for j in range(self.sumw):
+            with m.If(self.src_value[j]):
+                m.d.comb += msb.eq(j)
+        m.d.sync += [
+            a_valid.eq(stage.valid),
+            a_last.eq(stage.last),
+            a_value.eq(self.src_value),
+            a_exponent.eq(self.src_exponent),
+            a_msb.eq(msb),
+            a_zero.eq(self.src_value == 0),
+        ]
+
+        # Stage B: normalize the value to obtain the LUT indices
+        b_valid = Signal()
+        b_last = Signal()
+        b_zero = Signal(reset_less=True)
+        shift = Signal(range(self.sumw))
+        normalized = Signal(self.sumw)
+        m.d.comb += [
+            shift.eq(self.sumw - 1 - a_msb),
+            normalized.eq(a_value << shift),
+        ]
+        m.d.sync += [
+            b_valid.eq(a_valid),
+            b_last.eq(a_last),
+            b_zero.eq(a_zero),
+        ]
+        m.d.comb += [
+            frac_rdport.addr.eq(
+                normalized[self.sumw - 1 - self.lut_bits:self.sumw - 1]),
+            int_rdport.addr.eq(a_msb + 2 * a_exponent),
+        ]
+
+        # Stage C: add the integer and fractional parts
+        db = Signal(16)
+        m.d.comb += db.eq(Mux(b_zero, 0, int_rdport.data + frac_rdport.data))
+
+        # Packing and output BRAM write
+        word = Signal(64, reset_less=True)
+        word_next = Signal(64)
+        nbin = Signal(self.order_log2)
+        m.d.comb += word_next.eq(Cat(word[16:], db))
+        with m.If(b_valid):
+            m.d.sync += [
+                word.eq(word_next),
+                nbin.eq(nbin + 1),
+            ]
+        with m.If(self.start):
+            m.d.sync += nbin.eq(0)
+        m.d.comb += [
+            stage.wren.eq(b_valid & (nbin[:2] == 3)),
+            stage.waddr.eq(nbin[2:]),
+            stage.wdata.eq(word_next),
+            stage.swap.eq(b_valid & b_last),
+            self.done.eq(stage.done),
+        ]
+
+        # Output BRAM read
+        m.d.comb += [
+            stage.raddr.eq(self.raddr),
+            stage.rden.eq(self.rden),
+            self.rdata.eq(stage.rdata),
+        ]
+
+        return m
+
+
+@functools.lru_cache(maxsize=16)
+def _log_tables(sum_width, exponent_width, lut_bits):
+    # Power of 2 (integer part of log2) and mantissa (fractional part of
+    # log2) tables, in units of 1/256 dB
+    scale = 256 * 10
+    max_log2 = sum_width - 1 + 2 * (2**exponent_width - 1)
+    int_table = np.round(
+        scale * np.log10(2) * np.arange(max_log2 + 1)).astype('int64')
+    frac_table = np.round(
+        scale * np.log10(1 + np.arange(2**lut_bits) / 2**lut_bits)
+    ).astype('int64')
+    assert int_table[-1] + frac_table[-1] < 2**16
+    for table in [int_table, frac_table]:
+        table.flags.writeable = False
+    return int_table, frac_table
+
+
+if __name__ == '__main__':
+    log_power = LogPower(47, 3, 12)
+    amaranth.cli.main(
+        log_power, ports=[
+            log_power.start, log_power.length, log_power.done,
+            log_power.src_addr, log_power.src_en, log_power.src_value,
+            log_power.src_exponent, log_power.raddr, log_power.rdata,
+            log_power.rden])
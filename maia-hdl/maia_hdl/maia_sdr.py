@@ -6,8 +6,6 @@
 # SPDX-License-Identifier: MIT
 #
 
-import argparse
-
 from amaranth import *
 from amaranth.lib.cdc import FFSynchronizer, PulseSynchronizer
 import amaranth.back.verilog
@@ -25,9 +23,10 @@ from .recorder import Recorder16IQ, RecorderMode
 from .spectrometer import Spectrometer
 from .fifo import AsyncFifo18_36
 from .tx_dump import TxDUMP
+from .verilog_cache import argument_parser, write_verilog
 
 # IP core version
-_version = '0.6.2'
+_version = '0.7.0'
 
 
 class MaiaSDR(Elaboratable):
@@ -94,36 +93,68 @@ class MaiaSDR(Elaboratable):
         self.spectrometer = Spectrometer(
             config.spectrometer_address,
             config.spectrometer_buffers.bit_length() - 1,
-            dma_name='m_axi_spectrometer')
+            dma_name='m_axi_spectrometer',
+            fft_order_log2_min=config.spectrometer_fft_order_log2_min,
+            overlap_log2_max=config.spectrometer_overlap_log2_max,
+            dual=config.spectrometer_dual,
+            pooling_log2_max=config.spectrometer_pooling_log2_max,
+            log_power=config.spectrometer_log_power)
         self.recorder = Recorder16IQ(
             config.recorder_address_range[0],
             config.recorder_address_range[1],
             dma_name='m_axi_recorder', domain_in='sync',
             domain_dma='s_axi_lite')
         self.ddc = DDC('clk3x')
+        spectrometer_fields = [
+            Field('use_ddc_out',
+                  Access.RW,
+                  1,
+                  0),
+            Field('num_integrations',
+                  Access.RW,
+                  self.spectrometer.nint_width,
+                  -1),
+            Field('abort', Access.Wpulse, 1, 0),
+            Field('last_buffer',
+                  Access.R,
+                  len(self.spectrometer.last_buffer),
+                  0),
+            Field('peak_detect',
+                  Access.RW,
+                  1,
+                  0),
+        ]
+        if self.spectrometer.variable_order:
+            spectrometer_fields.append(
+                Field('fft_order_log2',
+                      Access.RW,
+                      len(self.spectrometer.active_fft_order_log2),
+                      self.spectrometer.fft_order_log2))
+        if config.spectrometer_overlap_log2_max:
+            spectrometer_fields += [
+                Field('overlap_log2',
+                      Access.RW,
+                      len(self.spectrometer.overlap_log2),
+                      0),
+                Field('overlap_overrun', Access.R, 1, 0),
+            ]
+        if config.spectrometer_dual:
+            spectrometer_fields.append(Field('dual', Access.RW, 1, 0))
+        if config.spectrometer_log_power:
+            spectrometer_fields.append(Field('log_power', Access.RW, 1, 0))
+        if config.spectrometer_pooling_log2_max:
+            spectrometer_fields += [
+                Field('pooling_log2',
+                      Access.RW,
+                      len(self.spectrometer.pooling_log2),
+                      0),
+                Field('pooling_max', Access.RW, 1, 0),
+            ]
         self.sdr_registers = Registers(
             'sdr', {
                 0b000: Register(
                     'spectrometer',
-                    [
-                        Field('use_ddc_out',
-                              Access.RW,
-                              1,
-                              0),
-                        Field('num_integrations',
-                              Access.RW,
-                              self.spectrometer.nint_width,
-                              -1),
-                        Field('abort', Access.Wpulse, 1, 0),
-                        Field('last_buffer',
-                              Access.R,
-                              len(self.spectrometer.last_buffer),
-                              0),
-                        Field('peak_detect',
-                              Access.RW,
-                              1,
-                              0),
-                    ]),
+                    spectrometer_fields),
                 0b001: Register(
                     'ddc_coeff_addr',
                     [
@@ -368,6 +399,29 @@ class MaiaSDR(Elaboratable):
             self.sdr_registers['spectrometer']['last_buffer'].eq(
                 self.spectrometer.last_buffer),
         ]
+        if self.spectrometer.variable_order:
+            m.d.comb += self.spectrometer.active_fft_order_log2.eq(
+                self.sdr_registers['spectrometer']['fft_order_log2'])
+        if self.spectrometer.overlap is not None:
+            m.d.comb += [
+                self.spectrometer.overlap_log2.eq(
+                    self.sdr_registers['spectrometer']['overlap_log2']),
+                self.sdr_registers['spectrometer']['overlap_overrun'].eq(
+                    self.spectrometer.overlap_overrun),
+            ]
+        if self.spectrometer.dual:
+            m.d.comb += self.spectrometer.dual_mode.eq(
+                self.sdr_registers['spectrometer']['dual'])
+        if self.spectrometer.pooling is not None:
+            m.d.comb += [
+                self.spectrometer.pooling_log2.eq(
+                    self.sdr_registers['spectrometer']['pooling_log2']),
+                self.spectrometer.pooling_max.eq(
+                    self.sdr_registers['spectrometer']['pooling_max']),
+            ]
+        if self.spectrometer.log_power is not None:
+            m.d.comb += self.spectrometer.log_mode.eq(
+                self.sdr_registers['spectrometer']['log_power'])
 
         # Recorder
         m.d.comb += [
@@ -547,7 +601,7 @@ def write_svd(path):
 
 
 def parse_args():
-    parser = argparse.ArgumentParser()
+    parser = argument_parser()
     parser.add_argument(
         '--config', default='default',
         help='Maia SDR configuration name [default=%(default)r]')
@@ -558,12 +612,17 @@ def parse_args():
 
 def main():
     args = parse_args()
-    config = getattr(configs, args.config)()
-    top = MaiaSDR(config)
-    platform = PlutoPlatform()
-    with open(args.output_file, 'w') as f:
-        f.write(amaranth.back.verilog.convert(
-            top, platform=platform, ports=top.ports()))
+
+    def generate():
+        config = getattr(configs, args.config)()
+        top = MaiaSDR(config)
+        platform = PlutoPlatform()
+        return amaranth.back.verilog.convert(
+            top, platform=platform, ports=top.ports())
+
+    write_verilog(args.output_file, generate,
+                  key={'name': 'MaiaSDR', 'config': args.config},
+                  modules=[__name__], cache=args.cache)
 
 
 if __name__ == '__main__':
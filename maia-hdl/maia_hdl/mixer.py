@@ -12,9 +12,26 @@ import amaranth.cli
 
 import numpy as np
 
+import functools
+
 from .cmult import Cmult3x
 from .pluto_platform import PlutoPlatform
-from .util import clamp_nbits
+from .util import clamp_nbits, model_dtype
+
+
+# The complex exponential table is cached, since it is needed each time that
+# a Mixer is elaborated or modelled.
+
+@functools.lru_cache(maxsize=16)
+def _cexp_table(phase_bits, exp_width):
+    n = 2**phase_bits
+    z = np.exp(-1j*2*np.pi*np.arange(n)/n)
+    scale = 2**(exp_width-1) - 1
+    tables = tuple(np.round(x * scale).astype('int')
+                   for x in [z.real, z.imag])
+    for table in tables:
+        table.flags.writeable = False
+    return tables
 
 
 class Mixer(Elaboratable):
@@ -91,12 +108,15 @@ class Mixer(Elaboratable):
     def delay(self):
         return self.cmult.delay + 1
 
-    def model(self, freq, re_in, im_in):
+    def model(self, freq, re_in, im_in, phase=0):
         assert len(re_in) == len(im_in)
-        phase = (np.arange(len(re_in)) * freq) % 2**self.nco_width
+        phase = (phase + np.arange(len(re_in)) * freq) % 2**self.nco_width
         phase = phase // 2**(self.nco_width-self.phase_bits)
-        cexp_re, cexp_im = [np.array(a, 'int')[phase] for a in self.cexp()]
-        re_in, im_in = [np.array(a, 'int') for a in [re_in, im_in]]
+        dtype = model_dtype(self.w + self.exp_width + 1)
+        cexp_re, cexp_im = [
+            a[phase].astype(dtype)
+            for a in _cexp_table(self.phase_bits, self.exp_width)]
+        re_in, im_in = [np.array(a, dtype) for a in [re_in, im_in]]
         trunc = self.exp_width - 1
         round_up = 2**(trunc - 1)
         re = clamp_nbits(
@@ -108,12 +128,8 @@ class Mixer(Elaboratable):
         return re, im
 
     def cexp(self):
-        n = 2**self.phase_bits
-        z = np.exp(-1j*2*np.pi*np.arange(n)/n)
-        scale = 2**(self.exp_width-1) - 1
-        re = [int(a) for a in np.round(z.real * scale)]
-        im = [int(a) for a in np.round(z.imag * scale)]
-        return re, im
+        return tuple(
+            x.tolist() for x in _cexp_table(self.phase_bits, self.exp_width))
 
     def elaborate(self, platform):
         m = Module()
@@ -0,0 +1,209 @@
+#
+# Copyright (C) 2024 Daniel Estevez <daniel@destevez.net>
+#
+# This file is part of maia-sdr
+#
+# SPDX-License-Identifier: MIT
+#
+
+from amaranth import *
+import amaranth.cli
+from amaranth.lib.memory import Memory
+import numpy as np
+
+
+class OverlapBuffer(Elaboratable):
+    """Overlap buffer
+
+    This module stores the input IQ samples in a circular buffer and reads
+    them out in blocks of ``2**active_order_log2`` samples, which are used as
+    the input vectors of an FFT. Consecutive blocks start
+    ``2**(active_order_log2 - overlap_log2)`` samples apart, so that they
+    overlap by a fraction ``1 - 2**-overlap_log2`` of their length (0%, 50%
+    or 75% for ``overlap_log2`` equal to 0, 1 or 2).
+
+    The blocks are read out at one sample per clock cycle, and the next block
+    starts as soon as all its samples have been written, so that the blocks
+    are presented back-to-back if possible. The output strobe is asserted
+    ``2**overlap_log2`` times per input sample on average, so the input
+    sample rate must be at most ``2**-overlap_log2`` times the clock
+    frequency. Otherwise the samples are overwritten before they are read,
+    which is signalled by the sticky ``overrun`` output.
+
+    The ``active_order_log2`` and ``overlap_log2`` inputs are only sampled
+    at the start of the blocks for which the total number of output samples
+    is a multiple of ``2**order_log2``. This guarantees that each output
+    block starts on a multiple of its own size, which is where an FFT that
+    uses the output strobe as clock enable starts its vectors.
+
+    Parameters
+    ----------
+    width : int
+        Width of the IQ samples.
+    order_log2 : int
+        log2 of the maximum block size, which is the size of the buffer.
+    overlap_log2_max : int
+        Maximum value of ``overlap_log2``.
+
+    Attributes
+    ----------
+    strobe_in : Signal(), in
+        Strobe for the input IQ samples.
+    re_in : Signal(signed(width)), in
+        Input samples real part.
+    im_in : Signal(signed(width)), in
+        Input samples imaginary part.
+    active_order_log2 : Signal(range(order_log2 + 1)), in
+        log2 of the block size. It must be at least ``overlap_log2``.
+    overlap_log2 : Signal(range(overlap_log2_max + 1)), in
+        log2 of the overlap factor.
+    strobe_out : Signal(), out
+        Strobe for the output samples.
+    re_out : Signal(signed(width)), out
+        Output samples real part.
+    im_out : Signal(signed(width)), out
+        Output samples imaginary part.
+    order_log2_out : Signal(range(order_log2 + 1)), out
+        log2 of the size of the block that is being output. This changes
+        together with ``strobe_out`` on the first sample of a block.
+    overrun : Signal(), out
+        Sticky overrun flag. It is asserted when the number of samples
+        written to the buffer and not read yet would exceed the buffer size,
+        so that some samples are overwritten before they are read. It stays
+        asserted until ``clear_overrun`` is pulsed.
+    clear_overrun : Signal(), in
+        Clears the ``overrun`` flag.
+    """
+    def __init__(self, width, order_log2, overlap_log2_max):
+        self.width = width
+        self.order_log2 = order_log2
+        self.overlap_log2_max = overlap_log2_max
+
+        self.strobe_in = Signal()
+        self.re_in = Signal(signed(width))
+        self.im_in = Signal(signed(width))
+        self.active_order_log2 = Signal(range(order_log2 + 1),
+                                        init=order_log2)
+        self.overlap_log2 = Signal(range(overlap_log2_max + 1))
+        self.strobe_out = Signal()
+        self.re_out = Signal(signed(width))
+        self.im_out = Signal(signed(width))
+        self.order_log2_out = Signal(range(order_log2 + 1), init=order_log2)
+        self.overrun = Signal()
+        self.clear_overrun = Signal()
+
+    def model(self, re_in, im_in, order_log2=None, overlap_log2=0):
+        """Model the overlap buffer.
+
+        Returns the concatenation of all the blocks that are complete in the
+        input, for a fixed block size and overlap factor.
+        """
+        if order_log2 is None:
+            order_log2 = self.order_log2
+        n = 2**order_log2
+        hop = n >> overlap_log2
+        blocks = max((len(re_in) - n) // hop + 1, 0)
+        idx = (np.arange(blocks)[:, np.newaxis] * hop
+               + np.arange(n)).ravel()
+        return np.asarray(re_in)[idx], np.asarray(im_in)[idx]
+
+    def elaborate(self, platform):
+        m = Module()
+
+        m.submodules.mem = mem = Memory(
+            shape=2 * self.width, depth=2**self.order_log2, init=[])
+        rdport = mem.read_port()
+        wrport = mem.write_port()
+
+        # Number of samples written to the buffer starting at next_start,
+        # which is the address of the first sample of the next block.
+        pending = Signal(self.order_log2 + 1)
+        pending_next = Signal(self.order_log2 + 2)
+        next_start = Signal(self.order_log2)
+        waddr = Signal(self.order_log2)
+        # State of the block that is being read.
+        busy = Signal()
+        raddr = Signal(self.order_log2)
+        remaining = Signal(self.order_log2 + 1)
+        first_read = Signal()
+        order_q = Signal.like(self.active_order_log2)
+        overlap_q = Signal.like(self.overlap_log2)
+        # Number of samples read, modulo the maximum block size.
+        out_count = Signal(self.order_log2)
+        out_count_next = Signal(self.order_log2)
+
+        last_read = Signal()
+        aligned = Signal()
+        new_order = Signal.like(order_q)
+        new_overlap = Signal.like(overlap_q)
+        new_size = Signal(self.order_log2 + 1)
+        new_hop = Signal(self.order_log2 + 1)
+        start = Signal()
+        m.d.comb += [
+            last_read.eq(busy & (remaining == 1)),
+            out_count_next.eq(out_count + busy),
+            aligned.eq(out_count_next == 0),
+            new_order.eq(Mux(aligned, self.active_order_log2, order_q)),
+            new_overlap.eq(Mux(aligned, self.overlap_log2, overlap_q)),
+            new_size.eq(1 << new_order),
+            new_hop.eq(new_size >> new_overlap),
+            # The sample that is written in this cycle is counted, since it
+            # will be read at least one cycle later.
+            start.eq((~busy | last_read)
+                     & (pending + self.strobe_in >= new_size)),
+            pending_next.eq(pending + self.strobe_in - Mux(start, new_hop, 0)),
+        ]
+
+        with m.If(pending_next > 2**self.order_log2):
+            m.d.sync += self.overrun.eq(1)
+        with m.If(self.clear_overrun):
+            m.d.sync += self.overrun.eq(0)
+
+        m.d.sync += [
+            waddr.eq(waddr + self.strobe_in),
+            pending.eq(pending_next),
+            out_count.eq(out_count_next),
+            self.strobe_out.eq(busy),
+        ]
+        with m.If(busy):
+            m.d.sync += [
+                raddr.eq(raddr + 1),
+                remaining.eq(remaining - 1),
+                first_read.eq(0),
+            ]
+            with m.If(last_read):
+                m.d.sync += busy.eq(0)
+            with m.If(first_read):
+                m.d.sync += self.order_log2_out.eq(order_q)
+        with m.If(start):
+            m.d.sync += [
+                busy.eq(1),
+                raddr.eq(next_start),
+                remaining.eq(new_size),
+                first_read.eq(1),
+                next_start.eq(next_start + new_hop),
+                order_q.eq(new_order),
+                overlap_q.eq(new_overlap),
+            ]
+
+        m.d.comb += [
+            wrport.en.eq(self.strobe_in),
+            wrport.addr.eq(waddr),
+            wrport.data.eq(Cat(self.re_in, self.im_in)),
+            rdport.en.eq(busy),
+            rdport.addr.eq(raddr),
+            self.re_out.eq(rdport.data[:self.width]),
+            self.im_out.eq(rdport.data[self.width:]),
+        ]
+
+        return m
+
+
+if __name__ == '__main__':
+    overlap = OverlapBuffer(16, 12, 2)
+    amaranth.cli.main(
+        overlap, ports=[
+            overlap.strobe_in, overlap.re_in, overlap.im_in,
+            overlap.active_order_log2, overlap.overlap_log2,
+            overlap.strobe_out, overlap.re_out, overlap.im_out,
+            overlap.order_log2_out, overlap.overrun, overlap.clear_overrun])
@@ -0,0 +1,225 @@
+#
+# Copyright (C) 2024 Daniel Estevez <daniel@destevez.net>
+#
+# This file is part of maia-sdr
+#
+# SPDX-License-Identifier: MIT
+#
+
+from amaranth.hdl import UnusedElaboratable
+import numpy as np
+
+import concurrent.futures
+import multiprocessing
+import os
+import warnings
+
+
+class BlockModel:
+    """Streaming model of a module that processes independent blocks
+
+    This class adapts a model function that processes each block of
+    ``block_size`` input samples independently of the others (such as
+    ``FFT.model``) to the interface of the streaming models, so that it can
+    be used with ``run_model``. The input samples that do not complete a
+    block are kept between calls to ``process``.
+
+    Parameters
+    ----------
+    model : Callable
+        Model function. It is called as ``model(re_in, im_in)`` with a
+        number of samples that is a multiple of ``block_size`` and returns
+        a tuple of output arrays.
+    block_size : int
+        Block size.
+    """
+    def __init__(self, model, block_size):
+        self.model = model
+        self.block_size = block_size
+        self.reset()
+
+    @property
+    def shard_alignment(self):
+        return self.block_size
+
+    @property
+    def shard_history(self):
+        return 0
+
+    def reset(self, offset=0):
+        """Discard the block in progress"""
+        self._re = np.zeros(0, 'int')
+        self._im = np.zeros(0, 'int')
+
+    def process(self, re_in, im_in):
+        """Process a chunk of input samples
+
+        Returns the outputs of the model for the blocks that are completed
+        in this chunk.
+        """
+        assert len(re_in) == len(im_in)
+        re = np.concatenate((self._re, re_in))
+        im = np.concatenate((self._im, im_in))
+        n = re.size - re.size % self.block_size
+        self._re, self._im = re[n:], im[n:]
+        return self.model(re[:n], im[:n])
+
+
+def run_model(model, re_in, im_in, *, processes=None, shard_blocks=None):
+    """Run a streaming model in parallel in several processes
+
+    The input is split into shards that are processed in a pool of worker
+    processes. The result, as well as the state in which ``model`` is left,
+    is the same as for ``model.reset()`` followed by
+    ``model.process(re_in, im_in)``.
+
+    The model must be one of the streaming model classes (``FIRModel``,
+    ``DDCModel``, ``SpectrometerModel``, ``BlockModel``, etc.), and it must
+    be picklable. Besides ``process``, these classes provide:
+
+    - ``shard_alignment``, the number of input samples in a block. The
+      input can be split at block boundaries, since the outputs for the
+      samples of a block are obtained together.
+
+    - ``shard_history``, the number of input samples that need to be
+      processed before the outputs are correct, because the model has a
+      memory (for instance, a FIR filter).
+
+    - ``reset(offset=0)``, which resets the model to the state it has before
+      processing the input sample of index ``offset``, except for the
+      memory mentioned above. This is used by models whose state depends
+      on the sample index, such as a DDC, whose mixer phase grows with it.
+
+    Each shard is preceded by the blocks of samples before it that cover
+    the shard history. The outputs of these blocks are discarded. Since
+    the outputs of the blocks at the start of the input can be incomplete
+    (for instance, if the model only produces an output when all the
+    samples of its history are available), the blocks that cover the shard
+    history and the next block are processed first, and the number of
+    outputs of the next block is used as the number of outputs of each
+    block.
+
+    The input samples and the outputs are passed to and from the workers in
+    shared memory buffers.
+
+    Parameters
+    ----------
+    model
+        Streaming model to run.
+    re_in : numpy.ndarray
+        Real part of the input.
+    im_in : numpy.ndarray
+        Imaginary part of the input.
+    processes : Optional[int]
+        Number of worker processes. By default, the number of CPUs is used.
+    shard_blocks : Optional[int]
+        Number of blocks in each shard. By default, the blocks are divided
+        evenly into one shard per worker.
+    """
+    re_in, im_in = (np.ascontiguousarray(x) for x in [re_in, im_in])
+    assert re_in.shape == im_in.shape and re_in.ndim == 1
+    if processes is None:
+        processes = os.cpu_count()
+    align = model.shard_alignment
+    nblocks = re_in.size // align
+    warmup_blocks = -(-model.shard_history // align)
+    model.reset()
+    if processes <= 1 or nblocks <= warmup_blocks + 1:
+        return model.process(re_in, im_in)
+
+    # The blocks that cover the shard history and the next block are
+    # processed here to determine the shape and dtype of the outputs.
+    head = warmup_blocks * align
+    history = model.process(re_in[:head], im_in[:head])
+    block = model.process(re_in[head:head + align], im_in[head:head + align])
+    first = [np.concatenate(x) for x in zip(history, block)]
+    if any(out.dtype == object for out in first):
+        # The outputs cannot be placed in shared memory
+        rest = model.process(re_in[head + align:], im_in[head + align:])
+        return tuple(np.concatenate(x) for x in zip(first, rest))
+
+    ctx = multiprocessing.get_context()
+    inputs = [_SharedArray(ctx, x.shape, x.dtype) for x in [re_in, im_in]]
+    for shared, x in zip(inputs, [re_in, im_in]):
+        shared.array()[:] = x
+    # The outputs of block j start at offset + j * rows for each output
+    rows = [len(out) for out in block]
+    offsets = [len(h) - warmup_blocks * r for h, r in zip(history, rows)]
+    outputs = [_SharedArray(ctx, (o + nblocks * r,) + out.shape[1:],
+                            out.dtype)
+               for out, o, r in zip(first, offsets, rows)]
+    for shared, out in zip(outputs, first):
+        shared.array()[:len(out)] = out
+
+    if shard_blocks is None:
+        shard_blocks = -(-(nblocks - warmup_blocks - 1) // processes)
+    shards = [(start, min(start + shard_blocks, nblocks))
+              for start in range(warmup_blocks + 1, nblocks, shard_blocks)]
+    with concurrent.futures.ProcessPoolExecutor(
+            min(processes, len(shards)), mp_context=ctx,
+            initializer=_init_worker,
+            initargs=(model, inputs, outputs, offsets, rows,
+                      warmup_blocks)) as pool:
+        futures = [pool.submit(_run_shard, *shard) for shard in shards]
+        # While the workers run, the model is brought to the state at the
+        # end of the input, and the samples after the last complete block
+        # are processed.
+        tail = _process_shard(model, re_in, im_in, nblocks, None,
+                              warmup_blocks)
+        for future in futures:
+            future.result()
+
+    result = []
+    for shared, out in zip(outputs, tail):
+        array = shared.array()
+        result.append(np.concatenate((array, out)) if len(out) else array)
+    return tuple(result)
+
+
+class _SharedArray:
+    # A NumPy array in shared memory that can be passed to worker processes
+    def __init__(self, ctx, shape, dtype):
+        self.shape = shape
+        self.dtype = np.dtype(dtype)
+        self.buffer = ctx.RawArray(
+            'b', max(int(np.prod(shape)) * self.dtype.itemsize, 1))
+
+    def array(self):
+        size = int(np.prod(self.shape))
+        return np.frombuffer(
+            self.buffer, self.dtype, count=size).reshape(self.shape)
+
+
+def _process_shard(model, re_in, im_in, start, stop, warmup_blocks):
+    # Processes the blocks from start to stop (or until the end of the input
+    # if stop is None), with model initialized from the preceding
+    # warmup_blocks blocks.
+    align = model.shard_alignment
+    warmup = max(start - warmup_blocks, 0)
+    model.reset(warmup * align)
+    model.process(re_in[warmup * align:start * align],
+                  im_in[warmup * align:start * align])
+    end = stop * align if stop is not None else None
+    return model.process(re_in[start * align:end], im_in[start * align:end])
+
+
+_worker = {}
+
+
+def _init_worker(model, inputs, outputs, offsets, rows, warmup_blocks):
+    # The copies of the elaboratables referenced by the model are never
+    # elaborated in the workers.
+    warnings.simplefilter('ignore', UnusedElaboratable)
+    _worker.update(model=model, inputs=[x.array() for x in inputs],
+                   outputs=[x.array() for x in outputs], offsets=offsets,
+                   rows=rows, warmup_blocks=warmup_blocks)
+
+
+def _run_shard(start, stop):
+    result = _process_shard(
+        _worker['model'], *_worker['inputs'], start, stop,
+        _worker['warmup_blocks'])
+    for array, out, o, r in zip(_worker['outputs'], result,
+                                _worker['offsets'], _worker['rows']):
+        assert len(out) == (stop - start) * r
+        array[o + start * r:o + stop * r] = out
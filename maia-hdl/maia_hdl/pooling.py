@@ -0,0 +1,247 @@
+#
+# Copyright (C) 2024 Daniel Estevez <daniel@destevez.net>
+#
+# This file is part of maia-sdr
+#
+# SPDX-License-Identifier: MIT
+#
+
+from amaranth import *
+import amaranth.cli
+import numpy as np
+
+from .spectrum_stage import SpectrumStage
+
+
+class SpectrumPooling(Elaboratable):
+    """Spectrum bin pooling
+
+    This module reads the integrated power of a spectrum from a BRAM (such as
+    the BRAM of a ``SpectrumIntegrator``) and reduces each group of
+    ``2**pooling_log2`` adjacent bins to a single bin, by computing either
+    their mean or their maximum. The result is written to a BRAM which has
+    the same read interface as the BRAM of the ``SpectrumIntegrator``.
+
+    The input and output powers are in the floating-point format used by the
+    ``SpectrumIntegrator``, which represents the integer ``value *
+    4**exponent``. The maximum is computed exactly. The mean is computed by
+    accumulating the bins of each group. Before each addition, the
+    accumulator and the new bin are converted to the larger of their
+    exponents, so the LSBs of the bins with smaller exponents are
+    truncated, as in the ``SpectrumIntegrator``.
+
+    The pooling starts when ``start`` is pulsed. The input BRAM is read at
+    one word per clock cycle, and ``done`` is pulsed when all the bins have
+    been written to the output BRAM. A ping-pong approach is used for the
+    output BRAM, so that its contents can be read while the next spectrum is
+    being pooled.
+
+    Parameters
+    ----------
+    sum_width : int
+        Width of the value part of the input.
+    exponent_width : int
+        Width of the exponent part of the input.
+    order_log2 : int
+        Address width of the input BRAM. The maximum number of bins is
+        ``2**order_log2``.
+    pooling_log2_max : int
+        Maximum value of ``pooling_log2``.
+
+    Attributes
+    ----------
+    start : Signal(), in
+        This signal should be pulsed for a clock cycle to start the pooling
+        of a spectrum. It is undefined behaviour to pulse this signal while
+        the pooling is in progress.
+    length : Signal(order_log2 + 1), in
+        Number of input bins. It must be a non-zero multiple of
+        ``2**pooling_log2``. It is latched when ``start`` is pulsed.
+    pooling_log2 : Signal(range(pooling_log2_max + 1)), in
+        log2 of the number of bins that are reduced to a single bin. It must
+        be at least 1. It is latched when ``start`` is pulsed.
+    max_mode : Signal(), in
+        Selects the maximum instead of the mean. It is latched when
+        ``start`` is pulsed.
+    done : Signal(), out
+        This signal is pulsed for one clock cycle when the pooling of a
+        spectrum is finished.
+    src_addr : Signal(order_log2), out
+        Read address for the input BRAM.
+    src_en : Signal(), out
+        Read enable for the input BRAM.
+    src_value : Signal(sum_width), in
+        Value part of the input BRAM read data. The read latency must be 2
+        cycles.
+    src_exponent : Signal(exponent_width), in
+        Exponent part of the input BRAM read data.
+    rdaddr : Signal(order_log2 - 1), in
+        Read address for the output BRAM that contains the previous spectrum.
+    rdata_value : Signal(sum_width), out
+        Value part of the read data for the output BRAM. The read latency is
+        2 cycles.
+    rdata_exponent : Signal(exponent_width), out
+        Exponent part of the read data for the output BRAM.
+    rden : Signal(), in
+        Read enable for the output BRAM.
+    """
+    def __init__(self, sum_width, exponent_width, order_log2,
+                 pooling_log2_max):
+        self.sumw = sum_width
+        self.ew = exponent_width
+        self.order_log2 = order_log2
+        self.pooling_log2_max = pooling_log2_max
+
+        self.start = Signal()
+        self.length = Signal(order_log2 + 1, init=2**order_log2)
+        self.pooling_log2 = Signal(range(pooling_log2_max + 1), init=1)
+        self.max_mode = Signal()
+        self.done = Signal()
+        self.src_addr = Signal(order_log2)
+        self.src_en = Signal()
+        self.src_value = Signal(sum_width)
+        self.src_exponent = Signal(exponent_width)
+        self.rdaddr = Signal(order_log2 - 1)
+        self.rdata_value = Signal(sum_width)
+        self.rdata_exponent = Signal(exponent_width)
+        self.rden = Signal()
+
+    def model(self, value, exponent, pooling_log2, max_mode):
+        """Model the spectrum pooling.
+
+        Returns the values and exponents of the pooled bins.
+        """
+        n = 2**pooling_log2
+        value = np.asarray(value, 'int64').reshape(-1, n)
+        exponent = np.asarray(exponent, 'int64').reshape(-1, n)
+        acc_value = value[:, 0]
+        acc_exponent = exponent[:, 0]
+        for j in range(1, n):
+            new_value = value[:, j]
+            new_exponent = exponent[:, j]
+            if max_mode:
+                greater = ((new_value << (2 * new_exponent))
+                           > (acc_value << (2 * acc_exponent)))
+                acc_value = np.where(greater, new_value, acc_value)
+                acc_exponent = np.where(greater, new_exponent, acc_exponent)
+            else:
+                common = np.maximum(acc_exponent, new_exponent)
+                acc_value = (
+                    (acc_value >> (2 * (common - acc_exponent)))
+                    + (new_value >> (2 * (common - new_exponent))))
+                acc_exponent = common
+        if not max_mode:
+            acc_value = acc_value >> pooling_log2
+        return acc_value, acc_exponent
+
+    def elaborate(self, platform):
+        m = Module()
+
+        m.submodules.stage = stage = SpectrumStage(
+            self.order_log2, self.sumw + self.ew, self.order_log2 - 1)
+
+        # Input BRAM read
+        pooling_log2 = Signal.like(self.pooling_log2)
+        max_mode = Signal()
+        with m.If(self.start):
+            m.d.sync += [
+                pooling_log2.eq(self.pooling_log2),
+                max_mode.eq(self.max_mode),
+            ]
+        m.d.comb += [
+            stage.start.eq(self.start),
+            stage.length.eq(self.length),
+            self.src_addr.eq(stage.src_addr),
+            self.src_en.eq(stage.src_en),
+        ]
+
+        # Accumulation of each group of bins
+        valid = stage.valid
+        position = Signal(self.pooling_log2_max)
+        first = Signal()
+        last = Signal()
+        m.d.comb += [
+            first.eq(position == 0),
+            last.eq(position == (1 << pooling_log2) - 1),
+        ]
+        with m.If(valid):
+            m.d.sync += position.eq(Mux(last, 0, position + 1))
+        with m.If(self.start):
+            m.d.sync += position.eq(0)
+
+        acc_value = Signal(self.sumw + self.pooling_log2_max,
+                           reset_less=True)
+        acc_exponent = Signal(self.ew, reset_less=True)
+        acc_value_next = Signal.like(acc_value)
+        acc_exponent_next = Signal.like(acc_exponent)
+        common = Signal(self.ew)
+        acc_shift = Signal(self.ew + 1)
+        new_shift = Signal(self.ew + 1)
+        greater = Signal()
+        m.d.comb += [
+            common.eq(Mux(self.src_exponent > acc_exponent,
+                          self.src_exponent, acc_exponent)),
+            acc_shift.eq(2 * (common - acc_exponent)),
+            new_shift.eq(2 * (common - self.src_exponent)),
+            greater.eq((self.src_value << (2 * self.src_exponent))
+                       > (acc_value << (2 * acc_exponent))),
+        ]
+        with m.If(first | (max_mode & greater)):
+            m.d.comb += [
+                acc_value_next.eq(self.src_value),
+                acc_exponent_next.eq(self.src_exponent),
+            ]
+        with m.Elif(max_mode):
+            m.d.comb += [
+                acc_value_next.eq(acc_value),
+                acc_exponent_next.eq(acc_exponent),
+            ]
+        with m.Else():
+            m.d.comb += [
+                acc_value_next.eq((acc_value >> acc_shift)
+                                  + (self.src_value >> new_shift)),
+                acc_exponent_next.eq(common),
+            ]
+        with m.If(valid):
+            m.d.sync += [
+                acc_value.eq(acc_value_next),
+                acc_exponent.eq(acc_exponent_next),
+            ]
+
+        # Output BRAM write
+        waddr = Signal(self.order_log2 - 1)
+        with m.If(valid & last):
+            m.d.sync += waddr.eq(waddr + 1)
+        with m.If(self.start):
+            m.d.sync += waddr.eq(0)
+        m.d.sync += [
+            stage.wren.eq(valid & last),
+            stage.waddr.eq(waddr),
+            stage.wdata.eq(
+                Cat(Mux(max_mode, acc_value_next,
+                        acc_value_next >> pooling_log2)[:self.sumw],
+                    acc_exponent_next)),
+            stage.swap.eq(valid & stage.last),
+        ]
+        m.d.comb += self.done.eq(stage.done)
+
+        # Output BRAM read
+        m.d.comb += [
+            stage.raddr.eq(self.rdaddr),
+            stage.rden.eq(self.rden),
+            self.rdata_value.eq(stage.rdata[:self.sumw]),
+            self.rdata_exponent.eq(stage.rdata[self.sumw:]),
+        ]
+
+        return m
+
+
+if __name__ == '__main__':
+    pooling = SpectrumPooling(47, 3, 12, 4)
+    amaranth.cli.main(
+        pooling, ports=[
+            pooling.start, pooling.length, pooling.pooling_log2,
+            pooling.max_mode, pooling.done, pooling.src_addr,
+            pooling.src_en, pooling.src_value, pooling.src_exponent,
+            pooling.rdaddr, pooling.rdata_value, pooling.rdata_exponent,
+            pooling.rden])
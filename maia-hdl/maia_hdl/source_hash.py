@@ -0,0 +1,107 @@
+#
+# Copyright (C) 2024 Daniel Estevez <daniel@destevez.net>
+#
+# This file is part of maia-sdr
+#
+# SPDX-License-Identifier: MIT
+#
+
+import ast
+import functools
+import hashlib
+import importlib.util
+import os
+import sys
+
+
+def source_closure(name, packages=('maia_hdl',)):
+    """Modules whose source code a module depends on
+
+    Returns the set formed by the module and the modules that it imports,
+    directly or indirectly, from the given packages. The imports are found
+    by parsing the source code. The ``__main__`` module (for instance, a
+    script) is also supported.
+
+    Parameters
+    ----------
+    name : str
+        Module name.
+    packages : Tuple[str]
+        Top-level packages whose modules are included.
+    """
+    closure = set()
+    pending = [name]
+    while pending:
+        module = pending.pop()
+        if module in closure:
+            continue
+        closure.add(module)
+        pending.extend(m for m in _imports(module)
+                       if m.partition('.')[0] in packages)
+    return closure
+
+
+def source_digest(modules):
+    """Hash of the source code of some modules
+
+    Returns the SHA-256 hex digest of the names and the contents of the
+    source files of the given modules. Names that do not correspond to a
+    module are ignored.
+    """
+    h = hashlib.sha256()
+    for name in sorted(modules):
+        path = module_file(name)
+        if path is None:
+            continue
+        with open(path, 'rb') as f:
+            contents = f.read()
+        h.update(f'{name}\0{len(contents)}\0'.encode())
+        h.update(contents)
+    return h.hexdigest()
+
+
+def module_file(name):
+    """Path of the source file of a module, or None if it is not a module"""
+    if name == '__main__':
+        return getattr(sys.modules['__main__'], '__file__', None)
+    try:
+        spec = importlib.util.find_spec(name)
+    except (ModuleNotFoundError, ValueError):
+        # name is not a module, but for instance a class inside a module
+        return None
+    if spec is None or spec.origin is None or not spec.origin.endswith('.py'):
+        return None
+    return spec.origin
+
+
+@functools.lru_cache
+def _imports(name):
+    # Returns the modules imported by a module
+    path = module_file(name)
+    if path is None:
+        return ()
+    if name == '__main__':
+        spec = sys.modules['__main__'].__spec__
+        name = spec.name if spec is not None else ''
+    if os.path.basename(path) == '__init__.py':
+        package = name
+    else:
+        package = name.rpartition('.')[0]
+    with open(path, 'rb') as f:
+        tree = ast.parse(f.read(), path)
+    imported = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom):
+            if node.level:
+                base = package.rsplit('.', node.level - 1)[0]
+                base = f'{base}.{node.module}' if node.module else base
+            else:
+                base = node.module
+            imported.add(base)
+            # "from package import module" imports a module
+            imported.update(
+                f'{base}.{alias.name}' for alias in node.names
+                if module_file(f'{base}.{alias.name}') is not None)
+        elif isinstance(node, ast.Import):
+            imported.update(alias.name for alias in node.names)
+    return tuple(sorted(imported))
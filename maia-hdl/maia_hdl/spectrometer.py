@@ -12,7 +12,11 @@ import numpy as np
 
 from .dma import DmaBRAMWrite
 from .fft import FFT
-from .spectrum_integrator import SpectrumIntegrator
+from .log_power import LogPower
+from .overlap import OverlapBuffer
+from .pooling import SpectrumPooling
+from .spectrum_integrator import SpectrumIntegrator, SpectrumIntegratorModel
+from .util import model_dtype
 
 
 class Spectrometer(Elaboratable):
@@ -22,6 +26,34 @@ class Spectrometer(Elaboratable):
     waterfall data. The data is written to an AXI bus using a DMA
     (DMABramWrite).
 
+    Optionally, the FFTs can be computed on overlapping blocks of input
+    samples. An OverlapBuffer stores the input samples and presents blocks
+    that start every ``2**(active_fft_order_log2 - overlap_log2)`` samples to
+    the FFT, which runs ``2**overlap_log2`` times faster than the input
+    sample rate. The number of integrations counts FFTs, so the integration
+    time is divided by ``2**overlap_log2`` for the same number of
+    integrations. The input sample rate must be at most
+    ``2**-overlap_log2`` times the clock frequency.
+
+    Optionally, the average power and the peak power can be computed at the
+    same time (see the ``dual`` parameter). In this case, the size of the
+    DMA buffers is doubled, and each buffer contains the average power
+    followed by the peak power when dual mode is enabled.
+
+    Optionally, groups of ``2**pooling_log2`` adjacent bins can be reduced to
+    a single bin by computing their mean or maximum in a SpectrumPooling,
+    which reduces the size of the DMA transfers by the same factor.
+
+    Optionally, the spectra can be converted to 16-bit fixed-point power in
+    dB by a LogPower (see the ``log_power`` parameter), which packs 4 bins
+    in each 64-bit word. This reduces the size of the DMA transfers by a
+    factor of 4. The DMA transfers at least 64 bins in this mode, so the
+    last words of the buffer are not valid if there are fewer bins after
+    pooling. The contents of the DMA buffers when pooling or log-power mode
+    are used can be modelled by applying the ``model`` methods of the
+    ``pooling`` and ``log_power`` attributes to the output of the ``model``
+    method of the spectrometer.
+
     Parameters
     ----------
     dma_base_address : int
@@ -35,9 +67,33 @@ class Spectrometer(Elaboratable):
         Name of the clock domain of the 2x clock.
     domain_3x : str
         Name of the clock domain of the 2x clock.
+    fft_order_log2_min : Optional[int]
+        log2 of the minimum FFT size that can be selected at runtime with
+        the ``active_fft_order_log2`` input. Since the FFT uses a radix-2^2
+        architecture, only the sizes ``2**order`` for which
+        ``fft_order_log2 - order`` is even are supported. If this is
+        ``None``, the FFT size is fixed to ``2**fft_order_log2``.
+    overlap_log2_max : int
+        log2 of the maximum overlap factor that can be selected at runtime
+        with the ``overlap_log2`` input. If this is zero, the overlap buffer
+        is not used.
+    dual : bool
+        Includes support for dual mode, in which the average power and the
+        peak power are computed at the same time.
+    pooling_log2_max : int
+        log2 of the maximum pooling factor that can be selected at runtime
+        with the ``pooling_log2`` input. If this is zero, the pooling stage
+        is not used.
+    log_power : bool
+        Includes support for log-power mode, in which the spectra are
+        converted to dB before they are written to the DMA buffers.
 
     Attributes
     ----------
+    fft_order_log2 : int
+        log2 of the maximum FFT size.
+    orders : List[int]
+        log2 of the FFT sizes that are supported, in decreasing order.
     strobe_in : Signal(), in
         Strobe in for the input IQ samples.
     common_edge_2x : Signal(), in
@@ -58,13 +114,49 @@ class Spectrometer(Elaboratable):
         integration prematurely.
     peak_detect : Signal(), in
         Enables peak detect mode (instead of average power mode).
+    active_fft_order_log2 : Signal(range(fft_order_log2 + 1)), in
+        log2 of the FFT size to use. This is only present when
+        ``fft_order_log2_min`` is not ``None``. The integrations have
+        ``2**active_fft_order_log2`` bins, and the DMA only writes this
+        number of bins to each buffer. Values that are not in ``orders`` are
+        ignored, and the previous FFT size is kept. The integration in
+        progress is aborted when the FFT size changes, and the first
+        integration after the change contains invalid data. When the overlap
+        buffer is used, the change takes effect at the start of the next
+        block for which the number of samples presented to the FFT is a
+        multiple of ``2**fft_order_log2``.
+    overlap_log2 : Signal(range(overlap_log2_max + 1)), in
+        log2 of the overlap factor. This is only present when
+        ``overlap_log2_max`` is not zero. The overlap between consecutive
+        FFTs is a fraction ``1 - 2**-overlap_log2`` of the FFT size.
+    dual_mode : Signal(), in
+        Enables dual mode. The ``peak_detect`` input is ignored in dual mode.
+        This is only present when ``dual`` is ``True``.
+    pooling_log2 : Signal(range(pooling_log2_max + 1)), in
+        log2 of the number of adjacent bins that are reduced to a single
+        bin. This is only present when ``pooling_log2_max`` is not zero.
+    pooling_max : Signal(), in
+        Selects the maximum instead of the mean for the pooling. This is
+        only present when ``pooling_log2_max`` is not zero.
+    log_mode : Signal(), in
+        Enables log-power mode. This is only present when ``log_power`` is
+        ``True``. The DMA buffer that is being transferred when this signal
+        changes contains invalid data.
     last_buffer : Signal(dma_buffers_log2), out
         Indicates the last buffer to which the DMA has written to.
+    overlap_overrun : Signal(), out
+        Sticky flag that indicates that some input samples have been
+        overwritten in the overlap buffer before being read, because the
+        input sample rate is too high for the overlap factor. It is cleared
+        when ``abort`` is pulsed. This is only present when
+        ``overlap_log2_max`` is not zero.
     interrupt_out : Signal(), out
         Pulsed each time that a DMA transfer finishes.
     """
     def __init__(self, dma_base_address, dma_buffers_log2, dma_name=None,
-                 domain_2x='clk2x', domain_3x='clk3x'):
+                 domain_2x='clk2x', domain_3x='clk3x',
+                 fft_order_log2_min=None, overlap_log2_max=0, dual=False,
+                 pooling_log2_max=0, log_power=False):
         self._domain_2x = domain_2x
         self._domain_3x = domain_3x
         self.fft_order_log2 = 12
@@ -72,9 +164,10 @@ class Spectrometer(Elaboratable):
 
         self.nint_width = 10
 
+        self.dual = dual
         self.dma = DmaBRAMWrite(
             dma_base_address, dma_buffers_log2,
-            self.fft_order_log2, name=dma_name)
+            self.fft_order_log2 + dual, name=dma_name)
 
         self.strobe_in = Signal()
         self.common_edge_2x = Signal()
@@ -85,10 +178,92 @@ class Spectrometer(Elaboratable):
         self.number_integrations = Signal(self.nint_width)
         self.abort = Signal()
         self.peak_detect = Signal()
+        if dual:
+            self.dual_mode = Signal()
+        if pooling_log2_max:
+            self.pooling_log2 = Signal(range(pooling_log2_max + 1))
+            self.pooling_max = Signal()
+        if log_power:
+            self.log_mode = Signal()
+        self.variable_order = fft_order_log2_min is not None
+        if self.variable_order:
+            self.active_fft_order_log2 = Signal(
+                range(self.fft_order_log2 + 1), init=self.fft_order_log2)
+        self.overlap_log2_max = overlap_log2_max
+        if overlap_log2_max:
+            self.overlap_log2 = Signal(range(overlap_log2_max + 1))
+            self.overlap_overrun = Signal()
         self.last_buffer = Signal(dma_buffers_log2)
 
         self.interrupt_out = Signal()
 
+        if overlap_log2_max:
+            self.overlap = OverlapBuffer(
+                self.width_in, self.fft_order_log2, overlap_log2_max)
+        else:
+            self.overlap = None
+
+        truncates = [[0, 1]] * (self.fft_order_log2 // 2)
+        self.fft = FFT(
+            self.width_in, self.fft_order_log2, 'R22',
+            width_twiddle=16, truncates=truncates,
+            use_bram_reg=True, window='blackmanharris',
+            cmult3x=True,
+            domain_2x=self._domain_2x, domain_3x=self._domain_3x,
+            order_log2_min=fft_order_log2_min)
+        self.orders = self.fft.orders
+        width_fft_out = len(self.fft.re_out)
+        assert width_fft_out == 22
+
+        spectrum_fp_width = 18
+        self.integrator = SpectrumIntegrator(
+            self._domain_3x, width_fft_out, spectrum_fp_width,
+            self.nint_width, self.fft_order_log2,
+            fft_order_log2_min=(self.orders[-1]
+                                if self.variable_order else None),
+            dual=dual)
+
+        if pooling_log2_max:
+            self.pooling = SpectrumPooling(
+                len(self.integrator.rdata_value),
+                len(self.integrator.rdata_exponent),
+                self.fft_order_log2 + dual, pooling_log2_max)
+        else:
+            self.pooling = None
+        if log_power:
+            self.log_power = LogPower(
+                len(self.integrator.rdata_value),
+                len(self.integrator.rdata_exponent),
+                self.fft_order_log2 + dual)
+        else:
+            self.log_power = None
+
+    def model(self, nint, re_in, im_in, peak_detect, fft_order_log2=None,
+              overlap_log2=0, dual=False):
+        """Model the spectrometer.
+
+        Returns the values and exponents of all the integrations that are
+        finished, as arrays of shape ``(integrations, 2**fft_order_log2)``
+        (or ``(integrations, 2 * 2**fft_order_log2)`` in dual mode) ordered as
+        in the DMA buffers. By default, the maximum FFT size is used.
+        """
+        return SpectrometerModel(
+            self, nint, peak_detect, fft_order_log2,
+            overlap_log2, dual).process(re_in, im_in)
+
+    def model_stream(self, nint, blocks, peak_detect, fft_order_log2=None,
+                     overlap_log2=0, dual=False):
+        """Model the spectrometer over a stream of IQ blocks.
+
+        This is a generator that consumes ``(re, im)`` blocks of any size from
+        the iterable ``blocks`` and yields a ``(value, exponent)`` tuple for
+        each integration as soon as it is finished.
+        """
+        model = SpectrometerModel(self, nint, peak_detect, fft_order_log2,
+                                  overlap_log2, dual)
+        for re_in, im_in in blocks:
+            yield from zip(*model.process(re_in, im_in))
+
     def ports(self):
         return self.dma.axi.ports() + [
             self.strobe_in,
@@ -99,61 +274,167 @@ class Spectrometer(Elaboratable):
             self.abort,
             self.last_buffer,
             self.interrupt_out,
-        ]
+        ] + ([self.active_fft_order_log2] if self.variable_order else []) + (
+            [self.overlap_log2, self.overlap_overrun]
+            if self.overlap is not None else []) + (
+            [self.dual_mode] if self.dual else []) + (
+            [self.pooling_log2, self.pooling_max]
+            if self.pooling is not None else []) + (
+            [self.log_mode] if self.log_power is not None else [])
 
     def elaborate(self, platform):
         m = Module()
 
-        truncates = [[0, 1]] * (self.fft_order_log2 // 2)
-        m.submodules.fft = fft = FFT(
-            self.width_in, self.fft_order_log2, 'R22',
-            width_twiddle=16, truncates=truncates,
-            use_bram_reg=True, window='blackmanharris',
-            cmult3x=True,
-            domain_2x=self._domain_2x, domain_3x=self._domain_3x)
-        width_fft_out = len(fft.re_out)
-        assert width_fft_out == 22
+        m.submodules.fft = fft = self.fft
+        if self.variable_order:
+            # Unsupported FFT sizes are ignored, and the previous size is
+            # kept, so that all the blocks use the same supported size.
+            active_order = Signal.like(self.active_fft_order_log2)
+            with m.Switch(self.active_fft_order_log2):
+                for order in self.orders:
+                    with m.Case(order):
+                        m.d.sync += active_order.eq(order)
+        if self.overlap is not None:
+            m.submodules.overlap = overlap = self.overlap
+            m.d.comb += [
+                overlap.strobe_in.eq(self.strobe_in),
+                overlap.re_in.eq(self.re_in),
+                overlap.im_in.eq(self.im_in),
+                overlap.overlap_log2.eq(self.overlap_log2),
+                overlap.clear_overrun.eq(self.abort),
+                self.overlap_overrun.eq(overlap.overrun),
+            ]
+            if self.variable_order:
+                m.d.comb += overlap.active_order_log2.eq(active_order)
+                # The FFT size changes on a block boundary of the overlap
+                # buffer.
+                order_log2 = overlap.order_log2_out
+            strobe = overlap.strobe_out
+            re_in, im_in = overlap.re_out, overlap.im_out
+        else:
+            if self.variable_order:
+                order_log2 = active_order
+            strobe = self.strobe_in
+            re_in, im_in = self.re_in, self.im_in
+        m.submodules.integrator = integrator = self.integrator
+        m.submodules.dma = dma = self.dma
+
+        dma_busy_q = Signal()
+        m.d.sync += dma_busy_q.eq(dma.busy)
+
+        abort = Signal()
+        m.d.comb += abort.eq(self.abort)
+        if self.variable_order:
+            # The integration in progress is aborted when the FFT size
+            # changes, since its data is not valid.
+            order_q = Signal.like(order_log2)
+            m.d.sync += order_q.eq(order_log2)
+            m.d.comb += [
+                abort.eq(self.abort | (order_q != order_log2)),
+                fft.active_order_log2.eq(order_log2),
+                integrator.active_order_log2.eq(order_log2),
+            ]
+            nbins = 1 << order_log2
+        else:
+            nbins = C(2**self.fft_order_log2)
+        if self.dual:
+            # In dual mode, the DMA reads the average power followed by the
+            # peak power
+            m.d.comb += integrator.dual_mode.eq(self.dual_mode)
+            nbins = nbins << self.dual_mode
+
+        # The spectra go through the optional pooling and log-power stages
+        # before they are written by the DMA. Each stage reads the BRAM of
+        # the previous one after it has finished. The spec_* signals give the
+        # read interface of the output of the pooling stage.
+        spec_rdaddr = Signal.like(integrator.rdaddr)
+        spec_rden = Signal()
+        spec_value = Signal.like(integrator.rdata_value)
+        spec_exponent = Signal.like(integrator.rdata_exponent)
+        spec_done = Signal()
+        spec_nbins = Signal.like(dma.length)
+        m.d.comb += [
+            integrator.rdaddr.eq(spec_rdaddr),
+            integrator.rden.eq(spec_rden),
+            spec_value.eq(integrator.rdata_value),
+            spec_exponent.eq(integrator.rdata_exponent),
+            spec_done.eq(integrator.done),
+            spec_nbins.eq(nbins),
+        ]
+        if self.pooling is not None:
+            m.submodules.pooling = pooling = self.pooling
+            pooling_enable = self.pooling_log2 != 0
+            m.d.comb += [
+                pooling.start.eq(integrator.done & pooling_enable),
+                pooling.length.eq(nbins),
+                pooling.pooling_log2.eq(self.pooling_log2),
+                pooling.max_mode.eq(self.pooling_max),
+                pooling.src_value.eq(integrator.rdata_value),
+                pooling.src_exponent.eq(integrator.rdata_exponent),
+                pooling.rdaddr.eq(spec_rdaddr),
+                pooling.rden.eq(spec_rden),
+            ]
+            with m.If(pooling_enable):
+                m.d.comb += [
+                    integrator.rdaddr.eq(pooling.src_addr),
+                    integrator.rden.eq(pooling.src_en),
+                    spec_value.eq(pooling.rdata_value),
+                    spec_exponent.eq(pooling.rdata_exponent),
+                    spec_done.eq(pooling.done),
+                    spec_nbins.eq(nbins >> self.pooling_log2),
+                ]
 
-        spectrum_fp_width = 18
-        m.submodules.integrator = integrator = SpectrumIntegrator(
-            self._domain_3x, width_fft_out, spectrum_fp_width,
-            self.nint_width, self.fft_order_log2)
         # Form 64-bit rdata for the DMA. The exponent is placed in the 8 MSBs
         # and the value is placed in the LSBs, leaving a gap with zeros between
         # them
-        dma_rdata = Cat(integrator.rdata_value,
-                        Const(0, 64 - 8 - len(integrator.rdata_value)),
-                        integrator.rdata_exponent,
-                        Const(0, 8 - len(integrator.rdata_exponent)))
-        assert len(integrator.rdata_value) == 47
-        assert len(integrator.rdata_exponent) == 3
+        dma_rdata = Cat(spec_value, Const(0, 64 - 8 - len(spec_value)),
+                        spec_exponent, Const(0, 8 - len(spec_exponent)))
+        assert len(spec_value) == 47
+        assert len(spec_exponent) == 3
         assert len(dma_rdata) == 64
-
-        m.submodules.dma = dma = self.dma
-
-        dma_busy_q = Signal()
-        m.d.sync += dma_busy_q.eq(dma.busy)
+        m.d.comb += [
+            spec_rdaddr.eq(dma.raddr),
+            spec_rden.eq(dma.ren),
+            dma.rdata.eq(dma_rdata),
+            dma.start.eq(spec_done),
+            dma.length.eq(spec_nbins),
+        ]
+        if self.log_power is not None:
+            m.submodules.log_power = log_power = self.log_power
+            m.d.comb += [
+                log_power.start.eq(spec_done & self.log_mode),
+                log_power.length.eq(spec_nbins),
+                log_power.src_value.eq(spec_value),
+                log_power.src_exponent.eq(spec_exponent),
+                log_power.raddr.eq(dma.raddr),
+                log_power.rden.eq(dma.ren),
+            ]
+            with m.If(self.log_mode):
+                m.d.comb += [
+                    spec_rdaddr.eq(log_power.src_addr),
+                    spec_rden.eq(log_power.src_en),
+                    dma.rdata.eq(log_power.rdata),
+                    dma.start.eq(log_power.done),
+                    # The DMA transfers at least one 16-word burst
+                    dma.length.eq(Mux(spec_nbins < 64, 16,
+                                      spec_nbins >> 2)),
+                ]
 
         m.d.comb += [
-            fft.clken.eq(self.strobe_in),
+            fft.clken.eq(strobe),
             fft.common_edge_2x.eq(self.common_edge_2x),
             fft.common_edge_3x.eq(self.common_edge_3x),
-            fft.re_in.eq(self.re_in),
-            fft.im_in.eq(self.im_in),
+            fft.re_in.eq(re_in),
+            fft.im_in.eq(im_in),
 
             integrator.nint.eq(self.number_integrations),
-            integrator.abort.eq(self.abort),
+            integrator.abort.eq(abort),
             integrator.peak_detect.eq(self.peak_detect),
-            integrator.clken.eq(self.strobe_in),
+            integrator.clken.eq(strobe),
             integrator.common_edge.eq(self.common_edge_3x),
             integrator.input_last.eq(fft.out_last),
             integrator.re_in.eq(fft.re_out),
             integrator.im_in.eq(fft.im_out),
-            integrator.rdaddr.eq(dma.raddr),
-            integrator.rden.eq(dma.ren),
-
-            dma.rdata.eq(dma_rdata),
-            dma.start.eq(integrator.done),
             self.last_buffer.eq(dma.last_buffer),
 
             self.interrupt_out.eq(~dma.busy & dma_busy_q),
@@ -161,6 +442,84 @@ class Spectrometer(Elaboratable):
         return m
 
 
+class SpectrometerModel:
+    """Streaming model of a Spectrometer
+
+    This class models the FFT and the spectrum integrator of a
+    ``Spectrometer`` over an input that is supplied in blocks of any size.
+    The input samples that are needed for the next FFT vectors and the
+    integration in progress are kept between calls to ``process``.
+
+    Parameters
+    ----------
+    spectrometer : Spectrometer
+        Spectrometer to model.
+    nint : int
+        Number of integrations.
+    peak_detect : bool
+        Selects peak detect mode (instead of average power mode).
+    fft_order_log2 : Optional[int]
+        log2 of the FFT size. By default, the maximum FFT size of the
+        spectrometer is used.
+    overlap_log2 : int
+        log2 of the overlap factor.
+    dual : bool
+        Selects dual mode.
+    """
+    def __init__(self, spectrometer, nint, peak_detect, fft_order_log2=None,
+                 overlap_log2=0, dual=False):
+        self.spectrometer = spectrometer
+        if fft_order_log2 is None:
+            fft_order_log2 = spectrometer.fft_order_log2
+        if fft_order_log2 not in spectrometer.orders:
+            raise ValueError(f'unsupported FFT order {fft_order_log2}')
+        if not 0 <= overlap_log2 <= spectrometer.overlap_log2_max:
+            raise ValueError(f'unsupported overlap {overlap_log2}')
+        self.fft_order_log2 = fft_order_log2
+        self.overlap_log2 = overlap_log2
+        self.vlen = 2**fft_order_log2
+        self.hop = self.vlen >> overlap_log2
+        self.integrator = SpectrumIntegratorModel(
+            spectrometer.integrator, nint, peak_detect, fft_order_log2, dual)
+        self.dtype = model_dtype(spectrometer.width_in)
+        self.reset()
+
+    @property
+    def shard_alignment(self):
+        return self.integrator.nint * self.hop
+
+    @property
+    def shard_history(self):
+        return self.vlen - self.hop
+
+    def reset(self, offset=0):
+        """Discard the FFT vectors and the integration in progress"""
+        self._re = np.zeros(0, self.dtype)
+        self._im = np.zeros(0, self.dtype)
+        self.integrator.reset()
+
+    def process(self, re_in, im_in):
+        """Process a block of IQ samples
+
+        Returns the values and exponents of the integrations that finish in
+        this block, as arrays of shape ``(integrations, 2**fft_order_log2)``
+        ordered as in the DMA buffers.
+        """
+        assert len(re_in) == len(im_in)
+        fft = self.spectrometer.fft
+        self._re = np.concatenate((self._re, np.array(re_in, self.dtype)))
+        self._im = np.concatenate((self._im, np.array(im_in, self.dtype)))
+        # Each FFT vector starts hop samples after the previous one
+        vectors = max((self._re.size - self.vlen) // self.hop + 1, 0)
+        idx = (np.arange(vectors)[:, np.newaxis] * self.hop
+               + np.arange(self.vlen)).ravel()
+        re_fft, im_fft = fft.model(self._re[idx], self._im[idx],
+                                   self.fft_order_log2)
+        self._re = self._re[vectors * self.hop:]
+        self._im = self._im[vectors * self.hop:]
+        return self.integrator.process(re_fft, im_fft)
+
+
 if __name__ == '__main__':
     spectrometer = Spectrometer(0x1000_0000, 5)
     amaranth.cli.main(
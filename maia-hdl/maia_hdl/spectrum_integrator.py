@@ -15,7 +15,7 @@ import numpy as np
 from .cpwr import CpwrPeak
 from .floating_point import IQToFloatingPoint, MakeCommonExponent
 from .pluto_platform import PlutoPlatform
-from .util import bit_invert
+from .util import bit_invert_permutation, model_dtype
 
 
 class SpectrumIntegrator(Elaboratable):
@@ -30,6 +30,19 @@ class SpectrumIntegrator(Elaboratable):
     read the previous integration while the current integration is being
     computed.
 
+    Optionally, the average power and the peak power can be computed at the
+    same time (dual mode). The peak power is kept in a second pair of
+    ping-pong BRAMs. The power computed by the CpwrPeak for the average is
+    also compared with the peak power, which is first converted to the
+    exponent of the average. Therefore, the peak power values in dual mode
+    can have less precision than in peak detect mode, since their exponent
+    is never smaller than the exponent of the average. The exponent of the
+    peak in peak detect mode is at most one unit smaller than the exponent
+    of the average, so the relative error of the peak power in dual mode
+    with respect to peak detect mode is smaller than
+    ``2**(4 - input_fp_width)``. The reader module needs to read twice as
+    many words during each integration in dual mode.
+
     Floating-point representation as defined in the floating_point module is
     used to increase the dynamic range. For instance, for a 22-bit input, the
     input input is converted to a 18-bit mantissa and 3-bit exponent (with a
@@ -50,9 +63,22 @@ class SpectrumIntegrator(Elaboratable):
         Width of the input that indicates the number of integrations.
     fft_order_log2 : int
         Determines the FFT size, as ``2**fft_order_log2``.
+    fft_order_log2_min : Optional[int]
+        If this is not ``None``, the FFT size can be changed at runtime with
+        the ``active_order_log2`` input to any size between
+        ``2**fft_order_log2_min`` and ``2**fft_order_log2``.
+    dual : bool
+        If this is ``True``, the BRAMs for the peak power are included, so
+        that dual mode can be used.
 
     Attributes
     ----------
+    active_order_log2 : Signal(range(fft_order_log2 + 1)), in
+        log2 of the FFT size. This is only present when
+        ``fft_order_log2_min`` is not ``None``. The integration is stored in
+        the first ``2**active_order_log2`` addresses of the BRAM. This should
+        only be changed together with an abort, since the integration in
+        progress when the size changes is not valid.
     nint : Signal(nint_width), in
         Number of integrations to perform. This signal is only latched
         after the current integration has finished.
@@ -66,6 +92,10 @@ class SpectrumIntegrator(Elaboratable):
         integration will finish when the end of the current FFT is reached.
     peak_detect : Signal(), in
         Enables peak detect mode (instead of average power mode).
+    dual_mode : Signal(), in
+        Enables dual mode, in which both the average power and the peak
+        power are computed. The ``peak_detect`` input is ignored in dual
+        mode. This is only present when ``dual`` is ``True``.
     clken : Signal(), in
         Clock enable.
     common_edge : Signal(), in
@@ -81,8 +111,11 @@ class SpectrumIntegrator(Elaboratable):
     done : Signal(), out
         This signal is pulsed for one clock cycle whenever an integration
         is finished.
-    rdaddr : Signal(fft_order_log2), in
-        Read address for the BRAM that contains the previous integration.
+    rdaddr : Signal(fft_order_log2 + dual), in
+        Read address for the BRAM that contains the previous integration. In
+        dual mode, the peak power follows the average power, so that the
+        addresses from ``2**active_order_log2`` to
+        ``2 * 2**active_order_log2 - 1`` are used for the peak power.
     rdata_value : Signal(sum_width), out
         Value (mantissa) part of the read data for the BRAM that contains the
         previous integration.
@@ -93,13 +126,19 @@ class SpectrumIntegrator(Elaboratable):
         Read enable for the BRAM that contains the previous integration.
     """
     def __init__(self, domain_3x, input_width, input_fp_width,
-                 nint_width, fft_order_log2):
+                 nint_width, fft_order_log2, fft_order_log2_min=None,
+                 dual=False):
         self.w = input_width
         self.fw = input_fp_width
         self.nw = nint_width
         # Here + 1 accounts for the addition of the real and imaginary parts.
         self.sumw = 2*self.fw + 1 + nint_width
         self.order_log2 = fft_order_log2
+        self.dual = dual
+        self.orders = (
+            list(range(fft_order_log2, fft_order_log2_min - 1, -1))
+            if fft_order_log2_min is not None
+            else [fft_order_log2])
 
         self.to_fp = IQToFloatingPoint(self.w, self.fw)
         self.ew = len(self.to_fp.exponent_out)
@@ -108,16 +147,21 @@ class SpectrumIntegrator(Elaboratable):
             a_complex=True, b_power=True, b_signed=False)
         self.cpwr = CpwrPeak(domain_3x, self.fw, self.sumw)
 
+        if fft_order_log2_min is not None:
+            self.active_order_log2 = Signal(range(fft_order_log2 + 1),
+                                            init=fft_order_log2)
         self.nint = Signal(nint_width)
         self.abort = Signal()
         self.peak_detect = Signal()
+        if dual:
+            self.dual_mode = Signal()
         self.clken = Signal()
         self.common_edge = Signal()
         self.input_last = Signal()
         self.re_in = Signal(signed(input_width))
         self.im_in = Signal(signed(input_width))
         self.done = Signal()
-        self.rdaddr = Signal(fft_order_log2)
+        self.rdaddr = Signal(fft_order_log2 + dual)
         self.rdata_value = Signal(self.sumw)
         self.rdata_exponent = Signal(self.ew)
         self.rden = Signal()
@@ -126,35 +170,11 @@ class SpectrumIntegrator(Elaboratable):
     def model_vlen(self, nint):
         return 2**self.order_log2 * nint
 
-    def model(self, nint, re_in, im_in, peak_detect):
-        re_in, im_in = (
-            np.array(x, 'int').reshape(-1, nint, 2**self.order_log2)
-            for x in [re_in, im_in])
-        re_in, im_in, exp_in = self.to_fp.model(re_in, im_in)
-        acc, acc_exp = (np.zeros((re_in.shape[0], 2**self.order_log2), 'int')
-                        for _ in range(2))
-        for j in range(nint):
-            re_in_c, im_in_c, acc_c, _, exp_c = self.common_exp.model(
-                re_in[:, j], im_in[:, j], exp_in[:, j],
-                acc, np.zeros_like(acc), acc_exp)
-            cpwr_result = self.cpwr.model(
-                re_in_c, im_in_c, acc_c, peak_detect)
-            if peak_detect:
-                pwr, is_greater = cpwr_result
-                acc[is_greater] = pwr[is_greater]
-                acc_exp[is_greater] = exp_c[is_greater]
-            else:
-                acc[:] = cpwr_result
-                acc_exp[:] = exp_c
-        # Bit reverse accumulator order
-        acc = acc[:, [bit_invert(n, self.order_log2, 1)
-                      for n in range(2**self.order_log2)]]
-        acc_exp = acc_exp[:, [bit_invert(n, self.order_log2, 1)
-                              for n in range(2**self.order_log2)]]
-        # Perform fftshift
-        acc = np.fft.fftshift(acc, axes=-1)
-        acc_exp = np.fft.fftshift(acc_exp, axes=-1)
-        return acc.ravel(), acc_exp.ravel()
+    def model(self, nint, re_in, im_in, peak_detect, order_log2=None,
+              dual=False):
+        values, exponents = SpectrumIntegratorModel(
+            self, nint, peak_detect, order_log2, dual).process(re_in, im_in)
+        return values.ravel(), exponents.ravel()
 
     def elaborate(self, platform):
         m = Module()
@@ -162,20 +182,29 @@ class SpectrumIntegrator(Elaboratable):
         m.submodules.common_exp = common_exp = self.common_exp
         m.submodules.cpwr = cpwr = self.cpwr
 
-        mems = [Memory(shape=self.sumw+self.ew, depth=2**self.order_log2,
-                       init=[])
-                for _ in range(2)]
-        m.submodules.mem0 = mems[0]
-        m.submodules.mem1 = mems[1]
-        rdports = [mem.read_port() for mem in mems]
-        # BRAM output register
-        rdports_reg = [Signal(self.sumw+self.ew, name=f'rdport{j}_reg',
-                              reset_less=True)
-                       for j in range(2)]
-        for j in range(2):
-            with m.If(rdports[j].en):
-                m.d.sync += rdports_reg[j].eq(rdports[j].data)
-        wrports = [mem.write_port() for mem in mems]
+        def ping_pong_brams(prefix):
+            mems = [Memory(shape=self.sumw+self.ew, depth=2**self.order_log2,
+                           init=[])
+                    for _ in range(2)]
+            m.submodules[f'{prefix}mem0'] = mems[0]
+            m.submodules[f'{prefix}mem1'] = mems[1]
+            rdports = [mem.read_port() for mem in mems]
+            # BRAM output register
+            rdports_reg = [Signal(self.sumw+self.ew,
+                                  name=f'{prefix}rdport{j}_reg',
+                                  reset_less=True)
+                           for j in range(2)]
+            for j in range(2):
+                with m.If(rdports[j].en):
+                    m.d.sync += rdports_reg[j].eq(rdports[j].data)
+            wrports = [mem.write_port() for mem in mems]
+            return rdports, rdports_reg, wrports
+
+        rdports, rdports_reg, wrports = ping_pong_brams('')
+        if self.dual:
+            # BRAMs for the peak power in dual mode
+            peak_rdports, peak_rdports_reg, peak_wrports = (
+                ping_pong_brams('peak_'))
 
         # We use the output register on the BRAM.
         mem_delay = 2
@@ -231,13 +260,21 @@ class SpectrumIntegrator(Elaboratable):
 
         # The read and write counters are reversed to perform bit order
         # inversion in the FFT indices. Moreover, the MSB is negated to perform
-        # fftshift.
-        read_counter_rev = read_counter[::-1]
-        write_counter_rev = write_counter[::-1]
-        read_counter_shift = Cat(read_counter_rev[:-1],
-                                 ~read_counter_rev[-1])
-        write_counter_shift = Cat(write_counter_rev[:-1],
-                                  ~write_counter_rev[-1])
+        # fftshift. For FFT sizes smaller than the maximum, only the LSBs of
+        # the counters are used.
+        def counter_shift(counter):
+            shifted = {}
+            for order in self.orders:
+                counter_rev = counter[:order][::-1]
+                shifted[order] = Cat(counter_rev[:-1], ~counter_rev[-1])
+            value = shifted[self.order_log2]
+            for order in self.orders[1:]:
+                value = Mux(self.active_order_log2 == order,
+                            shifted[order], value)
+            return value
+
+        read_counter_shift = counter_shift(read_counter)
+        write_counter_shift = counter_shift(write_counter)
 
         exp_delay = [Signal(self.ew, name=f'exp_q_{j}', reset_less=True)
                      for j in range(cpwr.delay)]
@@ -246,9 +283,42 @@ class SpectrumIntegrator(Elaboratable):
             m.d.sync += [exp_delay[j].eq(exp_delay[j - 1])
                          for j in range(1, len(exp_delay))]
 
+        if self.dual:
+            peak_detect = self.peak_detect & ~self.dual_mode
+            # In dual mode, the addresses of the peak power follow those of
+            # the average power.
+            rdaddr_peak = {order: self.rdaddr[order] for order in self.orders}
+            rdaddr_bram = {order: self.rdaddr[:order] for order in self.orders}
+            rdaddr_peak_sel = rdaddr_peak[self.order_log2]
+            rdaddr_bram_sel = rdaddr_bram[self.order_log2]
+            for order in self.orders[1:]:
+                rdaddr_peak_sel = Mux(self.active_order_log2 == order,
+                                      rdaddr_peak[order], rdaddr_peak_sel)
+                rdaddr_bram_sel = Mux(self.active_order_log2 == order,
+                                      rdaddr_bram[order], rdaddr_bram_sel)
+            rdaddr = Signal(self.order_log2)
+            # Delayed versions of rdaddr_peak_sel that are aligned with
+            # the BRAM data and the BRAM output register.
+            rdaddr_peak_q = Signal()
+            rdaddr_peak_qq = Signal()
+            with m.If(self.rden):
+                m.d.sync += [
+                    rdaddr_peak_q.eq(rdaddr_peak_sel),
+                    rdaddr_peak_qq.eq(rdaddr_peak_q),
+                ]
+            m.d.comb += rdaddr.eq(rdaddr_bram_sel)
+        else:
+            peak_detect = self.peak_detect
+            rdaddr = self.rdaddr
+
         writeback = Signal()
         read_data = Signal(self.sumw + self.ew)
         rdata = Mux(pingpong, rdports_reg[0], rdports_reg[1])
+        if self.dual:
+            rdata = Mux(rdaddr_peak_qq,
+                        Mux(pingpong, peak_rdports_reg[0],
+                            peak_rdports_reg[1]),
+                        rdata)
         m.d.comb += [
             to_fp.clken.eq(self.clken),
             to_fp.re_in.eq(self.re_in),
@@ -268,7 +338,7 @@ class SpectrumIntegrator(Elaboratable):
 
             cpwr.clken.eq(self.clken),
             cpwr.common_edge.eq(self.common_edge),
-            cpwr.peak_detect.eq(self.peak_detect),
+            cpwr.peak_detect.eq(peak_detect),
             cpwr.re_in.eq(common_exp.re_a_out),
             cpwr.im_in.eq(common_exp.im_a_out),
             cpwr.real_in.eq(common_exp.b_out),
@@ -277,29 +347,231 @@ class SpectrumIntegrator(Elaboratable):
             # We need to include pingpong_delay[1] here because otherwise the
             # rden would be active immediately after toggling pingpong, and we
             # would lose the contents of the ram output register.
-            rdports[0].en.eq(Mux(pingpong & pingpong_delay[mem_delay - 1],
-                                 self.rden, self.clken)),
-            rdports[1].en.eq(Mux(pingpong | pingpong_delay[mem_delay - 1],
-                                 self.clken, self.rden)),
-            rdports[0].addr.eq(Mux(pingpong, self.rdaddr, read_counter_shift)),
-            rdports[1].addr.eq(Mux(pingpong, read_counter_shift, self.rdaddr)),
             # In average mode, always write back to the BRAM. In peak detect
             # mode, only write back when the cpwr says that the new power is
             # greater than the one in the BRAM.
-            writeback.eq(~self.peak_detect | cpwr.is_greater),
-            wrports[0].en.eq((~pingpong_delay[-1]) & self.clken & writeback),
-            wrports[1].en.eq(pingpong_delay[-1] & self.clken & writeback),
+            writeback.eq(~peak_detect | cpwr.is_greater),
             self.rdata_value.eq(rdata[:self.sumw]),
             self.rdata_exponent.eq(rdata[-self.ew:]),
         ]
+        read_ports = [rdports] + ([peak_rdports] if self.dual else [])
+        for rd in read_ports:
+            m.d.comb += [
+                rd[0].en.eq(Mux(pingpong & pingpong_delay[mem_delay - 1],
+                                self.rden, self.clken)),
+                rd[1].en.eq(Mux(pingpong | pingpong_delay[mem_delay - 1],
+                                self.clken, self.rden)),
+                rd[0].addr.eq(Mux(pingpong, rdaddr, read_counter_shift)),
+                rd[1].addr.eq(Mux(pingpong, read_counter_shift, rdaddr)),
+            ]
+        m.d.comb += [
+            wrports[0].en.eq((~pingpong_delay[-1]) & self.clken & writeback),
+            wrports[1].en.eq(pingpong_delay[-1] & self.clken & writeback),
+        ]
         for wr in wrports:
             m.d.comb += [
                 wr.addr.eq(write_counter_shift),
                 wr.data.eq(Cat(cpwr.out[:self.sumw], exp_delay[-1])),
                 ]
+
+        if self.dual:
+            # The peak power read from the BRAM is delayed to align it with
+            # the output of the cpwr. The power re**2 + im**2 is obtained by
+            # subtracting the average from the output of the cpwr. It is
+            # compared with the peak power converted to the exponent of the
+            # average, which is never smaller than the exponent of the peak
+            # power.
+            peak_read_data = Signal(self.sumw + self.ew)
+            m.d.comb += peak_read_data.eq(
+                Mux(not_first_sum_delay[-1],
+                    Mux(pingpong_delay[mem_delay - 1],
+                        peak_rdports_reg[1], peak_rdports_reg[0]),
+                    0))
+            peak_delay = [
+                Signal(self.sumw + self.ew, name=f'peak_q_{j}',
+                       reset_less=True)
+                for j in range(common_exp.delay + cpwr.delay)]
+            real_delay = [
+                Signal(self.sumw, name=f'real_q_{j}', reset_less=True)
+                for j in range(cpwr.delay)]
+            with m.If(self.clken):
+                m.d.sync += [
+                    peak_delay[0].eq(peak_read_data),
+                    real_delay[0].eq(common_exp.b_out),
+                ]
+                m.d.sync += [peak_delay[j].eq(peak_delay[j - 1])
+                             for j in range(1, len(peak_delay))]
+                m.d.sync += [real_delay[j].eq(real_delay[j - 1])
+                             for j in range(1, len(real_delay))]
+            power = Signal(self.sumw)
+            peak_shift = Signal(self.ew)
+            peak = Signal(self.sumw)
+            peak_writeback = Signal()
+            m.d.comb += [
+                power.eq(cpwr.out - real_delay[-1]),
+                peak_shift.eq(exp_delay[-1] - peak_delay[-1][-self.ew:]),
+                # Power representation: each exponent unit is a shift by 2
+                peak.eq(peak_delay[-1][:self.sumw]
+                        >> Cat(Const(0, 1), peak_shift)),
+                peak_writeback.eq(self.dual_mode & (power >= peak)),
+                peak_wrports[0].en.eq(
+                    (~pingpong_delay[-1]) & self.clken & peak_writeback),
+                peak_wrports[1].en.eq(
+                    pingpong_delay[-1] & self.clken & peak_writeback),
+            ]
+            for wr in peak_wrports:
+                m.d.comb += [
+                    wr.addr.eq(write_counter_shift),
+                    wr.data.eq(Cat(power, exp_delay[-1])),
+                ]
         return m
 
 
+class SpectrumIntegratorModel:
+    """Streaming model of a SpectrumIntegrator
+
+    This class models a ``SpectrumIntegrator`` over an input that is
+    supplied in chunks of FFT vectors. The accumulator of an integration
+    that has not finished is kept between calls to ``process``.
+
+    Parameters
+    ----------
+    integrator : SpectrumIntegrator
+        Spectrum integrator to model.
+    nint : int
+        Number of integrations.
+    peak_detect : bool
+        Selects peak detect mode (instead of average power mode).
+    order_log2 : Optional[int]
+        log2 of the FFT size. By default, the maximum FFT size of the
+        integrator is used.
+    dual : bool
+        Selects dual mode. The outputs then contain the average power
+        followed by the peak power of each integration, as in the addresses
+        of the BRAM.
+    """
+    def __init__(self, integrator, nint, peak_detect, order_log2=None,
+                 dual=False):
+        if order_log2 is None:
+            order_log2 = integrator.order_log2
+        if order_log2 not in integrator.orders:
+            raise ValueError(f'unsupported FFT order {order_log2}')
+        if dual and not integrator.dual:
+            raise ValueError('the integrator does not support dual mode')
+        self.integrator = integrator
+        self.nint = nint
+        self.peak_detect = peak_detect
+        self.order_log2 = order_log2
+        self.nfft = 2**order_log2
+        self.dual = dual
+        self.nbins = self.nfft * (1 + dual)
+        cpwr = integrator.cpwr
+        self.dtype = model_dtype(cpwr.outw + cpwr.truncate)
+        self.reset()
+
+    @property
+    def shard_alignment(self):
+        return self.nint * self.nfft
+
+    @property
+    def shard_history(self):
+        return 0
+
+    def reset(self, offset=0):
+        """Discard the integration in progress"""
+        self._count = 0
+        self._acc, self._acc_exp = (
+            np.zeros((1, self.nbins), self.dtype) for _ in range(2))
+
+    def process(self, re_in, im_in):
+        """Process a chunk of FFT vectors
+
+        The input length must be a multiple of the FFT size. Returns the
+        values and exponents of the integrations that finish in this chunk,
+        as arrays of shape ``(integrations, 2**order_log2)`` (or
+        ``(integrations, 2 * 2**order_log2)`` in dual mode), in the order in
+        which they are read from the BRAM (bit reversed and fftshifted).
+        """
+        re_in, im_in = (
+            np.array(x, model_dtype(self.integrator.w)).reshape(-1, self.nfft)
+            for x in [re_in, im_in])
+        re_in, im_in, exp_in = self.integrator.to_fp.model(re_in, im_in)
+        nvectors = re_in.shape[0]
+        values, exponents = [], []
+        pos = 0
+        while pos < nvectors:
+            if self._count == 0 and nvectors - pos >= self.nint:
+                # Compute all the complete integrations in parallel
+                num = (nvectors - pos) // self.nint
+                sel = slice(pos, pos + num * self.nint)
+                acc, acc_exp = self._integrate(
+                    *(np.zeros((num, self.nbins), self.dtype)
+                      for _ in range(2)),
+                    *(x[sel].reshape(num, self.nint, self.nfft)
+                      for x in [re_in, im_in, exp_in]))
+                values.append(acc)
+                exponents.append(acc_exp)
+                pos += num * self.nint
+            else:
+                # Continue the integration in progress
+                num = min(self.nint - self._count, nvectors - pos)
+                sel = slice(pos, pos + num)
+                self._acc, self._acc_exp = self._integrate(
+                    self._acc, self._acc_exp,
+                    *(x[np.newaxis, sel] for x in [re_in, im_in, exp_in]))
+                self._count += num
+                pos += num
+                if self._count == self.nint:
+                    values.append(self._acc)
+                    exponents.append(self._acc_exp)
+                    self.reset()
+        if not values:
+            return tuple(np.zeros((0, self.nbins), self.dtype)
+                         for _ in range(2))
+        # The average and peak power in dual mode are reordered separately
+        shape = (-1, 1 + self.dual, self.nfft)
+        acc = np.concatenate(values).reshape(shape)
+        acc_exp = np.concatenate(exponents).reshape(shape)
+        # Bit reverse accumulator order
+        invert = bit_invert_permutation(self.order_log2, 1)
+        acc = acc[..., invert]
+        acc_exp = acc_exp[..., invert]
+        # Perform fftshift
+        acc = np.fft.fftshift(acc, axes=-1)
+        acc_exp = np.fft.fftshift(acc_exp, axes=-1)
+        return acc.reshape(-1, self.nbins), acc_exp.reshape(-1, self.nbins)
+
+    def _integrate(self, acc, acc_exp, re_in, im_in, exp_in):
+        acc, acc_exp = acc.copy(), acc_exp.copy()
+        # In dual mode, the peak power is stored after the average power
+        avg, avg_exp = acc[:, :self.nfft], acc_exp[:, :self.nfft]
+        peak, peak_exp = acc[:, self.nfft:], acc_exp[:, self.nfft:]
+        for j in range(re_in.shape[1]):
+            re_in_c, im_in_c, avg_c, _, exp_c = (
+                self.integrator.common_exp.model(
+                    re_in[:, j], im_in[:, j], exp_in[:, j],
+                    avg, np.zeros_like(avg), avg_exp))
+            cpwr_result = self.integrator.cpwr.model(
+                re_in_c, im_in_c, avg_c, self.peak_detect and not self.dual)
+            if self.dual:
+                # The peak power is converted to the exponent of the
+                # average, which is never smaller.
+                pwr = cpwr_result - avg_c
+                is_greater = pwr >= peak >> (2 * (exp_c - peak_exp))
+                peak[is_greater] = pwr[is_greater]
+                peak_exp[is_greater] = exp_c[is_greater]
+                avg[:] = cpwr_result
+                avg_exp[:] = exp_c
+            elif self.peak_detect:
+                pwr, is_greater = cpwr_result
+                avg[is_greater] = pwr[is_greater]
+                avg_exp[is_greater] = exp_c[is_greater]
+            else:
+                avg[:] = cpwr_result
+                avg_exp[:] = exp_c
+        return acc, acc_exp
+
+
 if __name__ == '__main__':
     integrator = SpectrumIntegrator('clk_3x', 22, 18, 10, 12)
     amaranth.cli.main(
@@ -0,0 +1,169 @@
+#
+# Copyright (C) 2024 Daniel Estevez <daniel@destevez.net>
+#
+# This file is part of maia-sdr
+#
+# SPDX-License-Identifier: MIT
+#
+
+from amaranth import *
+import amaranth.cli
+from amaranth.lib.memory import Memory
+
+
+class SpectrumStage(Elaboratable):
+    """Spectrum processing stage BRAMs
+
+    This module implements the parts that are common to the modules that
+    read a spectrum from a BRAM (such as the BRAM of a
+    ``SpectrumIntegrator``), process it bin by bin, and write the results to
+    an output BRAM, such as ``LogPower`` and ``SpectrumPooling``.
+
+    When ``start`` is pulsed, the input BRAM is read at one word per clock
+    cycle, and ``valid`` indicates in which cycles the input BRAM read data
+    corresponds to a bin. The input BRAM must have a read latency of 2
+    cycles.
+
+    The output BRAM uses a ping-pong approach. The results are written to
+    one of the banks while the other bank, which contains the results for
+    the previous spectrum, is read. The banks are swapped when ``swap`` is
+    pulsed. This should be done in the same cycle as the last write for a
+    spectrum. The output BRAM read port has a latency of 2 cycles.
+
+    Parameters
+    ----------
+    order_log2 : int
+        Address width of the input BRAM.
+    shape : int
+        Width of the output BRAM words.
+    depth_log2 : int
+        Address width of each bank of the output BRAM.
+
+    Attributes
+    ----------
+    start : Signal(), in
+        This signal should be pulsed for a clock cycle to start reading the
+        input BRAM. It is undefined behaviour to pulse this signal while the
+        input BRAM is being read.
+    length : Signal(order_log2 + 1), in
+        Number of bins to read. It must be non-zero. It is latched when
+        ``start`` is pulsed.
+    valid : Signal(), out
+        Indicates that the input BRAM read data is valid in this cycle.
+    last : Signal(), out
+        Indicates that the input BRAM read data is the last bin. It is only
+        meaningful when ``valid`` is asserted.
+    src_addr : Signal(order_log2), out
+        Read address for the input BRAM.
+    src_en : Signal(), out
+        Read enable for the input BRAM.
+    wren : Signal(), in
+        Write enable for the output BRAM.
+    waddr : Signal(depth_log2), in
+        Write address for the output BRAM.
+    wdata : Signal(shape), in
+        Write data for the output BRAM.
+    swap : Signal(), in
+        Swaps the output BRAM banks.
+    done : Signal(), out
+        This signal is pulsed for one clock cycle after the banks have been
+        swapped.
+    raddr : Signal(depth_log2), in
+        Read address for the output BRAM bank that contains the previous
+        spectrum.
+    rdata : Signal(shape), out
+        Read data for the output BRAM.
+    rden : Signal(), in
+        Read enable for the output BRAM.
+    """
+    def __init__(self, order_log2, shape, depth_log2):
+        self.order_log2 = order_log2
+        self.shape = shape
+        self.depth_log2 = depth_log2
+
+        self.start = Signal()
+        self.length = Signal(order_log2 + 1, init=2**order_log2)
+        self.valid = Signal()
+        self.last = Signal()
+        self.src_addr = Signal(order_log2)
+        self.src_en = Signal()
+        self.wren = Signal()
+        self.waddr = Signal(depth_log2)
+        self.wdata = Signal(shape)
+        self.swap = Signal()
+        self.done = Signal()
+        self.raddr = Signal(depth_log2)
+        self.rdata = Signal(shape)
+        self.rden = Signal()
+
+    def elaborate(self, platform):
+        m = Module()
+
+        # Input BRAM read
+        length = Signal.like(self.length)
+        reading = Signal()
+        reading_q = Signal()
+        reading_qq = Signal()
+        last = Signal()
+        last_q = Signal()
+        last_qq = Signal()
+        m.d.comb += last.eq(self.src_addr == length - 1)
+        with m.If(reading):
+            m.d.sync += self.src_addr.eq(self.src_addr + 1)
+            with m.If(last):
+                m.d.sync += reading.eq(0)
+        with m.If(self.start):
+            m.d.sync += [
+                length.eq(self.length),
+                reading.eq(1),
+                self.src_addr.eq(0),
+            ]
+        m.d.sync += [
+            reading_q.eq(reading),
+            reading_qq.eq(reading_q),
+            last_q.eq(last),
+            last_qq.eq(last_q),
+        ]
+        # The read enable is kept asserted until the last word has gone
+        # through the BRAM output register.
+        m.d.comb += [
+            self.src_en.eq(reading | reading_q | reading_qq),
+            self.valid.eq(reading_qq),
+            self.last.eq(last_qq),
+        ]
+
+        # Output BRAM
+        m.submodules.mem = mem = Memory(
+            shape=self.shape, depth=2**(self.depth_log2 + 1), init=[])
+        rdport = mem.read_port()
+        wrport = mem.write_port()
+        # BRAM output register
+        rdport_reg = Signal(self.shape, reset_less=True)
+        bank = Signal()
+        with m.If(self.swap):
+            m.d.sync += bank.eq(~bank)
+        m.d.sync += self.done.eq(self.swap)
+        m.d.comb += [
+            wrport.en.eq(self.wren),
+            wrport.addr.eq(Cat(self.waddr, bank)),
+            wrport.data.eq(self.wdata),
+        ]
+        with m.If(self.rden):
+            m.d.sync += rdport_reg.eq(rdport.data)
+        m.d.comb += [
+            rdport.en.eq(self.rden),
+            rdport.addr.eq(Cat(self.raddr, ~bank)),
+            self.rdata.eq(rdport_reg),
+        ]
+
+        return m
+
+
+if __name__ == '__main__':
+    stage = SpectrumStage(12, 64, 10)
+    amaranth.cli.main(
+        stage, ports=[
+            stage.start, stage.length, stage.valid, stage.last,
+            stage.src_addr, stage.src_en, stage.wren, stage.waddr,
+            stage.wdata, stage.swap, stage.done, stage.raddr, stage.rdata,
+            stage.rden])
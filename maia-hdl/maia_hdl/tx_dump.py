@@ -11,6 +11,8 @@ import amaranth.back.verilog
 from amaranth.lib.cdc import FFSynchronizer, PulseSynchronizer
 
 from .fifo import AsyncFifo18_36
+from .verilog_cache import (
+    VerilogVariant, argument_parser, generate_variants)
 
 class TxDUMP(Elaboratable):
     """
@@ -89,18 +91,36 @@ class TxDUMP(Elaboratable):
 
         return m
     
-def gen_verilog_txdump():
+def verilog_variants():
+    """Variants of TxDUMP for which Verilog code is generated"""
+    return [
+        VerilogVariant(
+            'tx_dump', _gen_verilog_txdump,
+            key={'name': 'tx_dump', 'i_domain': 'sync',
+                 'o_domain': 'internal', 'width': 18},
+            modules=[__name__]),
+    ]
+
+
+def gen_verilog_txdump(select=None, jobs=None, cache=True):
+    return generate_variants(
+        verilog_variants(), select=select, jobs=jobs, cache=cache)
+
+
+def _gen_verilog_txdump():
     m = Module()
     internal = ClockDomain()
     m.domains += internal
     m.submodules.dump = dump = TxDUMP('sync', 'internal', 18)
-    with open('tx_dump.v', 'w') as f:
-        f.write(amaranth.back.verilog.convert(
-            m, ports=[
-                dump.re_in, dump.im_in, dump.reset, dump.valid_re, dump.valid_im,
-                dump.re_out, dump.im_out, internal.clk, internal.rst,
-            ],
-            emit_src=False))
-        
+    return amaranth.back.verilog.convert(
+        m, ports=[
+            dump.re_in, dump.im_in, dump.reset, dump.valid_re,
+            dump.valid_im, dump.re_out, dump.im_out, internal.clk,
+            internal.rst,
+        ],
+        emit_src=False)
+
+
 if __name__ == '__main__':
-    gen_verilog_txdump()
\ No newline at end of file
+    args = argument_parser(variants=True).parse_args()
+    gen_verilog_txdump(args.variants, args.jobs, args.cache)
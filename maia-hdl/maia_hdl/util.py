@@ -6,6 +6,9 @@
 # SPDX-License-Identifier: MIT
 #
 
+import functools
+import math
+
 import numpy as np
 
 
@@ -14,9 +17,89 @@ def clamp_nbits(x, nbits):
     return ((x + offset) % 2**nbits) - offset
 
 
+def model_dtype(width):
+    """Integer dtype to use in models
+
+    Returns the narrowest NumPy integer dtype among int32 and int64 that can
+    hold signed integers of ``width`` bits plus one bit of margin, which is
+    needed by ``clamp_nbits``. If the width is too large for an int64, the
+    object dtype is returned, so that Python integers of arbitrary size are
+    used instead of wrapping around.
+
+    Models should pass the width of the largest intermediate result that they
+    compute, as determined by the widths of the module.
+    """
+    if width <= 30:
+        return np.dtype('int32')
+    if width <= 62:
+        return np.dtype('int64')
+    return np.dtype(object)
+
+
+def signed_width(x):
+    """Minimum width needed to represent signed integers
+
+    Returns an array with the minimum number of bits needed to represent
+    each element of ``x`` in two's complement, which for an integer ``a`` is
+    ``a.bit_length() + 1`` if ``a >= 0`` and ``(~a).bit_length() + 1``
+    otherwise. Only integer operations are used, so the result is exact for
+    any int64 input. Arrays with object dtype are also supported.
+    """
+    x = np.asarray(x)
+    if x.dtype == object:
+        return np.vectorize(
+            lambda a: (~a if a < 0 else a).bit_length() + 1,
+            otypes=['int64'])(x)
+    x = x.astype('int64', copy=False)
+    # ~x == -(x + 1) has the same bit length as x for negative x
+    v = np.where(x >= 0, x, ~x)
+    width = np.ones(v.shape, 'int64')
+    for shift in [32, 16, 8, 4, 2, 1]:
+        larger = v >= (1 << shift)
+        width += shift * larger
+        v = np.where(larger, v >> shift, v)
+    return width + (v > 0)
+
+
+def _bit_invert(n, nbits, radix_log2):
+    # Reverses the order of the radix_log2-bit digits of n. This works both
+    # with int's and with numpy integer arrays.
+    if nbits % radix_log2 != 0:
+        raise ValueError('nbits must be a multiple of radix_log2')
+    ndigits = nbits // radix_log2
+    mask = 2**radix_log2 - 1
+    inverted = 0
+    for j in range(ndigits):
+        digit = (n >> (j * radix_log2)) & mask
+        inverted = inverted | (digit << ((ndigits - 1 - j) * radix_log2))
+    return inverted
+
+
 def bit_invert(n, nbits, radix_log2):
-    bits = ('0'*nbits + bin(n)[2:])[-nbits:]
-    bits_arr = np.array([a for a in bits])
-    inverted = bits_arr.reshape(-1, radix_log2)[::-1].ravel()
-    inverted_str = ''.join(list(inverted))
-    return int(inverted_str, 2)
+    return int(_bit_invert(int(n), nbits, radix_log2))
+
+
+@functools.lru_cache(maxsize=64)
+def bit_invert_permutation(nbits, radix_log2):
+    """Bit (or digit) inversion permutation
+
+    Returns a read-only array ``p`` of length ``2**nbits`` such that
+    ``p[n] == bit_invert(n, nbits, radix_log2)``. The array can be used as an
+    index to permute the last axis of another array. Results are cached.
+    """
+    perm = _bit_invert(np.arange(2**nbits), nbits, radix_log2)
+    perm.flags.writeable = False
+    return perm
+
+
+def rising_edges(time, period, phase=0):
+    """Number of rising edges of a clock up to some time
+
+    The edges at ``phase`` and at ``time`` are counted. The time, period and
+    phase can be given in any units, as long as they are the same. This is
+    used to count the simulated cycles in the metrics of the Amaranth and
+    cocotb tests.
+    """
+    if time < phase:
+        return 0
+    return math.floor((time - phase) / period + 1e-9) + 1
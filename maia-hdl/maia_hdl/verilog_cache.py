@@ -0,0 +1,279 @@
+#
+# Copyright (C) 2024 Daniel Estevez <daniel@destevez.net>
+#
+# This file is part of maia-sdr
+#
+# SPDX-License-Identifier: MIT
+#
+
+import amaranth
+
+import argparse
+import concurrent.futures
+import fnmatch
+import hashlib
+import importlib.metadata
+import json
+import os
+import tempfile
+import time
+
+from .source_hash import module_file, source_closure, source_digest
+
+
+def cache_directory():
+    """Directory of the Verilog cache
+
+    This is given by the ``MAIA_HDL_VERILOG_CACHE`` environment variable. By
+    default, ``maia-hdl/verilog`` inside the user cache directory
+    (``$XDG_CACHE_HOME`` or ``~/.cache``) is used.
+    """
+    directory = os.environ.get('MAIA_HDL_VERILOG_CACHE')
+    if directory:
+        return directory
+    cache_home = (os.environ.get('XDG_CACHE_HOME')
+                  or os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(cache_home, 'maia-hdl', 'verilog')
+
+
+def cache_key(key, modules):
+    """Cache key for the Verilog generated by some modules
+
+    Parameters
+    ----------
+    key : Dict
+        Parameters that determine the Verilog code, such as the
+        configuration name, the module name and its constructor arguments.
+        They must be JSON serializable.
+    modules : List[str]
+        Names of the modules that generate the Verilog code. The source code
+        of these modules and of the ``maia_hdl`` modules that they import is
+        included in the key.
+    """
+    sources = set()
+    for module in modules:
+        sources |= source_closure(module)
+    try:
+        yosys = importlib.metadata.version('amaranth-yosys')
+    except importlib.metadata.PackageNotFoundError:
+        yosys = None
+    material = {
+        'key': key,
+        'sources': source_digest(sources),
+        # The paths appear in the src attributes of the Verilog code
+        'paths': sorted(filter(None, map(module_file, sources))),
+        'amaranth': amaranth.__version__,
+        'amaranth_yosys': yosys,
+        'use_yosys': os.environ.get('AMARANTH_USE_YOSYS'),
+    }
+    return hashlib.sha256(
+        json.dumps(material, sort_keys=True).encode()).hexdigest()
+
+
+def write_verilog(path, generate, *, key, modules, cache=True):
+    """Write Verilog code to a file, using the Verilog cache
+
+    The Verilog code is taken from the cache if it contains an entry for
+    the key. Otherwise, it is generated and stored in the cache. The file is
+    only written if its contents change, so that its modification time can
+    be used by build systems.
+
+    Parameters
+    ----------
+    path : str
+        Output file.
+    generate : Callable[[], str]
+        Function that elaborates the design and returns its Verilog code.
+    key : Dict
+        Parameters that determine the Verilog code. See ``cache_key``.
+    modules : List[str]
+        Names of the modules that generate the Verilog code. See
+        ``cache_key``.
+    cache : bool
+        If ``False``, the cache is not used, and the Verilog code is always
+        generated.
+
+    Returns
+    -------
+    bool
+        ``True`` if the Verilog code was taken from the cache.
+    """
+    verilog = None
+    if cache:
+        entry = os.path.join(cache_directory(),
+                             f'{cache_key(key, modules)}.v')
+        try:
+            with open(entry) as f:
+                verilog = f.read()
+        except FileNotFoundError:
+            pass
+    cached = verilog is not None
+    if not cached:
+        verilog = generate()
+        if cache:
+            _write_atomic(entry, verilog)
+    try:
+        with open(path) as f:
+            unchanged = f.read() == verilog
+    except FileNotFoundError:
+        unchanged = False
+    if not unchanged:
+        with open(path, 'w') as f:
+            f.write(verilog)
+    return cached
+
+
+class VerilogVariant:
+    """Verilog file generated by a ``gen_verilog`` function
+
+    Parameters
+    ----------
+    name : str
+        Name of the variant. The Verilog code is written to ``{name}.v``.
+    generate : Callable[[], str]
+        Function that elaborates the design and returns its Verilog code. It
+        is called in a worker process when several variants are generated in
+        parallel, so it must be picklable (a module-level function or a
+        ``functools.partial`` of one).
+    key : Dict
+        Parameters that determine the Verilog code. See ``cache_key``.
+    modules : List[str]
+        Names of the modules that generate the Verilog code. See
+        ``cache_key``.
+    """
+    def __init__(self, name, generate, key, modules):
+        self.name = name
+        self.generate = generate
+        self.key = key
+        self.modules = modules
+
+    @property
+    def path(self):
+        return f'{self.name}.v'
+
+    def write(self, cache=True):
+        """Writes the Verilog code
+
+        Returns the time spent, in seconds, and whether the Verilog code was
+        taken from the cache.
+        """
+        start = time.perf_counter()
+        cached = write_verilog(self.path, self.generate, key=self.key,
+                               modules=self.modules, cache=cache)
+        return time.perf_counter() - start, cached
+
+
+def select_variants(variants, patterns=None):
+    """Selects variants by name
+
+    Parameters
+    ----------
+    variants : List[VerilogVariant]
+        Available variants.
+    patterns : Optional[List[str]]
+        Shell-style patterns (as in ``fnmatch``) that select the variants by
+        name. If this is ``None`` or empty, all the variants are selected.
+        A ``ValueError`` is raised if a pattern does not match any variant.
+    """
+    if not patterns:
+        return list(variants)
+    for pattern in patterns:
+        if not any(fnmatch.fnmatchcase(v.name, pattern) for v in variants):
+            names = ', '.join(v.name for v in variants)
+            raise ValueError(
+                f'no variant matches {pattern!r} (available: {names})')
+    return [v for v in variants
+            if any(fnmatch.fnmatchcase(v.name, p) for p in patterns)]
+
+
+def generate_variants(variants, *, select=None, jobs=None, cache=True,
+                      summary=True):
+    """Generates the Verilog code of several variants
+
+    The variants are independent, so they are converted in parallel in a
+    pool of worker processes.
+
+    Parameters
+    ----------
+    variants : List[VerilogVariant]
+        Variants.
+    select : Optional[List[str]]
+        Patterns that select a subset of the variants. See
+        ``select_variants``.
+    jobs : Optional[int]
+        Number of worker processes. By default, the number of CPUs is used.
+        If it is 1, the variants are generated in this process.
+    cache : bool
+        Use the Verilog cache.
+    summary : bool
+        Print the time spent in each variant.
+
+    Returns
+    -------
+    Dict[str, Tuple[float, bool]]
+        The time spent in each variant, and whether the Verilog code was
+        taken from the cache, indexed by variant name.
+    """
+    variants = select_variants(variants, select)
+    if jobs is None:
+        jobs = os.cpu_count()
+    jobs = max(1, min(jobs, len(variants)))
+    start = time.perf_counter()
+    results = {}
+    if jobs == 1:
+        for variant in variants:
+            results[variant.name] = variant.write(cache)
+            print('wrote verilog to', variant.path, flush=True)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+            futures = {pool.submit(variant.write, cache): variant
+                       for variant in variants}
+            for future in concurrent.futures.as_completed(futures):
+                variant = futures[future]
+                results[variant.name] = future.result()
+                print('wrote verilog to', variant.path, flush=True)
+    elapsed = time.perf_counter() - start
+    # List the results in the order of the variants
+    results = {v.name: results[v.name] for v in variants}
+    if summary:
+        width = max(len(name) for name in results)
+        for name, (seconds, cached) in results.items():
+            note = ' (cached)' if cached else ''
+            print(f'{name:<{width}}  {seconds:8.2f} s{note}')
+        print(f'generated {len(results)} variants in {elapsed:.2f} s '
+              f'with {jobs} jobs')
+    return results
+
+
+def argument_parser(description=None, variants=False):
+    """Argument parser for the Verilog generation scripts
+
+    The parser contains the ``--no-cache`` argument, which sets ``cache`` to
+    ``False``. If ``variants`` is ``True``, it also contains the arguments
+    for ``generate_variants``: ``-j``/``--jobs``, which sets ``jobs``, and
+    the optional positional arguments ``variants``, which give the patterns
+    to select the variants. More arguments can be added to the parser.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        '--no-cache', dest='cache', action='store_false',
+        help='Do not use the Verilog cache')
+    if variants:
+        parser.add_argument(
+            '-j', '--jobs', type=int, default=os.cpu_count(),
+            help='Number of worker processes (default: number of CPUs)')
+        parser.add_argument(
+            'variants', nargs='*',
+            help='Names or shell-style patterns of the variants to generate '
+            '(default: all)')
+    return parser
+
+
+def _write_atomic(path, contents):
+    # Write to a temporary file first, so that several processes
+    # generating the same Verilog never see an incomplete file.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.v')
+    with os.fdopen(fd, 'w') as f:
+        f.write(contents)
+    os.replace(tmp, path)
@@ -7,23 +7,246 @@
 #
 
 from amaranth.sim import Simulator
+import numpy as np
 
+import itertools
+import re
+import time
 import unittest
+import zlib
 
+from .sim_cache import SimCache
+from .sim_metrics import SimMetrics
+
+
+def sweep(**parameters):
+    """Decorator for a test method that sweeps some parameters
+
+    The test method is called with each combination of the values given for
+    the parameters as keyword arguments. Each combination becomes a
+    separate test method of the ``AmaranthSim`` subclass, whose name is
+    formed by appending the parameters and their values to the name of the
+    decorated method, so that the combinations can be selected and run
+    independently.
+    """
+    def decorator(method):
+        method.sweep = parameters
+        return method
+    return decorator
+
+
+class SeededTestCase(unittest.TestCase):
+    """Test case with a reproducible seed for the NumPy random generator
+
+    Each test uses a different seed for the legacy NumPy random generator,
+    which is derived from the test name, so that its results do not depend
+    on the other tests that are run.
+    """
+    def run(self, result=None):
+        np.random.seed(zlib.crc32(self.id().encode()))
+        return super().run(result)
+
+
+class AmaranthSim(SeededTestCase):
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for name, method in list(cls.__dict__.items()):
+            if not hasattr(method, 'sweep'):
+                continue
+            delattr(cls, name)
+            names = list(method.sweep)
+            for values in itertools.product(*method.sweep.values()):
+                case = dict(zip(names, values))
+                suffix = '_'.join(
+                    f'{k}_' + re.sub(r'[^0-9a-zA-Z]+', '_', str(v)).strip('_')
+                    for k, v in case.items())
+                setattr(cls, f'{name}_{suffix}', cls._sweep_case(method, case))
+
+    @staticmethod
+    def _sweep_case(method, case):
+        def test(self):
+            method(self, **case)
+        return test
 
-class AmaranthSim(unittest.TestCase):
     def simulate(self, benches, *, vcd=None, named_clocks={}):
+        """Run a simulation of the DUT with some testbenches
+
+        The ``sync`` domain has a 12 ns clock, and the domains in
+        ``named_clocks`` have clocks with the given periods.
+
+        If the ``MAIA_HDL_SIM_METRICS`` environment variable is set to a
+        file, the throughput metrics of the simulation are appended to it
+        (see ``SimMetrics``).
+        """
         sim = Simulator(self.dut)
-        sim.add_clock(12e-9)
-        for domain, period in named_clocks.items():
-            sim.add_clock(period, domain=domain, phase=6e-9)
+        clocks = {'sync': (12e-9, 6e-9)}
+        clocks.update({domain: (period, 6e-9)
+                       for domain, period in named_clocks.items()})
+        for domain, (period, phase) in clocks.items():
+            sim.add_clock(period, domain=domain, phase=phase)
         if hasattr(benches, '__iter__'):
             for bench in benches:
                 sim.add_testbench(bench)
         else:
             sim.add_testbench(benches)
+        start = time.perf_counter()
         if vcd is None:
             sim.run()
         else:
             with sim.write_vcd(vcd):
                 sim.run()
+        elapsed = time.perf_counter() - start
+        sim_metrics = SimMetrics.from_environment()
+        if sim_metrics is not None:
+            # The Simulator does not expose the current time, so it is
+            # read from its engine (in femtoseconds).
+            sim_time = sim._engine.now * 1e-15
+            sim_metrics.record(self.id(), elapsed, sim_time, clocks)
+
+    def simulate_arrays(self, inputs, outputs, *, module=None, benches=[],
+                        vcd=None, named_clocks={}, cache=True, **kwargs):
+        """Drive the inputs from arrays and capture the outputs in arrays
+
+        This runs a simulation with an ``ArrayDriver`` testbench for the
+        ports of ``module`` (by default, the DUT), plus the testbenches in
+        ``benches``. The remaining keyword arguments are passed to
+        ``ArrayDriver``. Returns a list with the captured values of each of
+        the outputs.
+
+        If the ``MAIA_HDL_SIM_CACHE`` environment variable is set to a
+        directory, the captured outputs are stored in a ``SimCache`` in that
+        directory, and replayed instead of running the simulation again if
+        nothing that affects them has changed. The cache is not used when
+        ``cache`` is ``False``, when there are other testbenches (which may
+        perform checks during the simulation), or when a VCD is written.
+        """
+        module = self.dut if module is None else module
+        sim_cache = SimCache.from_environment()
+        if not cache or benches or vcd is not None:
+            sim_cache = None
+        if sim_cache is not None:
+            key = sim_cache.key(
+                self, [self.dut, module], inputs,
+                {'outputs': list(outputs), 'named_clocks': named_clocks,
+                 'driver': {k: repr(v) for k, v in kwargs.items()}})
+            captured = sim_cache.load(key)
+            if captured is not None:
+                return captured
+        driver = ArrayDriver(module, inputs, outputs, **kwargs)
+        self.simulate([driver.testbench] + list(benches), vcd=vcd,
+                      named_clocks=named_clocks)
+        if sim_cache is not None:
+            sim_cache.store(key, driver.captured)
+        return driver.captured
+
+
+class ArrayDriver:
+    """Testbench that drives inputs and captures outputs using arrays
+
+    The testbench runs in a single clock domain. In each cycle in which the
+    inputs are enabled, the next element of each input array is written to
+    its port, and then the outputs are read. A port is only written when its
+    value changes, to keep the per-cycle overhead low.
+
+    Parameters
+    ----------
+    module : Elaboratable
+        Module whose ports are driven and captured. Ports are referred to
+        by their attribute name in this module.
+    inputs : Dict[str, Union[int, ArrayLike]]
+        Input ports and their values. A scalar value is written in the first
+        enabled cycle, as an array of length one. Arrays may have different
+        lengths. After the end of an array, its port keeps the last value.
+    outputs : List[str]
+        Output ports to capture.
+    delay : int
+        Delay of the module, in enabled cycles. The captures of the first
+        ``delay`` enabled cycles are discarded. This is ignored if
+        ``strobe`` is used.
+    count : Optional[int]
+        Number of values to capture for each output. By default, this is the
+        length of the shortest input array (not counting scalars).
+    enable : Optional[str]
+        Clock enable port of the module. It is driven with ``pattern``, and
+        deasserted after the last enabled cycle.
+    pattern : ArrayLike
+        Pattern of enabled cycles (1's) and disabled cycles (0's). This is
+        repeated periodically.
+    strobe : Optional[str]
+        Output strobe port of the module. If this is given, the outputs are
+        captured in each cycle in which the strobe is asserted, until
+        ``count`` values have been captured.
+    timeout : int
+        When ``strobe`` is used, maximum number of cycles to simulate after
+        the end of the inputs.
+    domain : str
+        Clock domain.
+
+    Attributes
+    ----------
+    captured : List[numpy.ndarray]
+        Captured values of each of the outputs.
+    """
+    def __init__(self, module, inputs, outputs, *, delay=0, count=None,
+                 enable=None, pattern=[1], strobe=None, timeout=10000,
+                 domain='sync'):
+        self.arrays = [
+            (getattr(module, name), np.atleast_1d(value).tolist())
+            for name, value in inputs.items()]
+        self.outputs = [getattr(module, name) for name in outputs]
+        self.delay = delay if strobe is None else 0
+        if count is None:
+            count = min((len(v) for v in inputs.values() if np.ndim(v) > 0),
+                        default=0)
+        self.count = count
+        self.enable = getattr(module, enable) if enable is not None else None
+        self.pattern = [int(p) for p in pattern]
+        assert any(self.pattern)
+        self.strobe = getattr(module, strobe) if strobe is not None else None
+        self.timeout = timeout
+        self.domain = domain
+        self.captured = None
+
+    async def testbench(self, ctx):
+        # Last value written to each input
+        current = [None] * len(self.arrays)
+        inputs_length = max((len(a) for _, a in self.arrays), default=0)
+        captured = [[] for _ in self.outputs]
+        pattern = itertools.cycle(self.pattern)
+        enable_value = None
+        enabled_cycles = 0
+        cycle = 0
+        while self.count > 0:
+            await ctx.tick(self.domain)
+            enabled = next(pattern)
+            if self.enable is not None and enabled != enable_value:
+                ctx.set(self.enable, enabled)
+                enable_value = enabled
+            if enabled:
+                for j, (signal, array) in enumerate(self.arrays):
+                    if enabled_cycles < len(array):
+                        value = array[enabled_cycles]
+                        if value != current[j]:
+                            ctx.set(signal, value)
+                            current[j] = value
+            if self.strobe is not None:
+                if ctx.get(self.strobe):
+                    for values, signal in zip(captured, self.outputs):
+                        values.append(ctx.get(signal))
+                    if len(captured[0]) == self.count:
+                        break
+                elif cycle >= inputs_length + self.timeout:
+                    raise TimeoutError(
+                        f'only {len(captured[0])} of {self.count} values '
+                        'captured before the timeout')
+            elif enabled and enabled_cycles >= self.delay:
+                for values, signal in zip(captured, self.outputs):
+                    values.append(ctx.get(signal))
+                if enabled_cycles == self.count + self.delay - 1:
+                    break
+            enabled_cycles += enabled
+            cycle += 1
+        if self.enable is not None:
+            await ctx.tick(self.domain)
+            ctx.set(self.enable, 0)
+        self.captured = [np.array(values, 'int') for values in captured]
@@ -0,0 +1,43 @@
+#
+# Copyright (C) 2024 Daniel Estevez <daniel@destevez.net>
+#
+# This file is part of maia-sdr
+#
+# SPDX-License-Identifier: MIT
+#
+
+from amaranth import *
+from amaranth.lib.memory import Memory
+
+
+class BRAMSourceTb(Elaboratable):
+    """Testbench that connects a DUT to a BRAM it reads from
+
+    The BRAM has a read latency of 2 cycles, as the BRAMs with an output
+    register used in the design. ``addr``, ``en`` and ``data`` are the
+    signals of the DUT that are connected to the read port of the BRAM.
+    """
+    def __init__(self, dut, contents, shape, addr, en, data):
+        self.dut = dut
+        self.contents = contents
+        self.shape = shape
+        self.addr = addr
+        self.en = en
+        self.data = data
+
+    def elaborate(self, platform):
+        m = Module()
+        m.submodules.dut = self.dut
+        m.submodules.mem = mem = Memory(
+            shape=self.shape, depth=len(self.contents), init=self.contents)
+        rdport = mem.read_port()
+        # BRAM output register, to give a read latency of 2 cycles
+        rdata = Signal(self.shape)
+        with m.If(self.en):
+            m.d.sync += rdata.eq(rdport.data)
+        m.d.comb += [
+            rdport.addr.eq(self.addr),
+            rdport.en.eq(self.en),
+            self.data.eq(rdata),
+        ]
+        return m
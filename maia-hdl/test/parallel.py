@@ -0,0 +1,123 @@
+#
+# Copyright (C) 2024 Daniel Estevez <daniel@destevez.net>
+#
+# This file is part of maia-sdr
+#
+# SPDX-License-Identifier: MIT
+#
+
+"""Run the unittest tests in parallel
+
+Each test method is run as a separate job in a pool of worker processes.
+Usage (from the maia-hdl directory)::
+
+    python3 -m test.parallel [-j JOBS] [-v] [tests ...]
+
+The tests are given by name as in ``python3 -m unittest`` (for instance,
+``test.test_fft`` or ``test.test_fft.TestR2SDF``). By default, all the tests
+in the test directory are run.
+"""
+
+import argparse
+import concurrent.futures
+import os
+import sys
+import time
+import unittest
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Run the unittest tests in parallel')
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=os.cpu_count(),
+        help='Number of worker processes (default: number of CPUs)')
+    parser.add_argument(
+        '-v', '--verbose', action='store_true',
+        help='Print the result of each test')
+    parser.add_argument(
+        'tests', nargs='*',
+        help='Tests to run (default: discover all the tests)')
+    return parser.parse_args()
+
+
+def test_ids(suite):
+    """Lists the ids of all the tests in a test suite"""
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            yield from test_ids(test)
+        else:
+            yield test.id()
+
+
+def run_test(test_id):
+    """Runs a single test
+
+    Returns the number of tests run, and lists of failures, errors and
+    skipped tests, as (description, message) tuples, together with the run
+    time.
+    """
+    start = time.perf_counter()
+    suite = unittest.defaultTestLoader.loadTestsFromName(test_id)
+    result = unittest.TestResult()
+    suite.run(result)
+    elapsed = time.perf_counter() - start
+    return (result.testsRun,
+            [(str(test), msg) for test, msg in result.failures],
+            [(str(test), msg) for test, msg in result.errors],
+            [(str(test), msg) for test, msg in result.skipped],
+            elapsed)
+
+
+def main():
+    args = parse_args()
+    loader = unittest.defaultTestLoader
+    if args.tests:
+        suite = loader.loadTestsFromNames(args.tests)
+    else:
+        suite = loader.discover(os.path.dirname(__file__),
+                                top_level_dir=os.getcwd())
+    ids = list(test_ids(suite))
+
+    start = time.perf_counter()
+    tests_run = 0
+    failures, errors, skipped = [], [], []
+    with concurrent.futures.ProcessPoolExecutor(args.jobs) as pool:
+        futures = {pool.submit(run_test, test_id): test_id
+                   for test_id in ids}
+        for future in concurrent.futures.as_completed(futures):
+            run, fail, error, skip, elapsed = future.result()
+            tests_run += run
+            failures.extend(fail)
+            errors.extend(error)
+            skipped.extend(skip)
+            if args.verbose:
+                status = ('FAIL' if fail else 'ERROR' if error
+                          else 'skipped' if skip else 'ok')
+                print(f'{futures[future]} ... {status} ({elapsed:.1f} s)',
+                      flush=True)
+    elapsed = time.perf_counter() - start
+
+    for kind, items in [('FAIL', failures), ('ERROR', errors)]:
+        for description, msg in items:
+            print('=' * 70)
+            print(f'{kind}: {description}')
+            print('-' * 70)
+            print(msg)
+    print('-' * 70)
+    print(f'Ran {tests_run} tests in {elapsed:.3f}s with {args.jobs} jobs')
+    print()
+    details = ', '.join(
+        f'{name}={len(items)}' for name, items in [
+            ('failures', failures), ('errors', errors),
+            ('skipped', skipped)]
+        if items)
+    if failures or errors:
+        print(f'FAILED ({details})')
+        return 1
+    print(f'OK ({details})' if details else 'OK')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,132 @@
+#
+# Copyright (C) 2024 Daniel Estevez <daniel@destevez.net>
+#
+# This file is part of maia-sdr
+#
+# SPDX-License-Identifier: MIT
+#
+
+import amaranth
+from amaranth import Elaboratable
+import numpy as np
+
+import hashlib
+import json
+import os
+import tempfile
+
+from maia_hdl.source_hash import source_closure, source_digest
+
+
+class SimCache:
+    """Content-addressed cache of simulation results
+
+    The captured outputs of a simulation are stored in a directory, in an
+    ``.npz`` file whose name is a hash of everything that determines the
+    result of the simulation: the source code of the test module and of the
+    modules it imports from the same packages (which includes the
+    ``maia_hdl`` modules used by the design, but not the unrelated ones),
+    the test name, the parameters of the elaboratables in the design, the
+    stimulus and the settings of the testbench.
+
+    Parameters
+    ----------
+    directory : str
+        Directory where the results are stored.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+
+    @classmethod
+    def from_environment(cls):
+        """Returns the cache given by the ``MAIA_HDL_SIM_CACHE`` variable
+
+        Returns ``None`` if the variable is not set, in which case the
+        simulation results should not be cached.
+        """
+        directory = os.environ.get('MAIA_HDL_SIM_CACHE')
+        return cls(directory) if directory else None
+
+    def key(self, test, designs, inputs, settings):
+        """Computes the cache key of a simulation
+
+        Parameters
+        ----------
+        test : unittest.TestCase
+            Test that runs the simulation.
+        designs : List[Elaboratable]
+            Elaboratables in the design. The elaboratables that are
+            referenced by their attributes are also included.
+        inputs : Dict[str, ArrayLike]
+            Stimulus.
+        settings : Dict
+            Other settings that determine the result of the simulation. They
+            must be JSON serializable.
+        """
+        modules = {type(test).__module__}
+        parameters = []
+        for design in _elaboratables(designs):
+            modules.add(type(design).__module__)
+            parameters.append(
+                [type(design).__qualname__,
+                 {k: repr(v) for k, v in vars(design).items()
+                  if isinstance(v, (bool, int, float, str, type(None)))}])
+        sources = set()
+        for module in modules:
+            sources |= source_closure(
+                module, packages=[module.partition('.')[0], 'maia_hdl'])
+        material = {
+            'amaranth': amaranth.__version__,
+            'sources': source_digest(sources),
+            'test': test.id(),
+            'parameters': parameters,
+            'inputs': {name: _array_hash(value)
+                       for name, value in inputs.items()},
+            'settings': settings,
+        }
+        return hashlib.sha256(
+            json.dumps(material, sort_keys=True).encode()).hexdigest()
+
+    def load(self, key):
+        """Returns the stored outputs for a key, or None if not present"""
+        try:
+            with np.load(self._path(key)) as f:
+                return [f[f'output{j}'] for j in range(len(f.files))]
+        except FileNotFoundError:
+            return None
+
+    def store(self, key, outputs):
+        """Stores the outputs for a key"""
+        os.makedirs(self.directory, exist_ok=True)
+        # Write to a temporary file first, so that tests running in
+        # parallel never see an incomplete file.
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.npz')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **{f'output{j}': x for j, x in enumerate(outputs)})
+        os.replace(tmp, self._path(key))
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.npz')
+
+
+def _elaboratables(designs):
+    # Lists the elaboratables in designs and those referenced (directly or
+    # through lists) by their attributes.
+    found = []
+    pending = list(designs)
+    while pending:
+        obj = pending.pop()
+        if isinstance(obj, (list, tuple)):
+            pending.extend(obj)
+        elif (isinstance(obj, Elaboratable)
+              and not any(obj is f for f in found)):
+            found.append(obj)
+            pending.extend(vars(obj).values())
+    return found
+
+
+def _array_hash(value):
+    value = np.ascontiguousarray(value)
+    h = hashlib.sha256(f'{value.dtype.str}{value.shape}'.encode())
+    h.update(value.tobytes())
+    return h.hexdigest()
@@ -0,0 +1,89 @@
+#
+# Copyright (C) 2024 Daniel Estevez <daniel@destevez.net>
+#
+# This file is part of maia-sdr
+#
+# SPDX-License-Identifier: MIT
+#
+
+import datetime
+import json
+import os
+import resource
+
+from maia_hdl.util import rising_edges
+
+
+class SimMetrics:
+    """Recorder of simulation throughput metrics
+
+    Each simulation is recorded as a JSON object in a line of a file (JSON
+    Lines format), which is appended to, so that the metrics of several
+    runs can be collected and trended. The object contains the following
+    keys:
+
+    - ``test``: test id.
+    - ``timestamp``: UTC time at which the simulation finished, in ISO 8601
+      format.
+    - ``wall_time_s``: wall-clock time of the simulation.
+    - ``sim_time_ns``: simulated time.
+    - ``cycles``: number of simulated cycles of each clock domain.
+    - ``cycles_per_second``: simulated cycles of each clock domain per
+      second of wall-clock time.
+    - ``peak_rss_bytes``: peak resident set size of the process.
+
+    The cocotb tests write the same records (see ``test_cocotb/metrics.py``).
+
+    Parameters
+    ----------
+    path : str
+        Path of the file where the metrics are written.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    @classmethod
+    def from_environment(cls):
+        """Returns the recorder given by the ``MAIA_HDL_SIM_METRICS`` variable
+
+        Returns ``None`` if the variable is not set, in which case the
+        metrics should not be recorded.
+        """
+        path = os.environ.get('MAIA_HDL_SIM_METRICS')
+        return cls(path) if path else None
+
+    def record(self, test, wall_time, sim_time, clocks):
+        """Records the metrics of a simulation
+
+        Parameters
+        ----------
+        test : str
+            Test id.
+        wall_time : float
+            Wall-clock time of the simulation, in seconds.
+        sim_time : float
+            Simulated time, in seconds.
+        clocks : Dict[str, Tuple[float, float]]
+            Period and phase (time of the first rising edge), in seconds, of
+            the clock of each domain.
+        """
+        cycles = {domain: rising_edges(sim_time, period, phase)
+                  for domain, (period, phase) in clocks.items()}
+        metrics = {
+            'test': test,
+            'timestamp': datetime.datetime.now(
+                datetime.timezone.utc).isoformat(),
+            'wall_time_s': wall_time,
+            'sim_time_ns': sim_time * 1e9,
+            'cycles': cycles,
+            'cycles_per_second': {
+                domain: n / wall_time if wall_time > 0 else None
+                for domain, n in cycles.items()},
+            # ru_maxrss is given in KiB on Linux
+            'peak_rss_bytes': (
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024),
+        }
+        # A single write in append mode, so that the lines written by tests
+        # running in parallel are not interleaved.
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(metrics) + '\n')
@@ -0,0 +1,144 @@
+#
+# Copyright (C) 2024 Daniel Estevez <daniel@destevez.net>
+#
+# This file is part of maia-sdr
+#
+# SPDX-License-Identifier: MIT
+#
+
+import numpy as np
+
+import unittest
+
+from maia_hdl.ddc import DDC, DDCModel
+from .amaranth_sim import AmaranthSim, SeededTestCase
+from .common_edge import CommonEdgeTb
+
+
+class TestDDCModel(SeededTestCase):
+    def setUp(self):
+        self.ddc = DDC('clk3x')
+        self.frequency = round(-0.123 * 2**self.ddc.nco_width)
+        self.coeffs = np.random.randint(
+            -2**(self.ddc.coeff_width - 1), 2**(self.ddc.coeff_width - 1),
+            size=768)
+        self.registers = {
+            'decimation1': 5, 'decimation2': 3, 'decimation3': 2,
+            'operations_minus_one1': 3, 'operations_minus_one2': 5,
+            'operations_minus_one3': 9,
+            'odd_operations1': True, 'odd_operations3': False,
+        }
+        width = self.ddc.iw
+        self.re_in, self.im_in = (
+            np.random.randint(-2**(width - 1) + 1, 2**(width - 1),
+                              size=20000)
+            for _ in range(2))
+
+    def test_chunks(self):
+        for bypass2 in [False, True]:
+            for bypass3 in [False, True]:
+                with self.subTest(bypass2=bypass2, bypass3=bypass3):
+                    registers = dict(self.registers, bypass2=bypass2,
+                                     bypass3=bypass3)
+                    expected = self.ddc.model(
+                        self.frequency, self.coeffs, self.re_in, self.im_in,
+                        **registers)
+                    model = DDCModel(
+                        self.ddc, self.frequency, self.coeffs, **registers)
+                    outputs = [
+                        model.process(self.re_in[a:a + 997],
+                                      self.im_in[a:a + 997])
+                        for a in range(0, self.re_in.size, 997)]
+                    for j in range(2):
+                        np.testing.assert_equal(
+                            np.concatenate([out[j] for out in outputs]),
+                            expected[j])
+
+    def test_bypass(self):
+        registers = dict(self.registers, bypass2=True, bypass3=True)
+        re, im = self.ddc.model(
+            self.frequency, self.coeffs, self.re_in, self.im_in,
+            **registers)
+        stage1 = self.ddc.decimator.stage1
+        taps = stage1.model_taps(
+            self.coeffs[:256], registers['decimation1'],
+            registers['operations_minus_one1'], registers['odd_operations1'])
+        expected = stage1.model(
+            taps, registers['decimation1'],
+            *self.ddc.mixer.model(self.frequency, self.re_in, self.im_in))
+        np.testing.assert_equal(re, expected[0])
+        np.testing.assert_equal(im, expected[1])
+
+
+class TestDDC(AmaranthSim):
+    def test_ddc(self):
+        domain_3x = 'clk3x'
+        ddc = DDC(domain_3x)
+        self.dut = CommonEdgeTb(ddc, [(domain_3x, 3, 'common_edge')])
+        frequency = round(-0.123 * 2**ddc.nco_width)
+        registers = {
+            'decimation1': 5, 'decimation2': 3, 'decimation3': 2,
+            'operations_minus_one1': 3, 'operations_minus_one2': 5,
+            'operations_minus_one3': 9,
+            'odd_operations1': True, 'odd_operations3': False,
+            'bypass2': False, 'bypass3': False,
+        }
+        # The address space of stage 2 is larger than its coefficient
+        # memory, so its upper half is left empty.
+        coeffs = np.random.randint(
+            -2**(ddc.coeff_width - 1), 2**(ddc.coeff_width - 1), size=768)
+        coeffs[384:512] = 0
+        num_inputs = 3000
+        width = ddc.iw
+        re_in, im_in = (
+            np.random.randint(-2**(width - 1) + 1, 2**(width - 1),
+                              size=num_inputs)
+            for _ in range(2))
+        re_out = []
+        im_out = []
+
+        async def set_inputs(ctx):
+            for name, value in registers.items():
+                ctx.set(getattr(ddc, name), int(value))
+            ctx.set(ddc.frequency, frequency)
+            ctx.set(ddc.coeff_wren, 1)
+            for addr, coeff in enumerate(coeffs):
+                if 384 <= addr < 512:
+                    continue
+                ctx.set(ddc.coeff_waddr, addr)
+                ctx.set(ddc.coeff_wdata, int(coeff))
+                await ctx.tick()
+            ctx.set(ddc.coeff_wren, 0)
+            ctx.set(ddc.enable_input, 1)
+            for re, im in zip(re_in, im_in):
+                ctx.set(ddc.strobe_in, 1)
+                ctx.set(ddc.re_in, int(re))
+                ctx.set(ddc.im_in, int(im))
+                await ctx.tick()
+                ctx.set(ddc.strobe_in, 0)
+                await ctx.tick().repeat(3)
+
+        async def read_output(ctx):
+            for _ in range(num_inputs // 30 - 1):
+                while True:
+                    await ctx.tick()
+                    if ctx.get(ddc.strobe_out):
+                        re_out.append(ctx.get(ddc.re_out))
+                        im_out.append(ctx.get(ddc.im_out))
+                        break
+
+        self.simulate([set_inputs, read_output],
+                      named_clocks={domain_3x: 4e-9})
+
+        model = DDCModel(ddc, frequency, coeffs, **registers)
+        zeros = np.zeros(model.input_offset, 'int')
+        model.decimator.process(zeros, zeros)
+        expected = model.process(re_in[2:], im_in[2:])
+        np.testing.assert_equal(re_out, expected[0][:len(re_out)],
+                                'real parts do not match')
+        np.testing.assert_equal(im_out, expected[1][:len(im_out)],
+                                'imaginary parts do not match')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+#
+# Copyright (C) 2024 Daniel Estevez <daniel@destevez.net>
+#
+# This file is part of maia-sdr
+#
+# SPDX-License-Identifier: MIT
+#
+
+from amaranth import *
+import numpy as np
+
+import unittest
+
+from maia_hdl.dma import DmaBRAMWrite
+from .amaranth_sim import AmaranthSim
+from .bram_source import BRAMSourceTb
+
+
+class TestDmaBRAMWrite(AmaranthSim):
+    def setUp(self):
+        self.base_address = 0x0800_0000
+        self.buffers_log2 = 2
+        self.bram_awidth = 7
+        self.bytes_per_word = 8
+        self.buffer_size = 2**self.bram_awidth * self.bytes_per_word
+
+    def test_lengths(self):
+        lengths = [128, 32, 64, 16, 128, 48]
+        self.common_test(lengths)
+
+    def common_test(self, lengths):
+        dma = DmaBRAMWrite(
+            self.base_address, self.buffers_log2, self.bram_awidth)
+        contents = np.random.randint(
+            0, 2**63, size=2**self.bram_awidth, dtype='uint64')
+        self.dut = BRAMSourceTb(
+            dma, [int(x) for x in contents], 64, dma.raddr, dma.ren,
+            dma.rdata)
+        axi = dma.axi
+
+        async def bench(ctx):
+            ctx.set(axi.awready, 1)
+            for num, length in enumerate(lengths):
+                for _ in range(4):
+                    await ctx.tick()
+                ctx.set(dma.length, length)
+                ctx.set(dma.start, 1)
+                await ctx.tick()
+                ctx.set(dma.start, 0)
+                addresses = []
+                writes = {}
+                bursts = 0
+                pending_b = 0
+                while True:
+                    wready = np.random.randint(2)
+                    ctx.set(axi.wready, wready)
+                    ctx.set(axi.bvalid, pending_b > 0)
+                    if pending_b > 0:
+                        pending_b -= 1
+                    if ctx.get(axi.awvalid):
+                        addresses.append(ctx.get(axi.awaddr))
+                    if wready and ctx.get(axi.wvalid):
+                        burst, beat = divmod(len(writes), 16)
+                        address = (addresses[burst]
+                                   + beat * self.bytes_per_word)
+                        writes[address] = ctx.get(axi.wdata)
+                        assert ctx.get(axi.wlast) == (beat == 15)
+                        if beat == 15:
+                            pending_b += 1
+                            bursts += 1
+                    if not ctx.get(dma.busy):
+                        break
+                    await ctx.tick()
+                ctx.set(axi.wready, 0)
+                assert bursts == length // 16
+                buffer = num % 2**self.buffers_log2
+                assert ctx.get(dma.last_buffer) == buffer
+                start = self.base_address + buffer * self.buffer_size
+                expected = {start + j * self.bytes_per_word: int(contents[j])
+                            for j in range(length)}
+                assert writes == expected, \
+                    f'wrong writes in transfer {num} (length = {length})'
+
+        self.simulate(bench)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -11,24 +11,21 @@ import numpy as np
 
 import unittest
 
-from maia_hdl.fft import R2SDF, R4SDF, R22SDF, TwiddleI, Twiddle, Window, FFT
-from maia_hdl.util import bit_invert
-from .amaranth_sim import AmaranthSim
+from maia_hdl.fft import (
+    R2SDF, R4SDF, R22SDF, TwiddleI, Twiddle, Window, FFT, _twiddles_table,
+    _window_table)
+from maia_hdl.util import bit_invert_permutation
+from .amaranth_sim import AmaranthSim, sweep
 from .common_edge import CommonEdgeTb
 
 
 class TestR2SDF(AmaranthSim):
-    def test_model(self):
+    @sweep(truncate=[0, 1], storage=['distributed', 'bram'],
+           use_bram_reg=[False, True])
+    def test_model(self, truncate, storage, use_bram_reg):
         self.order = 5
         self.width_in = 24
-        for truncate in [0, 1]:
-            for storage in ['distributed', 'bram']:
-                for use_bram_reg in [False, True]:
-                    with self.subTest(truncate=truncate,
-                                      storage=storage,
-                                      use_bram_reg=use_bram_reg):
-                        self.common_test_model(
-                            truncate, storage, use_bram_reg)
+        self.common_test_model(truncate, storage, use_bram_reg)
 
     def common_test_model(self, truncate, storage, use_bram_reg):
         self.dut = R2SDF(self.order, self.width_in,
@@ -42,50 +39,32 @@ class TestR2SDF(AmaranthSim):
                 n_vec * self.dut.model_vlen)
             for _ in range(2))
 
-        async def set_inputs(ctx):
-            for j in range(re_in.size + self.dut.delay):
-                await ctx.tick()
-                ctx.set(self.dut.clken, 1)
-                if j < re_in.size:
-                    ctx.set(self.dut.re_in, int(re_in[j]))
-                    ctx.set(self.dut.im_in, int(im_in[j]))
-                mux_control = (j // 2**(self.order - 1)) % 2
-                ctx.set(self.dut.mux_control, mux_control)
-                if storage == 'bram':
-                    waddr = j % 2**(self.order - 1)
-                    offset = 1 if not use_bram_reg else 2
-                    ctx.set(self.dut.bram_raddr, waddr + offset)
-                    ctx.set(self.dut.bram_waddr, waddr)
-
-        async def read_outputs(ctx):
-            await ctx.tick().repeat(self.dut.delay)
-            re_out, im_out = (
-                np.empty_like(re_in) for _ in range(2))
-            for j in range(re_out.size):
-                await ctx.tick()
-                re_out[j] = ctx.get(self.dut.re_out)
-                im_out[j] = ctx.get(self.dut.im_out)
-            model_re, model_im = self.dut.model(re_in, im_in)
-            np.testing.assert_equal(re_out, model_re,
-                                    'real parts do not match')
-            np.testing.assert_equal(im_out, model_im,
-                                    'imaginary parts do not match')
-
-        self.simulate([set_inputs, read_outputs])
+        j = np.arange(re_in.size + self.dut.delay)
+        inputs = {
+            'clken': 1, 're_in': re_in, 'im_in': im_in,
+            'mux_control': (j // 2**(self.order - 1)) % 2,
+        }
+        if storage == 'bram':
+            waddr = j % 2**(self.order - 1)
+            offset = 1 if not use_bram_reg else 2
+            inputs.update(bram_raddr=waddr + offset, bram_waddr=waddr)
+
+        re_out, im_out = self.simulate_arrays(
+            inputs, ['re_out', 'im_out'], delay=self.dut.delay)
+        model_re, model_im = self.dut.model(re_in, im_in)
+        np.testing.assert_equal(re_out, model_re,
+                                'real parts do not match')
+        np.testing.assert_equal(im_out, model_im,
+                                'imaginary parts do not match')
 
 
 class TestR4SDF(AmaranthSim):
-    def test_model(self):
+    @sweep(truncate=range(3), storage=['distributed', 'bram'],
+           use_bram_reg=[False, True])
+    def test_model(self, truncate, storage, use_bram_reg):
         self.order = 2
         self.width_in = 24
-        for truncate in range(3):
-            for storage in ['distributed', 'bram']:
-                for use_bram_reg in [False, True]:
-                    with self.subTest(truncate=truncate,
-                                      storage=storage,
-                                      use_bram_reg=use_bram_reg):
-                        self.common_test_model(
-                            truncate, storage, use_bram_reg)
+        self.common_test_model(truncate, storage, use_bram_reg)
 
     def common_test_model(self, truncate, storage, use_bram_reg):
         self.dut = R4SDF(self.order, self.width_in,
@@ -99,50 +78,32 @@ class TestR4SDF(AmaranthSim):
                 n_vec * self.dut.model_vlen)
             for _ in range(2))
 
-        async def set_inputs(ctx):
-            for j in range(re_in.size + self.dut.delay):
-                await ctx.tick()
-                ctx.set(self.dut.clken, 1)
-                if j < re_in.size:
-                    ctx.set(self.dut.re_in, int(re_in[j]))
-                    ctx.set(self.dut.im_in, int(im_in[j]))
-                mux_control = (j // 4**(self.order - 1)) % 4 == 3
-                ctx.set(self.dut.mux_control, mux_control)
-                if storage == 'bram':
-                    waddr = j % 4**(self.order - 1)
-                    offset = 1 if not use_bram_reg else 2
-                    ctx.set(self.dut.bram_raddr, waddr + offset)
-                    ctx.set(self.dut.bram_waddr, waddr)
-
-        async def read_outputs(ctx):
-            await ctx.tick().repeat(self.dut.delay)
-            re_out, im_out = (
-                np.empty_like(re_in) for _ in range(2))
-            for j in range(re_out.size):
-                await ctx.tick()
-                re_out[j] = ctx.get(self.dut.re_out)
-                im_out[j] = ctx.get(self.dut.im_out)
-            model_re, model_im = self.dut.model(re_in, im_in)
-            np.testing.assert_equal(re_out, model_re,
-                                    'real parts do not match')
-            np.testing.assert_equal(im_out, model_im,
-                                    'imaginary parts do not match')
-
-        self.simulate([set_inputs, read_outputs])
+        j = np.arange(re_in.size + self.dut.delay)
+        inputs = {
+            'clken': 1, 're_in': re_in, 'im_in': im_in,
+            'mux_control': (j // 4**(self.order - 1)) % 4 == 3,
+        }
+        if storage == 'bram':
+            waddr = j % 4**(self.order - 1)
+            offset = 1 if not use_bram_reg else 2
+            inputs.update(bram_raddr=waddr + offset, bram_waddr=waddr)
+
+        re_out, im_out = self.simulate_arrays(
+            inputs, ['re_out', 'im_out'], delay=self.dut.delay)
+        model_re, model_im = self.dut.model(re_in, im_in)
+        np.testing.assert_equal(re_out, model_re,
+                                'real parts do not match')
+        np.testing.assert_equal(im_out, model_im,
+                                'imaginary parts do not match')
 
 
 class TestR22SDF(AmaranthSim):
-    def test_model(self):
+    @sweep(truncate=[[0, 0], [0, 1], [1, 0], [1, 1]],
+           storage=['distributed', 'bram'], use_bram_reg=[False, True])
+    def test_model(self, truncate, storage, use_bram_reg):
         self.order = 2
         self.width_in = 24
-        for truncate in [[0, 0], [0, 1], [1, 0], [1, 1]]:
-            for storage in ['distributed', 'bram']:
-                for use_bram_reg in [False, True]:
-                    with self.subTest(truncate=truncate,
-                                      storage=storage,
-                                      use_bram_reg=use_bram_reg):
-                        self.common_test_model(
-                            truncate, storage, use_bram_reg)
+        self.common_test_model(truncate, storage, use_bram_reg)
 
     def common_test_model(self, truncate, storage, use_bram_reg):
         self.dut = R22SDF(self.order, self.width_in,
@@ -156,36 +117,23 @@ class TestR22SDF(AmaranthSim):
                 n_vec * self.dut.model_vlen)
             for _ in range(2))
 
-        async def set_inputs(ctx):
-            for j in range(re_in.size + self.dut.delay):
-                await ctx.tick()
-                ctx.set(self.dut.clken, 1)
-                if j < re_in.size:
-                    ctx.set(self.dut.re_in, int(re_in[j]))
-                    ctx.set(self.dut.im_in, int(im_in[j]))
-                mux_count = (j // 4**(self.order - 1)) % 4
-                ctx.set(self.dut.mux_count, mux_count)
-                if storage == 'bram':
-                    waddr = j % 2**(2 * self.order - 1)
-                    offset = 1 if not use_bram_reg else 2
-                    ctx.set(self.dut.bram_raddr, waddr + offset)
-                    ctx.set(self.dut.bram_waddr, waddr)
-
-        async def read_outputs(ctx):
-            await ctx.tick().repeat(self.dut.delay)
-            re_out, im_out = (
-                np.empty_like(re_in) for _ in range(2))
-            for j in range(re_out.size):
-                await ctx.tick()
-                re_out[j] = ctx.get(self.dut.re_out)
-                im_out[j] = ctx.get(self.dut.im_out)
-            model_re, model_im = self.dut.model(re_in, im_in)
-            np.testing.assert_equal(re_out, model_re,
-                                    'real parts do not match')
-            np.testing.assert_equal(im_out, model_im,
-                                    'imaginary parts do not match')
-
-        self.simulate([set_inputs, read_outputs])
+        j = np.arange(re_in.size + self.dut.delay)
+        inputs = {
+            'clken': 1, 're_in': re_in, 'im_in': im_in,
+            'mux_count': (j // 4**(self.order - 1)) % 4,
+        }
+        if storage == 'bram':
+            waddr = j % 2**(2 * self.order - 1)
+            offset = 1 if not use_bram_reg else 2
+            inputs.update(bram_raddr=waddr + offset, bram_waddr=waddr)
+
+        re_out, im_out = self.simulate_arrays(
+            inputs, ['re_out', 'im_out'], delay=self.dut.delay)
+        model_re, model_im = self.dut.model(re_in, im_in)
+        np.testing.assert_equal(re_out, model_re,
+                                'real parts do not match')
+        np.testing.assert_equal(im_out, model_im,
+                                'imaginary parts do not match')
 
 
 class TestTwiddle(AmaranthSim):
@@ -215,34 +163,21 @@ class TestTwiddle(AmaranthSim):
                 n_vec * self.dut.model_vlen)
             for _ in range(2))
 
-        async def set_inputs(ctx):
-            for j in range(re_in.size + self.dut.delay):
-                await ctx.tick()
-                ctx.set(self.dut.clken, 1)
-                if j < re_in.size:
-                    ctx.set(self.dut.re_in, int(re_in[j]))
-                    ctx.set(self.dut.im_in, int(im_in[j]))
-                twiddle_index = (j + adv) % self.dut.model_vlen
-                ctx.set(self.dut.twiddle_index, twiddle_index)
-
-        async def read_outputs(ctx):
-            await ctx.tick().repeat(self.dut.delay)
-            re_out, im_out = (
-                np.empty_like(re_in) for _ in range(2))
-            for j in range(re_out.size):
-                await ctx.tick()
-                re_out[j] = ctx.get(self.dut.re_out)
-                im_out[j] = ctx.get(self.dut.im_out)
-            model_re, model_im = self.dut.model(re_in, im_in)
-            # The first twiddle_index_advance elements should not be checked
-            # because the BRAM read pipeline is still not full, so they produce
-            # 0's (or whatever is in the BRAM reset state).
-            np.testing.assert_equal(
-                re_out[adv:], model_re[adv:], 'real parts do not match')
-            np.testing.assert_equal(
-                im_out[adv:], model_im[adv:], 'imaginary parts do not match')
-
-        self.simulate([set_inputs, read_outputs])
+        j = np.arange(re_in.size + self.dut.delay)
+        inputs = {
+            'clken': 1, 're_in': re_in, 'im_in': im_in,
+            'twiddle_index': (j + adv) % self.dut.model_vlen,
+        }
+        re_out, im_out = self.simulate_arrays(
+            inputs, ['re_out', 'im_out'], delay=self.dut.delay)
+        model_re, model_im = self.dut.model(re_in, im_in)
+        # The first twiddle_index_advance elements should not be checked
+        # because the BRAM read pipeline is still not full, so they produce
+        # 0's (or whatever is in the BRAM reset state).
+        np.testing.assert_equal(
+            re_out[adv:], model_re[adv:], 'real parts do not match')
+        np.testing.assert_equal(
+            im_out[adv:], model_im[adv:], 'imaginary parts do not match')
 
 
 class TestWindow(AmaranthSim):
@@ -261,37 +196,45 @@ class TestWindow(AmaranthSim):
                 n_vec * self.window.model_vlen)
             for _ in range(2))
 
-        async def set_inputs(ctx):
-            for j in range(re_in.size + self.window.delay):
-                await ctx.tick()
-                ctx.set(self.window.clken, 1)
-                if j < re_in.size:
-                    ctx.set(self.window.re_in, int(re_in[j]))
-                    ctx.set(self.window.im_in, int(im_in[j]))
-                coeff_index = (
-                    (j + self.window.coeff_index_advance) % 2**order_log2)
-                ctx.set(self.window.coeff_index, coeff_index)
-
-        async def read_outputs(ctx):
-            await ctx.tick().repeat(self.window.delay)
-            re_out, im_out = (
-                np.empty_like(re_in) for _ in range(2))
-            for j in range(re_out.size):
-                await ctx.tick()
-                re_out[j] = ctx.get(self.window.re_out)
-                im_out[j] = ctx.get(self.window.im_out)
-            model_re, model_im = self.window.model(re_in, im_in)
-            # The first coeff_index_advance elements should not be checked
-            # because the BRAM read pipeline is still not full, so they produce
-            # 0's (or whatever is in the BRAM reset state).
-            adv = self.window.coeff_index_advance
-            np.testing.assert_equal(re_out[adv:], model_re[adv:],
-                                    'real parts do not match')
-            np.testing.assert_equal(im_out[adv:], model_im[adv:],
-                                    'imaginary parts do not match')
-
-        self.simulate([set_inputs, read_outputs],
-                      named_clocks={domain_2x: 6e-9})
+        j = np.arange(re_in.size + self.window.delay)
+        adv = self.window.coeff_index_advance
+        inputs = {
+            'clken': 1, 're_in': re_in, 'im_in': im_in,
+            'coeff_index': (j + adv) % 2**order_log2,
+        }
+        re_out, im_out = self.simulate_arrays(
+            inputs, ['re_out', 'im_out'], module=self.window,
+            delay=self.window.delay, named_clocks={domain_2x: 6e-9})
+        model_re, model_im = self.window.model(re_in, im_in)
+        # The first coeff_index_advance elements should not be checked
+        # because the BRAM read pipeline is still not full, so they produce
+        # 0's (or whatever is in the BRAM reset state).
+        np.testing.assert_equal(re_out[adv:], model_re[adv:],
+                                'real parts do not match')
+        np.testing.assert_equal(im_out[adv:], model_im[adv:],
+                                'imaginary parts do not match')
+
+
+class TestTables(unittest.TestCase):
+    def check_cached(self, function, *args):
+        tables = function(*args)
+        self.assertIs(function(*args), tables)
+        fresh = function.__wrapped__(*args)
+        if isinstance(tables, np.ndarray):
+            tables, fresh = [tables], [fresh]
+        for table, fresh_table in zip(tables, fresh):
+            np.testing.assert_equal(table, fresh_table)
+            self.assertFalse(table.flags.writeable)
+            with self.assertRaises(ValueError):
+                table[0] = 0
+
+    def test_twiddles_table(self):
+        for args in [(5, 1, 22, False), (3, 2, 16, False), (3, 2, 16, True)]:
+            with self.subTest(args=args):
+                self.check_cached(_twiddles_table, *args)
+
+    def test_window_table(self):
+        self.check_cached(_window_table, 'blackmanharris', 8, 18)
 
 
 class TestFFT(AmaranthSim):
@@ -300,14 +243,9 @@ class TestFFT(AmaranthSim):
         self.order_log2 = 6
         self.fft_size = 2**self.order_log2
 
-    def test_model_vs_numpy(self):
-        for radix, radix_log2 in zip([2, 4, 'R22'], [1, 2, 2]):
-            with self.subTest(radix=radix):
-                for no_truncate in [False, True]:
-                    with self.subTest(no_truncate=no_truncate):
-                        self.model_vs_numpy(radix, radix_log2, no_truncate)
-
-    def model_vs_numpy(self, radix, radix_log2, no_truncate):
+    @sweep(radix=[2, 4, 'R22'], no_truncate=[False, True])
+    def test_model_vs_numpy(self, radix, no_truncate):
+        radix_log2 = 1 if radix == 2 else 2
         truncates = None
         if no_truncate:
             nstages = self.order_log2 // radix_log2
@@ -345,9 +283,7 @@ class TestFFT(AmaranthSim):
             out_npy *= fft_size
         # Perform bit-order inversion at the output of the numpy FFT.
         bitinvert_radix = radix_log2 if radix != 'R22' else 1
-        invert = np.array([
-            bit_invert(n, self.order_log2, bitinvert_radix)
-            for n in range(fft_size)])
+        invert = bit_invert_permutation(self.order_log2, bitinvert_radix)
         out_npy = out_npy[:, invert].ravel()
         relative_error = np.sqrt(
             np.sum(np.abs(out_complex - out_npy)**2)
@@ -358,6 +294,30 @@ class TestFFT(AmaranthSim):
              f'model: {out_complex}\n'
              f'numpy: {out_npy}')
 
+    @sweep(radix=[2, 4, 'R22'])
+    def test_model_batched(self, radix):
+        fft = FFT(self.width, self.order_log2, radix)
+        self.dut = fft
+        n_vec = 16
+        re_in, im_in = np.random.randint(
+            -2**(self.width-1), 2**(self.width-1),
+            size=(2, n_vec, self.fft_size))
+        re_out, im_out = fft.model(re_in, im_in)
+        # The model, which processes all the vectors at once, should give
+        # the same result as the FFT
+        re_rtl, im_rtl = self.simulate_arrays(
+            {'clken': 1, 're_in': np.append(re_in, 0),
+             'im_in': np.append(im_in, 0)},
+            ['re_out', 'im_out'], delay=fft.delay, count=re_in.size)
+        np.testing.assert_equal(re_out, re_rtl)
+        np.testing.assert_equal(im_out, im_rtl)
+        # Processing vectors one by one should give the same result
+        for j in range(n_vec):
+            re, im = fft.model(re_in[j], im_in[j])
+            v = slice(j * self.fft_size, (j + 1) * self.fft_size)
+            np.testing.assert_equal(re_out[v], re)
+            np.testing.assert_equal(im_out[v], im)
+
     def dummy_simulation(self):
         # Dummy simulation, to keep amaranth happy (otherwise amaranth
         # complains that we didn't use the DUT if we only use it to run
@@ -494,40 +454,113 @@ class TestFFT(AmaranthSim):
         re_in = [int(a) for a in np.round(input_all).real]
         im_in = [int(a) for a in np.round(input_all).imag]
 
-        async def set_inputs(ctx):
-            for j in range(len(re_in)):
-                await ctx.tick()
-                ctx.set(self.fft.clken, 1)
-                ctx.set(self.fft.re_in, re_in[j])
-                ctx.set(self.fft.im_in, im_in[j])
-            await ctx.tick()
-            ctx.set(self.fft.re_in, 0)
-            ctx.set(self.fft.im_in, 0)
-
-        async def read_outputs(ctx):
-            await ctx.tick().repeat(self.fft.delay)
-            re_out, im_out = (
-                np.empty(input_all.size, 'int') for _ in range(2))
-            for j in range(input_all.size):
-                await ctx.tick()
-                re_out[j] = ctx.get(self.fft.re_out)
-                im_out[j] = ctx.get(self.fft.im_out)
-                out_last = ctx.get(self.fft.out_last)
-                if j % fft_size == fft_size - 1:
-                    assert out_last
-                else:
-                    assert not out_last
-            re_model, im_model = self.fft.model(re_in, im_in)
-            np.testing.assert_equal(re_out, re_model)
-            np.testing.assert_equal(im_out, im_model)
-
         named_clocks = {}
         if hasattr(self, 'domain_2x'):
             named_clocks[self.domain_2x] = 6e-9
         if hasattr(self, 'domain_3x'):
             named_clocks[self.domain_3x] = 4e-9
-        self.simulate([set_inputs, read_outputs], vcd=vcd,
-                      named_clocks=named_clocks)
+        re_out, im_out, out_last = self.simulate_arrays(
+            {'clken': 1, 're_in': re_in + [0], 'im_in': im_in + [0]},
+            ['re_out', 'im_out', 'out_last'], module=self.fft,
+            delay=self.fft.delay, count=len(re_in), vcd=vcd,
+            named_clocks=named_clocks)
+        np.testing.assert_equal(
+            out_last, np.arange(len(re_in)) % fft_size == fft_size - 1)
+        re_model, im_model = self.fft.model(re_in, im_in)
+        np.testing.assert_equal(re_out, re_model)
+        np.testing.assert_equal(im_out, im_model)
+
+
+class TestFFTVariableOrder(AmaranthSim):
+    def setUp(self):
+        self.width = 16
+        self.order_log2 = 6
+
+    def setup_fft(self, radix, window):
+        kwargs = {}
+        domains = []
+        self.named_clocks = {}
+        if window:
+            kwargs.update(window='blackmanharris', domain_2x='clk2x')
+            domains.append(('clk2x', 2, 'common_edge_2x'))
+            self.named_clocks['clk2x'] = 6e-9
+        # The BRAM output register is only used with radix 2^2, as in the
+        # spectrometer
+        self.fft = FFT(self.width, self.order_log2, radix, order_log2_min=2,
+                       butterfly_storage='bram',
+                       use_bram_reg=radix == 'R22', **kwargs)
+        self.dut = CommonEdgeTb(self.fft, domains)
+
+    def random_input(self, size):
+        # The amplitude is limited to avoid overflows in the twiddle
+        # multiplications
+        return np.random.randint(
+            -2**(self.width-2), 2**(self.width-2), size=(2, size))
+
+    @sweep(radix=[2, 'R22'], window=[False, True])
+    def test_order(self, radix, window):
+        self.setup_fft(radix, window)
+        expected_orders = (list(range(6, 1, -1)) if radix == 2
+                           else [6, 4, 2])
+        self.assertEqual(self.fft.orders, expected_orders)
+        for order in self.fft.orders:
+            with self.subTest(order=order):
+                size = 2**order
+                re_in, im_in = self.random_input(8 * size)
+                re_out, im_out, out_last = self.simulate_arrays(
+                    {'clken': 1, 'active_order_log2': order,
+                     're_in': re_in, 'im_in': im_in},
+                    ['re_out', 'im_out', 'out_last'], module=self.fft,
+                    delay=self.fft.delay_order(order), count=re_in.size,
+                    named_clocks=self.named_clocks)
+                # The first vector is not checked, because the window BRAM
+                # pipeline is not full yet
+                check = slice(size, None)
+                np.testing.assert_equal(
+                    out_last, np.arange(re_in.size) % size == size - 1)
+                re_model, im_model = self.fft.model(re_in, im_in, order)
+                np.testing.assert_equal(re_out[check], re_model[check])
+                np.testing.assert_equal(im_out[check], im_model[check])
+
+    @sweep(radix=[2, 'R22'])
+    def test_change_order(self, radix):
+        self.setup_fft(radix, window=True)
+        full = 2**self.order_log2
+        for order in self.fft.orders[1:]:
+            with self.subTest(order=order):
+                size = 2**order
+                count = 2 * full + 8 * size
+                re_in, im_in = self.random_input(count)
+                active_order = np.full(count, self.order_log2)
+                active_order[2 * full:] = order
+                re_out, im_out, out_last = self.simulate_arrays(
+                    {'clken': 1, 'active_order_log2': active_order,
+                     're_in': re_in, 'im_in': im_in},
+                    ['re_out', 'im_out', 'out_last'], module=self.fft,
+                    delay=self.fft.delay_order(order), count=count,
+                    named_clocks=self.named_clocks)
+                # Check the vectors after the first two vectors with the new
+                # size
+                check = slice(2 * full + 2 * size, None)
+                np.testing.assert_equal(
+                    out_last[check],
+                    np.arange(count)[check] % size == size - 1)
+                re_model, im_model = self.fft.model(
+                    re_in[check], im_in[check], order)
+                np.testing.assert_equal(re_out[check], re_model)
+                np.testing.assert_equal(im_out[check], im_model)
+
+    def test_model_unsupported_order(self):
+        self.setup_fft('R22', window=False)
+        self.dummy_simulation()
+        with self.assertRaises(ValueError):
+            self.fft.model(np.zeros(32), np.zeros(32), 5)
+
+    def dummy_simulation(self):
+        async def dummy(ctx):
+            pass
+
+        self.simulate(dummy)
 
 
 if __name__ == '__main__':
@@ -12,7 +12,8 @@ import scipy.signal
 
 import unittest
 
-from maia_hdl.fir import FIR4DSP, FIR2DSP, FIRDecimator3Stage
+from maia_hdl.fir import (
+    FIR4DSP, FIR2DSP, FIRDecimator3Stage, FIRDecimator3StageModel, FIRModel)
 from .amaranth_sim import AmaranthSim
 
 
@@ -73,6 +74,10 @@ class TestFIR(AmaranthSim):
             if not self.odd_operations or j != op - 1:
                 self.coeffs[num_coeffs//2+j::op][:dec] = (
                         self.taps[(2*j+1)*dec:][:dec][::-1])
+        np.testing.assert_equal(
+            self.dut.model_taps(self.coeffs, dec, op - 1,
+                                self.odd_operations),
+            self.taps)
 
         self.fir_common_test()
 
@@ -82,6 +87,39 @@ class TestFIR(AmaranthSim):
     def test_FIR2DSP_macc_trunc(self):
         self.macc_trunc = 2
 
+    def test_FIR2DSP_model_convolution(self):
+        # With no truncation and no overflow, the model must match a
+        # decimated convolution.
+        dut = FIR2DSP(macc_trunc=0, out_width=32)
+        decimation = 5
+        taps = np.random.randint(-2**7, 2**7, size=decimation * 7)
+        re_in, im_in = (np.random.randint(-2**7, 2**7, size=1003)
+                        for _ in range(2))
+        re_out, im_out = dut.model(taps, decimation, re_in, im_in)
+        nout = re_in.size // decimation
+        for x, y in [(re_in, re_out), (im_in, im_out)]:
+            np.testing.assert_equal(
+                y, np.convolve(x, taps)[::decimation][:nout])
+
+    def test_model_chunks(self):
+        decimation = 7
+        taps = np.random.randint(-2**17, 2**17, size=decimation * 9)
+        re_in, im_in = (np.random.randint(-2**15, 2**15, size=5000)
+                        for _ in range(2))
+        for dut in [FIR4DSP(macc_trunc=2), FIR2DSP(macc_trunc=2)]:
+            with self.subTest(dut=type(dut).__name__):
+                expected = dut.model(taps, decimation, re_in, im_in)
+                model = FIRModel(dut, taps, decimation)
+                chunks = np.cumsum([0, 1, 6, 30, 113, 1000])
+                outputs = [
+                    model.process(re_in[a:b], im_in[a:b])
+                    for a, b in zip(chunks, np.append(chunks[1:],
+                                                      re_in.size))]
+                for j in range(2):
+                    np.testing.assert_equal(
+                        np.concatenate([out[j] for out in outputs]),
+                        expected[j])
+
     def FIR2DSP_common_test(self):
         self.dut = FIR2DSP(macc_trunc=self.macc_trunc)
 
@@ -97,6 +135,8 @@ class TestFIR(AmaranthSim):
         dec = self.decimation
         for j in range(op):
             self.coeffs[j::op][:dec] = self.taps[j*dec:][:dec][::-1]
+        np.testing.assert_equal(
+            self.dut.model_taps(self.coeffs, dec, op - 1), self.taps)
 
         self.min_wait = 0
         self.max_wait = 16
@@ -259,19 +299,31 @@ class TestFIRDecimator(AmaranthSim):
                 coeffs3[num_coeffs//2+j::op][:dec] = (
                         taps[(2*j+1)*dec:][:dec][::-1])
 
+        registers = {
+            'decimation1': D1, 'decimation2': D2, 'decimation3': D3,
+            'operations_minus_one1': operations1 - 1,
+            'operations_minus_one2': operations2 - 1,
+            'operations_minus_one3': operations3 - 1,
+            'odd_operations1': odd1, 'odd_operations3': odd3,
+            'bypass2': False, 'bypass3': False,
+        }
+
+        # chirp input
         nsamples = 25000
+        amplitude = 2**11 - 1
+        dfreq = 1e-5
+        freq = dfreq * np.arange(nsamples)
+        phase = np.concatenate(([0], np.cumsum(freq[:-1])))
+        z = amplitude * np.exp(1j * phase)
+        re_in = np.round(z.real).astype('int')
+        im_in = np.round(z.imag).astype('int')
+
+        re_out = []
+        im_out = []
 
         async def set_inputs(ctx):
-            ctx.set(self.dut.decimation1, D1)
-            ctx.set(self.dut.decimation2, D2)
-            ctx.set(self.dut.decimation3, D3)
-            ctx.set(self.dut.bypass2, 0)
-            ctx.set(self.dut.bypass3, 0)
-            ctx.set(self.dut.operations_minus_one1, operations1 - 1)
-            ctx.set(self.dut.operations_minus_one2, operations2 - 1)
-            ctx.set(self.dut.operations_minus_one3, operations3 - 1)
-            ctx.set(self.dut.odd_operations1, odd1)
-            ctx.set(self.dut.odd_operations3, odd3)
+            for name, value in registers.items():
+                ctx.set(getattr(self.dut, name), int(value))
 
             # load coefficients
             for addr, coeff in enumerate(coeffs1):
@@ -291,36 +343,52 @@ class TestFIRDecimator(AmaranthSim):
             ctx.set(self.dut.coeff_wren, 0)
 
             # feed samples
-            amplitude = 2**11 - 1
-            phase = 0
-            freq = 0
-            dfreq = 1e-5
-            for _ in range(nsamples):
-                z = np.exp(1j * phase)
-                phase = (phase + freq + np.pi) % (2 * np.pi) - np.pi
-                freq += dfreq
-                re = int(np.round(amplitude * z.real))
-                im = int(np.round(amplitude * z.imag))
+            for re, im in zip(re_in, im_in):
                 ctx.set(self.dut.in_valid, 1)
-                ctx.set(self.dut.re_in, re)
-                ctx.set(self.dut.im_in, im)
+                ctx.set(self.dut.re_in, int(re))
+                ctx.set(self.dut.im_in, int(im))
                 while True:
                     await ctx.tick()
                     if ctx.get(self.dut.in_ready):
                         break
 
-        async def write_output(ctx):
-            out = np.zeros(2 * (nsamples // D), 'int16')
-            for j in range(out.size // 2):
+        async def read_output(ctx):
+            for _ in range(nsamples // D):
                 while True:
                     await ctx.tick()
                     if ctx.get(self.dut.strobe_out):
-                        out[2 * j] = ctx.get(self.dut.re_out)
-                        out[2 * j + 1] = ctx.get(self.dut.im_out)
+                        re_out.append(ctx.get(self.dut.re_out))
+                        im_out.append(ctx.get(self.dut.im_out))
                         break
-            out.tofile('decimator_out.cs16')
 
-        self.simulate([set_inputs, write_output])
+        self.simulate([set_inputs, read_output])
+
+        coeffs = np.concatenate((coeffs1, coeffs2, np.zeros(128, 'int'),
+                                 coeffs3))
+        model = FIRDecimator3StageModel(self.dut, coeffs, **registers)
+        offset = model.input_offset
+        self.assertEqual(offset, 1 + D1 + D1 * D2)
+        zeros = np.zeros(offset, 'int')
+        expected = self.dut.model(
+            coeffs, np.concatenate((zeros, re_in)),
+            np.concatenate((zeros, im_in)), **registers)
+        np.testing.assert_equal(re_out, expected[0][:len(re_out)],
+                                'real parts do not match')
+        np.testing.assert_equal(im_out, expected[1][:len(im_out)],
+                                'imaginary parts do not match')
+
+        # Without the prepended zeros, the output of the model for the
+        # input without its first D - offset samples is delayed by one
+        # sample and only matches after the warm-up.
+        warmup = model.warmup
+        expected = self.dut.model(
+            coeffs, re_in[D - offset:], im_in[D - offset:], **registers)
+        np.testing.assert_equal(
+            re_out[1 + warmup:], expected[0][warmup:len(re_out) - 1],
+            'real parts do not match after the warm-up')
+        np.testing.assert_equal(
+            im_out[1 + warmup:], expected[1][warmup:len(im_out) - 1],
+            'imaginary parts do not match after the warm-up')
 
     def stage1(self, D, D1, D2, D3, N1):
         # transition [fp, D / D1 - fp]
@@ -0,0 +1,103 @@
+#
+# Copyright (C) 2024 Daniel Estevez <daniel@destevez.net>
+#
+# This file is part of maia-sdr
+#
+# SPDX-License-Identifier: MIT
+#
+
+from amaranth import *
+import numpy as np
+
+import unittest
+
+from maia_hdl.log_power import LogPower
+from .amaranth_sim import AmaranthSim
+from .bram_source import BRAMSourceTb
+
+
+class TestLogPower(AmaranthSim):
+    def setUp(self):
+        self.sum_width = 47
+        self.exponent_width = 3
+        self.order_log2 = 7
+
+    def random_power(self, size):
+        # Random powers with a wide dynamic range, including zero and small
+        # values
+        msb = np.random.randint(-1, self.sum_width, size=size)
+        value = np.array(
+            [np.random.randint(2**m, 2**(m + 1)) if m >= 0 else 0
+             for m in msb], 'int64')
+        exponent = np.random.randint(
+            0, 2**self.exponent_width, size=size)
+        return value, exponent
+
+    def test_model(self):
+        log_power = LogPower(self.sum_width, self.exponent_width,
+                             self.order_log2)
+        value, exponent = self.random_power(100000)
+        db = log_power.model(value, exponent) / 256
+        nonzero = value != 0
+        exact = 10 * np.log10(value[nonzero] * 4.0**exponent[nonzero])
+        error = db[nonzero] - exact
+        max_error = 10 * np.log10(1 + 2**-log_power.lut_bits) + 1 / 256
+        assert np.all(error <= 1 / 256)
+        assert np.all(error >= -max_error)
+        assert np.all(db[~nonzero] == 0)
+
+    def test_conversions(self):
+        lengths = [128, 64, 128, 32]
+        log_power = LogPower(self.sum_width, self.exponent_width,
+                             self.order_log2)
+        value, exponent = self.random_power(2**self.order_log2)
+        self.dut = BRAMSourceTb(
+            log_power,
+            [int(v) | (int(e) << log_power.sumw)
+             for v, e in zip(value, exponent)],
+            log_power.sumw + log_power.ew, log_power.src_addr,
+            log_power.src_en,
+            Cat(log_power.src_value, log_power.src_exponent))
+
+        async def bench(ctx):
+            previous = None
+            for num, length in enumerate(lengths):
+                ctx.set(log_power.length, length)
+                ctx.set(log_power.start, 1)
+                await ctx.tick()
+                ctx.set(log_power.start, 0)
+                cycles = 0
+                while not ctx.get(log_power.done):
+                    await ctx.tick()
+                    cycles += 1
+                    # Read the output BRAM while the conversion is running to
+                    # check that it is not overwritten
+                    if previous is not None:
+                        ctx.set(log_power.rden, 1)
+                        ctx.set(log_power.raddr, 0)
+                        if cycles >= 3:
+                            assert ctx.get(log_power.rdata) == previous[0]
+                assert cycles < length + 8
+                ctx.set(log_power.rden, 0)
+                await ctx.tick()
+                ctx.set(log_power.rden, 1)
+                words = []
+                for j in range(length // 4 + 1):
+                    ctx.set(log_power.raddr, min(j, length // 4 - 1))
+                    await ctx.tick()
+                    if j >= 1:
+                        words.append(ctx.get(log_power.rdata))
+                ctx.set(log_power.rden, 0)
+                expected = log_power.model(
+                    value[:length], exponent[:length]).astype('<u2').view(
+                        '<u8')
+                np.testing.assert_equal(
+                    words, expected,
+                    f'wrong words in conversion {num} (length = {length})')
+                previous = [int(x) for x in expected]
+
+        self.simulate(bench)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -11,7 +11,7 @@ import numpy as np
 
 import unittest
 
-from maia_hdl.mixer import Mixer
+from maia_hdl.mixer import Mixer, _cexp_table
 from .amaranth_sim import AmaranthSim
 from .common_edge import CommonEdgeTb
 
@@ -53,5 +53,16 @@ class TestMixer(AmaranthSim):
         self.simulate(bench, named_clocks={domain_3x: 4e-9})
 
 
+class TestCexpTable(unittest.TestCase):
+    def test_cached(self):
+        tables = _cexp_table(10, 18)
+        self.assertIs(_cexp_table(10, 18), tables)
+        for table, fresh in zip(tables, _cexp_table.__wrapped__(10, 18)):
+            np.testing.assert_equal(table, fresh)
+            self.assertFalse(table.flags.writeable)
+            with self.assertRaises(ValueError):
+                table[0] = 0
+
+
 if __name__ == '__main__':
     unittest.main()
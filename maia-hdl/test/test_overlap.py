@@ -0,0 +1,167 @@
+#
+# Copyright (C) 2024 Daniel Estevez <daniel@destevez.net>
+#
+# This file is part of maia-sdr
+#
+# SPDX-License-Identifier: MIT
+#
+
+from amaranth import *
+import numpy as np
+
+import unittest
+
+from maia_hdl.overlap import OverlapBuffer
+from .amaranth_sim import AmaranthSim, sweep
+
+
+class TestOverlapBuffer(AmaranthSim):
+    def setUp(self):
+        self.width = 16
+        self.order_log2 = 6
+        self.overlap_log2_max = 2
+
+    @sweep(overlap_log2=[0, 1, 2], full_rate=[False, True])
+    def test_model(self, overlap_log2, full_rate):
+        self.dut = OverlapBuffer(
+            self.width, self.order_log2, self.overlap_log2_max)
+        nblocks = 20
+        size = nblocks * 2**self.order_log2
+        re_in, im_in = (
+            np.random.randint(-2**(self.width - 1), 2**(self.width - 1),
+                              size=size)
+            for _ in range(2))
+        # The input rate is at most 1/2**overlap_log2 times the clock rate.
+        period = 2**overlap_log2
+
+        async def set_inputs(ctx):
+            ctx.set(self.dut.overlap_log2, overlap_log2)
+            for re, im in zip(re_in, im_in):
+                ctx.set(self.dut.strobe_in, 1)
+                ctx.set(self.dut.re_in, int(re))
+                ctx.set(self.dut.im_in, int(im))
+                await ctx.tick()
+                ctx.set(self.dut.strobe_in, 0)
+                gap = period - 1
+                if not full_rate:
+                    gap += np.random.randint(3)
+                for _ in range(gap):
+                    await ctx.tick()
+
+        re_out, im_out = [], []
+
+        async def check_outputs(ctx):
+            gaps = []
+            gap = 0
+            for _ in range(size * period * 4):
+                await ctx.tick()
+                if ctx.get(self.dut.strobe_out):
+                    re_out.append(ctx.get(self.dut.re_out))
+                    im_out.append(ctx.get(self.dut.im_out))
+                    gaps.append(gap)
+                    gap = 0
+                else:
+                    gap += 1
+            if full_rate and overlap_log2 == 0:
+                # The blocks are output back-to-back
+                assert max(gaps[2**self.order_log2:]) == 0
+            assert not ctx.get(self.dut.overrun)
+
+        self.simulate([set_inputs, check_outputs])
+
+        re_exp, im_exp = self.dut.model(
+            re_in, im_in, overlap_log2=overlap_log2)
+        np.testing.assert_equal(re_out, re_exp)
+        np.testing.assert_equal(im_out, im_exp)
+
+    def test_change_config(self):
+        self.dut = OverlapBuffer(
+            self.width, self.order_log2, self.overlap_log2_max)
+        n = 2**self.order_log2
+        size = 16 * n
+        re_in, im_in = (
+            np.random.randint(-2**(self.width - 1), 2**(self.width - 1),
+                              size=size)
+            for _ in range(2))
+
+        async def set_inputs(ctx):
+            for j, (re, im) in enumerate(zip(re_in, im_in)):
+                if j == size // 2:
+                    ctx.set(self.dut.active_order_log2, self.order_log2 - 2)
+                    ctx.set(self.dut.overlap_log2, 1)
+                ctx.set(self.dut.strobe_in, 1)
+                ctx.set(self.dut.re_in, int(re))
+                ctx.set(self.dut.im_in, int(im))
+                await ctx.tick()
+                ctx.set(self.dut.strobe_in, 0)
+                for _ in range(1 + np.random.randint(3)):
+                    await ctx.tick()
+
+        re_out, orders = [], []
+
+        async def check_outputs(ctx):
+            for _ in range(size * 6):
+                await ctx.tick()
+                if ctx.get(self.dut.strobe_out):
+                    re_out.append(ctx.get(self.dut.re_out))
+                    orders.append(ctx.get(self.dut.order_log2_out))
+
+        self.simulate([set_inputs, check_outputs])
+
+        orders = np.array(orders)
+        changes = np.nonzero(np.diff(orders))[0] + 1
+        assert len(changes) == 1
+        # The block size changes on a multiple of the maximum block size
+        change = changes[0]
+        assert change % n == 0
+        assert np.all(orders[change:] == self.order_log2 - 2)
+        np.testing.assert_equal(re_out[:change], re_in[:change])
+        # The smaller blocks overlap by 50%
+        small = n // 4
+        blocks = np.reshape(re_out[change:], (-1, small))
+        assert blocks.shape[0] > 2 * (size - change) // small - 4
+        for j, block in enumerate(blocks):
+            start = change + j * small // 2
+            np.testing.assert_equal(block, re_in[start:start + small])
+
+    def test_overrun(self):
+        self.dut = OverlapBuffer(
+            self.width, self.order_log2, self.overlap_log2_max)
+        n = 2**self.order_log2
+
+        async def bench(ctx):
+            ctx.set(self.dut.overlap_log2, 2)
+            # The input rate is 1/2 of the clock rate, which is too fast
+            # for an overlap factor of 4.
+            overrun = []
+            for _ in range(8 * n):
+                ctx.set(self.dut.strobe_in, 1)
+                await ctx.tick()
+                ctx.set(self.dut.strobe_in, 0)
+                await ctx.tick()
+                overrun.append(ctx.get(self.dut.overrun))
+            assert not overrun[0]
+            assert overrun[-1]
+            # The flag is sticky
+            first = overrun.index(1)
+            assert all(overrun[first:])
+            for _ in range(8 * n):
+                await ctx.tick()
+            assert ctx.get(self.dut.overrun)
+            ctx.set(self.dut.clear_overrun, 1)
+            await ctx.tick()
+            ctx.set(self.dut.clear_overrun, 0)
+            assert not ctx.get(self.dut.overrun)
+            # The flag is not set again when the input rate is slow enough
+            for _ in range(8 * n):
+                ctx.set(self.dut.strobe_in, 1)
+                await ctx.tick()
+                ctx.set(self.dut.strobe_in, 0)
+                await ctx.tick().repeat(3)
+            assert not ctx.get(self.dut.overrun)
+
+        self.simulate(bench)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+#
+# Copyright (C) 2024 Daniel Estevez <daniel@destevez.net>
+#
+# This file is part of maia-sdr
+#
+# SPDX-License-Identifier: MIT
+#
+
+import numpy as np
+
+import unittest
+
+from maia_hdl.ddc import DDC, DDCModel
+from maia_hdl.fft import FFT
+from maia_hdl.parallel import BlockModel, run_model
+from maia_hdl.spectrometer import Spectrometer, SpectrometerModel
+from .amaranth_sim import SeededTestCase
+
+
+class TestRunModel(SeededTestCase):
+    def check_model(self, model, re_in, im_in, shard_blocks):
+        model.reset()
+        expected = model.process(re_in, im_in)
+        result = run_model(model, re_in, im_in, processes=3,
+                           shard_blocks=shard_blocks)
+        self.assertEqual(len(result), len(expected))
+        for x, y in zip(result, expected):
+            np.testing.assert_equal(x, y)
+        # The model is left in the state at the end of the input
+        next_re, next_im = re_in[:1000], im_in[:1000]
+        out = model.process(next_re, next_im)
+        model.reset()
+        model.process(re_in, im_in)
+        for x, y in zip(out, model.process(next_re, next_im)):
+            np.testing.assert_equal(x, y)
+
+    def test_ddc(self):
+        ddc = DDC('clk3x')
+        frequency = round(0.271 * 2**ddc.nco_width)
+        coeffs = np.random.randint(
+            -2**(ddc.coeff_width - 1), 2**(ddc.coeff_width - 1), size=768)
+        registers = {
+            'decimation1': 5, 'decimation2': 3, 'decimation3': 2,
+            'operations_minus_one1': 3, 'operations_minus_one2': 5,
+            'operations_minus_one3': 9,
+            'odd_operations1': True, 'odd_operations3': False,
+        }
+        re_in, im_in = (
+            np.random.randint(-2**(ddc.iw - 1) + 1, 2**(ddc.iw - 1),
+                              size=20017)
+            for _ in range(2))
+        for bypass3 in [False, True]:
+            with self.subTest(bypass3=bypass3):
+                model = DDCModel(ddc, frequency, coeffs, bypass3=bypass3,
+                                 **registers)
+                self.check_model(model, re_in, im_in, shard_blocks=50)
+
+    def test_fft(self):
+        fft = FFT(16, 6, 'R22')
+        model = BlockModel(fft.model, fft.model_vlen)
+        re_in, im_in = (
+            np.random.randint(-2**15, 2**15, size=100 * fft.model_vlen + 7)
+            for _ in range(2))
+        self.check_model(model, re_in, im_in, shard_blocks=30)
+
+    def test_spectrometer(self):
+        spectrometer = Spectrometer(0x1000_0000, 5)
+        nfft = 2**spectrometer.fft_order_log2
+        model = SpectrometerModel(spectrometer, 2, peak_detect=False)
+        re_in, im_in = (
+            np.random.randint(-2**14, 2**14, size=13 * nfft + 1000)
+            for _ in range(2))
+        self.check_model(model, re_in, im_in, shard_blocks=None)
+
+    def test_spectrometer_overlap(self):
+        spectrometer = Spectrometer(0x1000_0000, 5, fft_order_log2_min=8,
+                                    overlap_log2_max=2)
+        nfft = 2**10
+        model = SpectrometerModel(spectrometer, 3, peak_detect=True,
+                                  fft_order_log2=10, overlap_log2=2)
+        re_in, im_in = (
+            np.random.randint(-2**14, 2**14, size=20 * nfft + 1000)
+            for _ in range(2))
+        self.check_model(model, re_in, im_in, shard_blocks=7)
+
+
+if __name__ == '__main__':
+    unittest.main()
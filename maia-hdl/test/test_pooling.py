@@ -0,0 +1,124 @@
+#
+# Copyright (C) 2024 Daniel Estevez <daniel@destevez.net>
+#
+# This file is part of maia-sdr
+#
+# SPDX-License-Identifier: MIT
+#
+
+from amaranth import *
+import numpy as np
+
+import unittest
+
+from maia_hdl.pooling import SpectrumPooling
+from .amaranth_sim import AmaranthSim, sweep
+from .bram_source import BRAMSourceTb
+
+
+class TestSpectrumPooling(AmaranthSim):
+    def setUp(self):
+        self.sum_width = 47
+        self.exponent_width = 3
+        self.order_log2 = 7
+        self.pooling_log2_max = 4
+
+    def random_power(self, size):
+        # Random powers with a wide dynamic range. The exponent is
+        # correlated with the size of the value, as in the integrator.
+        msb = np.random.randint(-1, self.sum_width, size=size)
+        value = np.array(
+            [np.random.randint(2**m, 2**(m + 1)) if m >= 0 else 0
+             for m in msb], 'int64')
+        exponent = np.clip(msb - 36 + np.random.randint(-2, 3, size=size),
+                           0, 2**self.exponent_width - 1)
+        return value, exponent
+
+    def test_model(self):
+        pooling = SpectrumPooling(
+            self.sum_width, self.exponent_width, self.order_log2,
+            self.pooling_log2_max)
+        value, exponent = self.random_power(2**12)
+        power = value * 4.0**exponent
+        for pooling_log2 in range(self.pooling_log2_max + 1):
+            n = 2**pooling_log2
+            blocks = power.reshape(-1, n)
+            for max_mode in [False, True]:
+                pooled_value, pooled_exponent = pooling.model(
+                    value, exponent, pooling_log2, max_mode)
+                pooled = pooled_value * 4.0**pooled_exponent
+                if max_mode:
+                    np.testing.assert_equal(pooled, blocks.max(axis=1))
+                else:
+                    # Each addition truncates less than one unit of the
+                    # largest exponent of the group
+                    exact = blocks.mean(axis=1)
+                    scale = 4.0**pooled_exponent
+                    assert np.all(pooled <= exact)
+                    assert np.all(pooled > exact - 2 * scale)
+                    assert np.all(pooled_value < 2**self.sum_width)
+
+    @sweep(pooling_log2=[1, 2, 4], max_mode=[False, True])
+    def test_pooling(self, pooling_log2, max_mode):
+        lengths = [128, 64, 128, 32]
+        pooling = SpectrumPooling(
+            self.sum_width, self.exponent_width, self.order_log2,
+            self.pooling_log2_max)
+        value, exponent = self.random_power(2**self.order_log2)
+        self.dut = BRAMSourceTb(
+            pooling,
+            [int(v) | (int(e) << pooling.sumw)
+             for v, e in zip(value, exponent)],
+            pooling.sumw + pooling.ew, pooling.src_addr, pooling.src_en,
+            Cat(pooling.src_value, pooling.src_exponent))
+
+        async def bench(ctx):
+            ctx.set(pooling.pooling_log2, pooling_log2)
+            ctx.set(pooling.max_mode, max_mode)
+            previous = None
+            for num, length in enumerate(lengths):
+                ctx.set(pooling.length, length)
+                ctx.set(pooling.start, 1)
+                await ctx.tick()
+                ctx.set(pooling.start, 0)
+                cycles = 0
+                while not ctx.get(pooling.done):
+                    await ctx.tick()
+                    cycles += 1
+                    # Read the output BRAM while the pooling is running to
+                    # check that it is not overwritten
+                    if previous is not None:
+                        ctx.set(pooling.rden, 1)
+                        ctx.set(pooling.rdaddr, 0)
+                        if cycles >= 3:
+                            assert (ctx.get(pooling.rdata_value)
+                                    == previous[0][0])
+                assert cycles < length + 8
+                ctx.set(pooling.rden, 0)
+                await ctx.tick()
+                ctx.set(pooling.rden, 1)
+                nout = length >> pooling_log2
+                values, exponents = [], []
+                for j in range(nout + 1):
+                    ctx.set(pooling.rdaddr, min(j, nout - 1))
+                    await ctx.tick()
+                    if j >= 1:
+                        values.append(ctx.get(pooling.rdata_value))
+                        exponents.append(ctx.get(pooling.rdata_exponent))
+                ctx.set(pooling.rden, 0)
+                expected = pooling.model(
+                    value[:length], exponent[:length], pooling_log2,
+                    max_mode)
+                np.testing.assert_equal(
+                    values, expected[0],
+                    f'wrong values in spectrum {num} (length = {length})')
+                np.testing.assert_equal(
+                    exponents, expected[1],
+                    f'wrong exponents in spectrum {num} (length = {length})')
+                previous = expected
+
+        self.simulate(bench)
+
+
+if __name__ == '__main__':
+    unittest.main()
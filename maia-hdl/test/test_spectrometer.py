@@ -0,0 +1,214 @@
+#
+# Copyright (C) 2024 Daniel Estevez <daniel@destevez.net>
+#
+# This file is part of maia-sdr
+#
+# SPDX-License-Identifier: MIT
+#
+
+import numpy as np
+
+import unittest
+
+from maia_hdl.spectrometer import Spectrometer
+from .amaranth_sim import AmaranthSim, SeededTestCase, sweep
+from .common_edge import CommonEdgeTb
+
+
+class TestSpectrometerModel(SeededTestCase):
+    def test_model_stream(self):
+        spectrometer = Spectrometer(0x1000_0000, 5)
+        nfft = 2**spectrometer.fft_order_log2
+        integrations = 2
+        re_in, im_in = (
+            np.random.randint(-2**14, 2**14, size=7*nfft + 1000)
+            for _ in range(2))
+        for peak_detect in [False, True]:
+            with self.subTest(peak_detect=peak_detect):
+                values, exponents = spectrometer.model(
+                    integrations, re_in, im_in, peak_detect)
+                self.assertEqual(values.shape, (3, nfft))
+                blocks = ((re_in[a:a + 3000], im_in[a:a + 3000])
+                          for a in range(0, re_in.size, 3000))
+                spectra = list(spectrometer.model_stream(
+                    integrations, blocks, peak_detect))
+                self.assertEqual(len(spectra), values.shape[0])
+                for j, (value, exponent) in enumerate(spectra):
+                    np.testing.assert_equal(value, values[j])
+                    np.testing.assert_equal(exponent, exponents[j])
+
+    def test_model_fft_order(self):
+        spectrometer = Spectrometer(0x1000_0000, 5, fft_order_log2_min=8)
+        self.assertEqual(spectrometer.orders, [12, 10, 8])
+        integrations = 3
+        for order_log2 in spectrometer.orders:
+            with self.subTest(order_log2=order_log2):
+                nfft = 2**order_log2
+                re_in, im_in = (
+                    np.random.randint(-2**14, 2**14, size=7*nfft)
+                    for _ in range(2))
+                values, exponents = spectrometer.model(
+                    integrations, re_in, im_in, False, order_log2)
+                self.assertEqual(values.shape, (2, nfft))
+                re_fft, im_fft = spectrometer.fft.model(
+                    re_in, im_in, order_log2)
+                expected = spectrometer.integrator.model(
+                    integrations, re_fft, im_fft, False, order_log2)
+                np.testing.assert_equal(values.ravel(), expected[0])
+                np.testing.assert_equal(exponents.ravel(), expected[1])
+        with self.assertRaises(ValueError):
+            spectrometer.model(integrations, re_in, im_in, False, 11)
+
+    def test_model_overlap(self):
+        spectrometer = Spectrometer(0x1000_0000, 5, fft_order_log2_min=8,
+                                    overlap_log2_max=2)
+        order_log2 = 8
+        nfft = 2**order_log2
+        integrations = 3
+        re_in, im_in = (
+            np.random.randint(-2**14, 2**14, size=9*nfft + 100)
+            for _ in range(2))
+        for overlap_log2 in range(spectrometer.overlap_log2_max + 1):
+            with self.subTest(overlap_log2=overlap_log2):
+                values, exponents = spectrometer.model(
+                    integrations, re_in, im_in, False, order_log2,
+                    overlap_log2)
+                re_blocks, im_blocks = spectrometer.overlap.model(
+                    re_in, im_in, order_log2, overlap_log2)
+                self.assertEqual(values.shape[0],
+                                 re_blocks.size // nfft // integrations)
+                re_fft, im_fft = spectrometer.fft.model(
+                    re_blocks, im_blocks, order_log2)
+                expected = spectrometer.integrator.model(
+                    integrations, re_fft, im_fft, False, order_log2)
+                np.testing.assert_equal(values.ravel(), expected[0])
+                np.testing.assert_equal(exponents.ravel(), expected[1])
+                blocks = ((re_in[a:a + 300], im_in[a:a + 300])
+                          for a in range(0, re_in.size, 300))
+                spectra = list(spectrometer.model_stream(
+                    integrations, blocks, False, order_log2, overlap_log2))
+                self.assertEqual(len(spectra), values.shape[0])
+                for j, (value, exponent) in enumerate(spectra):
+                    np.testing.assert_equal(value, values[j])
+                    np.testing.assert_equal(exponent, exponents[j])
+
+    def test_model_dual(self):
+        spectrometer = Spectrometer(0x1000_0000, 5, dual=True)
+        nfft = 2**spectrometer.fft_order_log2
+        integrations = 3
+        re_in, im_in = (
+            np.random.randint(-2**14, 2**14, size=7*nfft)
+            for _ in range(2))
+        values, exponents = spectrometer.model(
+            integrations, re_in, im_in, False, dual=True)
+        self.assertEqual(values.shape, (2, 2 * nfft))
+        # The first half of each buffer is the average power
+        average, average_exponents = spectrometer.model(
+            integrations, re_in, im_in, False)
+        np.testing.assert_equal(values[:, :nfft], average)
+        np.testing.assert_equal(exponents[:, :nfft], average_exponents)
+        # The second half is the peak power, which is truncated to the
+        # exponent of the average
+        peak, peak_exponents = spectrometer.model(
+            integrations, re_in, im_in, True)
+        scale = 4.0**exponents[:, nfft:]
+        dual_peak = values[:, nfft:] * scale
+        peak = peak * 4.0**peak_exponents
+        assert np.all(dual_peak <= peak)
+        assert np.all(peak - dual_peak < scale)
+
+
+class TestSpectrometer(AmaranthSim):
+    def setUp(self):
+        self.domains = [('clk2x', 2, 'common_edge_2x'),
+                        ('clk3x', 3, 'common_edge_3x')]
+        self.named_clocks = {'clk2x': 6e-9, 'clk3x': 4e-9}
+
+    @sweep(overlap_log2_max=[0, 2])
+    def test_unsupported_fft_order(self, overlap_log2_max):
+        spectrometer = Spectrometer(
+            0x1000_0000, 5, fft_order_log2_min=8,
+            overlap_log2_max=overlap_log2_max)
+        self.dut = CommonEdgeTb(spectrometer, self.domains)
+        if spectrometer.overlap is not None:
+            # The FFT and integrator only change their size at the start of
+            # an output block of the overlap buffer
+            consumers = [spectrometer.overlap.active_order_log2]
+        else:
+            consumers = [spectrometer.fft.active_order_log2,
+                         spectrometer.integrator.active_order_log2]
+
+        async def bench(ctx):
+            expected = spectrometer.fft_order_log2
+            for order in [12, 10, 9, 11, 13, 15, 8, 0, 14, 12]:
+                ctx.set(spectrometer.active_fft_order_log2, order)
+                await ctx.tick().repeat(2)
+                if order in spectrometer.orders:
+                    expected = order
+                for signal in consumers:
+                    self.assertEqual(ctx.get(signal), expected,
+                                     f'order_log2 = {order}')
+                if spectrometer.overlap is None:
+                    self.assertEqual(ctx.get(spectrometer.dma.length),
+                                     2**expected, f'order_log2 = {order}')
+
+        self.simulate(bench, named_clocks=self.named_clocks)
+
+    def test_dual(self):
+        spectrometer = Spectrometer(0x1000_0000, 2, fft_order_log2_min=8,
+                                    dual=True)
+        self.dut = CommonEdgeTb(spectrometer, self.domains)
+        order_log2 = 8
+        nfft = 2**order_log2
+        integrations = 2
+        num_buffers = 4
+        re_in, im_in = (
+            np.random.randint(-2**15, 2**15,
+                              size=(num_buffers + 3) * integrations * nfft)
+            for _ in range(2))
+        inputs = {
+            'number_integrations': integrations, 'dual_mode': 1,
+            're_in': re_in, 'im_in': im_in,
+        }
+        axi = spectrometer.dma.axi
+        buffers = []
+
+        async def axi_bench(ctx):
+            ctx.set(spectrometer.active_fft_order_log2, order_log2)
+            ctx.set(axi.awready, 1)
+            ctx.set(axi.wready, 1)
+            words = []
+            pending_b = 0
+            while len(buffers) < num_buffers:
+                await ctx.tick()
+                ctx.set(axi.bvalid, pending_b > 0)
+                if pending_b > 0:
+                    pending_b -= 1
+                if ctx.get(axi.wvalid):
+                    words.append(ctx.get(axi.wdata))
+                    if ctx.get(axi.wlast):
+                        pending_b += 1
+                if ctx.get(spectrometer.interrupt_out):
+                    buffers.append(np.array(words, 'uint64'))
+                    words = []
+
+        self.simulate_arrays(
+            inputs, [], module=spectrometer, enable='strobe_in',
+            pattern=[1, 0], benches=[axi_bench],
+            named_clocks=self.named_clocks)
+
+        # The first two transfers happen while the integrator starts up (the
+        # second one contains only the first FFT), so they are not checked,
+        # and the model starts with the second FFT.
+        values, exponents = spectrometer.model(
+            integrations, re_in[nfft:], im_in[nfft:], False, order_log2,
+            dual=True)
+        for j, buffer in enumerate(buffers[2:]):
+            self.assertEqual(buffer.size, 2 * nfft)
+            # The exponent is in the 8 MSBs and the value in the LSBs
+            np.testing.assert_equal(buffer & np.uint64(2**47 - 1), values[j])
+            np.testing.assert_equal(buffer >> np.uint64(56), exponents[j])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -11,8 +11,9 @@ import numpy as np
 
 import unittest
 
-from maia_hdl.spectrum_integrator import SpectrumIntegrator
-from .amaranth_sim import AmaranthSim
+from maia_hdl.spectrum_integrator import (
+    SpectrumIntegrator, SpectrumIntegratorModel)
+from .amaranth_sim import AmaranthSim, sweep
 from .common_edge import CommonEdgeTb
 
 
@@ -24,19 +25,90 @@ class TestSpectrumIntegrator(AmaranthSim):
         self.read_delay = 2  # we are using a BRAM output register
         self.domain_3x = 'clk3x'
 
-    def test_model(self):
+    @sweep(peak_detect=[False, True], integrations=[5, 2])
+    def test_model(self, peak_detect, integrations):
         self.fft_order_log2 = 8
         self.nfft = 2**self.fft_order_log2
-        for peak_detect in [False, True]:
-            for integrations in [5, 2]:
-                with self.subTest(integrations=integrations,
-                                  peak_detect=peak_detect):
-                    self.common_model(integrations, peak_detect)
+        self.common_model(integrations, peak_detect)
 
-    def common_model(self, integrations, peak_detect):
-        self.dut0 = SpectrumIntegrator(
+    @sweep(peak_detect=[False, True])
+    def test_variable_order(self, peak_detect):
+        self.fft_order_log2 = 8
+        self.nfft = 2**6
+        self.common_model(3, peak_detect, active_order_log2=6)
+
+    @sweep(integrations=[4, 2])
+    def test_dual(self, integrations):
+        self.fft_order_log2 = 6
+        self.nfft = 2**self.fft_order_log2
+        # peak_detect is ignored in dual mode
+        self.common_model(integrations, True, dual=True)
+
+    def test_dual_variable_order(self):
+        self.fft_order_log2 = 8
+        self.nfft = 2**6
+        self.common_model(3, False, active_order_log2=6, dual=True)
+
+    @sweep(integrations=[3, 10, 50])
+    def test_model_dual_peak_error(self, integrations):
+        self.fft_order_log2 = 6
+        self.nfft = 2**self.fft_order_log2
+        dut = SpectrumIntegrator(
+            self.domain_3x, self.width, self.fp_width, self.nint_width,
+            self.fft_order_log2, dual=True)
+        # Samples whose amplitude is close to the limit between two input
+        # exponents, which are the cases where the dual mode loses precision
+        size = 4 * integrations * self.nfft
+        amplitude = 2**np.random.uniform(
+            self.width - 2.5, self.width - 1.5, size=size)
+        phase = np.random.uniform(0, 2 * np.pi, size=size)
+        re_in, im_in = (
+            np.clip(np.round(amplitude * f(phase)),
+                    -2**(self.width-1), 2**(self.width-1) - 1).astype('int')
+            for f in [np.cos, np.sin])
+        values, exponents = (
+            x.reshape(-1, 2 * self.nfft)[:, self.nfft:]
+            for x in dut.model(integrations, re_in, im_in, False, dual=True))
+        dual_peak = values * 4.0**exponents
+        values, exponents = (
+            x.reshape(-1, self.nfft)
+            for x in dut.model(integrations, re_in, im_in, True))
+        peak = values * 4.0**exponents
+        max_error = 2**(4 - self.fp_width)
+        assert np.all(np.abs(dual_peak - peak) < max_error * peak)
+
+    def test_model_chunks(self):
+        self.fft_order_log2 = 6
+        self.nfft = 2**self.fft_order_log2
+        integrations = 4
+        dut = SpectrumIntegrator(
             self.domain_3x, self.width, self.fp_width, self.nint_width,
             self.fft_order_log2)
+        re_in, im_in = (
+            np.random.randint(-2**(self.width-1), 2**(self.width-1),
+                              size=11*integrations*self.nfft)
+            for _ in range(2))
+        for peak_detect in [False, True]:
+            with self.subTest(peak_detect=peak_detect):
+                expected = dut.model(integrations, re_in, im_in, peak_detect)
+                model = SpectrumIntegratorModel(
+                    dut, integrations, peak_detect)
+                chunks = np.cumsum([0, 1, 2, 9, 5, 13]) * self.nfft
+                outputs = [
+                    model.process(re_in[a:b], im_in[a:b])
+                    for a, b in zip(chunks, np.append(chunks[1:],
+                                                      re_in.size))]
+                for j in range(2):
+                    np.testing.assert_equal(
+                        np.concatenate([out[j] for out in outputs]).ravel(),
+                        expected[j])
+
+    def common_model(self, integrations, peak_detect,
+                     active_order_log2=None, dual=False):
+        self.dut0 = SpectrumIntegrator(
+            self.domain_3x, self.width, self.fp_width, self.nint_width,
+            self.fft_order_log2, fft_order_log2_min=active_order_log2,
+            dual=dual)
         self.dut = CommonEdgeTb(
             self.dut0, [(self.domain_3x, 3, 'common_edge')])
 
@@ -45,20 +117,18 @@ class TestSpectrumIntegrator(AmaranthSim):
                               size=(3*integrations + 1)*self.nfft)
             for _ in range(2))
 
-        async def set_inputs(ctx):
-            ctx.set(self.dut0.nint, integrations)
-            ctx.set(self.dut0.peak_detect, peak_detect)
-            for j, x in enumerate(zip(re_in, im_in)):
-                await ctx.tick()
-                re = x[0]
-                im = x[1]
-                ctx.set(self.dut0.re_in, int(re))
-                ctx.set(self.dut0.im_in, int(im))
-                ctx.set(self.dut0.input_last,
-                        j % self.nfft == self.nfft - 1)
-                ctx.set(self.dut0.clken, 1)
-                await ctx.tick()
-                ctx.set(self.dut0.clken, 0)
+        j = np.arange(re_in.size)
+        inputs = {
+            'nint': integrations, 'peak_detect': peak_detect,
+            're_in': re_in, 'im_in': im_in,
+            'input_last': j % self.nfft == self.nfft - 1,
+        }
+        if active_order_log2 is not None:
+            inputs['active_order_log2'] = active_order_log2
+        if dual:
+            inputs['dual_mode'] = 1
+        # In dual mode, the peak power is read after the average power
+        nread = self.nfft * (1 + dual)
 
         async def check_ram_contents(ctx):
             async def wait_ready():
@@ -68,10 +138,9 @@ class TestSpectrumIntegrator(AmaranthSim):
                         return
 
             async def check_ram(expected, expected_exponent):
-                read = []
-                for j in range(self.nfft + self.read_delay):
+                for j in range(nread + self.read_delay):
                     ctx.set(self.dut0.rden, 1)
-                    if j < self.nfft:
+                    if j < nread:
                         ctx.set(self.dut0.rdaddr, j)
                     if j >= self.read_delay:
                         k = j - self.read_delay
@@ -95,16 +164,18 @@ class TestSpectrumIntegrator(AmaranthSim):
                     (n * integrations + 1) * self.nfft,
                     ((n + 1) * integrations + 1) * self.nfft)
                 expected = self.dut0.model(
-                    integrations, re_in[sel], im_in[sel], peak_detect)
+                    integrations, re_in[sel], im_in[sel], peak_detect,
+                    active_order_log2, dual)
                 await check_ram(*expected)
 
-        self.simulate([set_inputs, check_ram_contents],
-                      named_clocks={self.domain_3x: 4e-9})
+        self.simulate_arrays(
+            inputs, [], module=self.dut0, enable='clken', pattern=[1, 0],
+            benches=[check_ram_contents],
+            named_clocks={self.domain_3x: 4e-9})
 
-    def test_constant_input(self):
-        for peak_detect in [False, True]:
-            with self.subTest(peak_detect):
-                self.common_constant_input(peak_detect)
+    @sweep(peak_detect=[False, True])
+    def test_constant_input(self, peak_detect):
+        self.common_constant_input(peak_detect)
 
     def common_constant_input(self, peak_detect):
         self.fft_order_log2 = 6
@@ -117,21 +188,15 @@ class TestSpectrumIntegrator(AmaranthSim):
             self.dut0, [(self.domain_3x, 3, 'common_edge')])
         integrations = 5
 
-        async def set_inputs(ctx):
-            ctx.set(self.dut0.nint, integrations)
-            ctx.set(self.dut0.peak_detect, peak_detect)
-            for n in range(10 * integrations):
-                integration_num = (n - 1) // integrations
-                amplitude = 2**(integration_num % 2)
-                for j in range(self.nfft):
-                    await ctx.tick()
-                    ctx.set(self.dut0.re_in, 0 if j % 2 else amplitude)
-                    ctx.set(self.dut0.im_in, amplitude if j % 2 else 0)
-                    ctx.set(self.dut0.input_last,
-                            j % self.nfft == self.nfft - 1)
-                    ctx.set(self.dut0.clken, 1)
-                    await ctx.tick()
-                    ctx.set(self.dut0.clken, 0)
+        n, j = np.divmod(np.arange(10 * integrations * self.nfft), self.nfft)
+        integration_num = (n - 1) // integrations
+        amplitude = 2**(integration_num % 2)
+        inputs = {
+            'nint': integrations, 'peak_detect': peak_detect,
+            're_in': np.where(j % 2, 0, amplitude),
+            'im_in': np.where(j % 2, amplitude, 0),
+            'input_last': j == self.nfft - 1,
+        }
 
         async def check_ram_contents(ctx):
             async def wait_ready():
@@ -163,8 +228,10 @@ class TestSpectrumIntegrator(AmaranthSim):
                 await wait_ready()
                 await check(n)
 
-        self.simulate([set_inputs, check_ram_contents],
-                      named_clocks={self.domain_3x: 4e-9}),
+        self.simulate_arrays(
+            inputs, [], module=self.dut0, enable='clken', pattern=[1, 0],
+            benches=[check_ram_contents],
+            named_clocks={self.domain_3x: 4e-9})
 
 
 if __name__ == '__main__':
@@ -0,0 +1,75 @@
+#
+# Copyright (C) 2024 Daniel Estevez <daniel@destevez.net>
+#
+# This file is part of maia-sdr
+#
+# SPDX-License-Identifier: MIT
+#
+
+import numpy as np
+
+import unittest
+
+from maia_hdl.util import (
+    bit_invert, bit_invert_permutation, model_dtype, rising_edges,
+    signed_width)
+from .amaranth_sim import SeededTestCase
+
+
+class TestBitInvert(unittest.TestCase):
+    def test_bit_invert(self):
+        self.assertEqual(bit_invert(0b110100, 6, 1), 0b001011)
+        self.assertEqual(bit_invert(0b110100, 6, 2), 0b000111)
+        self.assertEqual(bit_invert(0b110100, 6, 3), 0b100110)
+
+    def test_permutation(self):
+        for nbits, radix_log2 in [(12, 1), (12, 2), (8, 4), (9, 3)]:
+            with self.subTest(nbits=nbits, radix_log2=radix_log2):
+                perm = bit_invert_permutation(nbits, radix_log2)
+                np.testing.assert_equal(
+                    perm, [bit_invert(n, nbits, radix_log2)
+                           for n in range(2**nbits)])
+                # bit inversion is an involution
+                np.testing.assert_equal(perm[perm], np.arange(2**nbits))
+                self.assertIs(
+                    perm, bit_invert_permutation(nbits, radix_log2))
+
+
+class TestSignedWidth(SeededTestCase):
+    def test_signed_width(self):
+        x = np.concatenate((
+            np.arange(-1000, 1000),
+            np.random.randint(-2**63, 2**63 - 1, size=1000, dtype='int64'),
+            [2**62, 2**63 - 1, -2**63]))
+        expected = [int(a).bit_length() + 1 if a >= 0
+                    else (~int(a)).bit_length() + 1
+                    for a in x]
+        np.testing.assert_equal(signed_width(x), expected)
+
+    def test_signed_width_object(self):
+        x = np.array([2**100, -2**100, -2**100 - 1, 0, -1], dtype=object)
+        np.testing.assert_equal(signed_width(x), [102, 101, 102, 1, 1])
+
+
+class TestModelDtype(unittest.TestCase):
+    def test_model_dtype(self):
+        self.assertEqual(model_dtype(16), np.dtype('int32'))
+        self.assertEqual(model_dtype(30), np.dtype('int32'))
+        self.assertEqual(model_dtype(31), np.dtype('int64'))
+        self.assertEqual(model_dtype(62), np.dtype('int64'))
+        self.assertEqual(model_dtype(63), np.dtype(object))
+
+
+class TestRisingEdges(unittest.TestCase):
+    def test_rising_edges(self):
+        self.assertEqual(rising_edges(0, 10), 1)
+        self.assertEqual(rising_edges(9.9, 10), 1)
+        self.assertEqual(rising_edges(10, 10), 2)
+        self.assertEqual(rising_edges(5, 10, 6), 0)
+        self.assertEqual(rising_edges(6, 10, 6), 1)
+        # Rounding errors in the times do not lose an edge
+        self.assertEqual(rising_edges(0.3, 0.1), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
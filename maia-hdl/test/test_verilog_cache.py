@@ -0,0 +1,108 @@
+#
+# Copyright (C) 2024 Daniel Estevez <daniel@destevez.net>
+#
+# This file is part of maia-sdr
+#
+# SPDX-License-Identifier: MIT
+#
+
+import amaranth.back.verilog
+
+import functools
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+from maia_hdl.pulse import PulseStretcher
+from maia_hdl.verilog_cache import (
+    VerilogVariant, generate_variants, select_variants, write_verilog)
+
+
+def gen_pulse_stretcher(pulse_len_log2):
+    m = PulseStretcher(pulse_len_log2)
+    return amaranth.back.verilog.convert(
+        m, name=f'pulse_stretcher_{pulse_len_log2}',
+        ports=[m.pulse_in, m.pulse_out], emit_src=False)
+
+
+class TestVerilogCache(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+        environ = unittest.mock.patch.dict(
+            os.environ,
+            {'MAIA_HDL_VERILOG_CACHE': os.path.join(self.tmp, 'cache')})
+        environ.start()
+        self.addCleanup(environ.stop)
+        cwd = os.getcwd()
+        os.chdir(self.tmp)
+        self.addCleanup(os.chdir, cwd)
+
+    def test_write_verilog(self):
+        calls = []
+
+        def generate():
+            calls.append(None)
+            return gen_pulse_stretcher(4)
+
+        write = functools.partial(
+            write_verilog, 'out.v', generate, key={'pulse_len_log2': 4},
+            modules=['maia_hdl.pulse'])
+        self.assertFalse(write())
+        with open('out.v') as f:
+            verilog = f.read()
+        self.assertIn('pulse_stretcher_4', verilog)
+        mtime = os.stat('out.v').st_mtime_ns
+        self.assertTrue(write())
+        self.assertEqual(len(calls), 1)
+        # The output file is not rewritten if it does not change
+        self.assertEqual(os.stat('out.v').st_mtime_ns, mtime)
+        self.assertFalse(write(cache=False))
+        self.assertEqual(len(calls), 2)
+        # A different key is a cache miss
+        self.assertFalse(write(key={'pulse_len_log2': 5}))
+        self.assertEqual(len(calls), 3)
+
+    def variants(self):
+        return [
+            VerilogVariant(
+                f'pulse_stretcher_{pulse_len_log2}',
+                functools.partial(gen_pulse_stretcher, pulse_len_log2),
+                key={'pulse_len_log2': pulse_len_log2},
+                modules=['maia_hdl.pulse'])
+            for pulse_len_log2 in [2, 3, 4]]
+
+    def test_select_variants(self):
+        variants = self.variants()
+        self.assertEqual(len(select_variants(variants)), 3)
+        selected = select_variants(
+            variants, ['pulse_stretcher_2', 'pulse_stretcher_[34]'])
+        self.assertEqual([v.name for v in selected],
+                         [v.name for v in variants])
+        selected = select_variants(variants, ['*_3'])
+        self.assertEqual([v.name for v in selected], ['pulse_stretcher_3'])
+        with self.assertRaises(ValueError):
+            select_variants(variants, ['pulse_stretcher_5'])
+
+    def test_generate_variants(self):
+        for jobs in [1, 2]:
+            with self.subTest(jobs=jobs):
+                results = generate_variants(
+                    self.variants(), jobs=jobs, cache=False, summary=False)
+                self.assertEqual(list(results),
+                                 [v.name for v in self.variants()])
+                for variant in self.variants():
+                    with open(variant.path) as f:
+                        self.assertEqual(f.read(), variant.generate())
+        results = generate_variants(
+            self.variants(), select=['*_2'], jobs=2, summary=False)
+        self.assertEqual(list(results), ['pulse_stretcher_2'])
+        results = generate_variants(
+            self.variants(), select=['*_2'], jobs=2, summary=False)
+        self.assertTrue(results['pulse_stretcher_2'][1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,9 +8,10 @@
 
 import cocotb
 
-from cocotb.clock import Clock
 from cocotb.triggers import ClockCycles, RisingEdge, FallingEdge
 
+from clocks import start_clock
+
 
 async def counter(dut, count, max_iter=1000):
     rising = RisingEdge(dut.write_clk)
@@ -33,8 +34,8 @@ async def test_asyncfifo18_36(dut):
     dut.write_rst.value = 1
     dut.wren.value = 0
     dut.rden.value = 0
-    cocotb.start_soon(Clock(dut.write_clk, 11, units='ns').start())
-    cocotb.start_soon(Clock(dut.read_clk, 10, units='ns').start())
+    start_clock(dut, 'write_clk', 11)
+    start_clock(dut, 'read_clk', 10)
     await ClockCycles(dut.write_clk, 10)
     dut.fifo_rst.value = 0
     dut.read_rst.value = 0
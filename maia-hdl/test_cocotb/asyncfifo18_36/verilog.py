@@ -11,16 +11,21 @@ from amaranth import *
 from amaranth.back.verilog import convert
 
 from maia_hdl.fifo import AsyncFifo18_36
+from maia_hdl.verilog_cache import argument_parser, write_verilog
 
 
 def main():
-    dut = AsyncFifo18_36()
-    ports = [dut.reset, dut.data_in, dut.wren, dut.full, dut.wrerr,
-             dut.data_out, dut.rden, dut.empty, dut.rderr]
-    with open('dut.v', 'w') as f:
-        f.write('`timescale 1ps/1ps\n')
-        f.write(convert(
-            dut, name='dut', ports=ports, emit_src=False))
+    args = argument_parser().parse_args()
+
+    def generate():
+        dut = AsyncFifo18_36()
+        ports = [dut.reset, dut.data_in, dut.wren, dut.full, dut.wrerr,
+                 dut.data_out, dut.rden, dut.empty, dut.rderr]
+        return '`timescale 1ps/1ps\n' + convert(
+            dut, name='dut', ports=ports, emit_src=False)
+
+    write_verilog('dut.v', generate, key={'name': 'dut'},
+                  modules=['__main__'], cache=args.cache)
 
 
 if __name__ == '__main__':
@@ -6,7 +6,6 @@
 
 # Modified AXI4Slave from cocotb_bus
 
-import array
 import collections.abc
 import enum
 import itertools
@@ -129,24 +128,28 @@ class AXI4Slave(BusDriver):
 
             aw = self._aw[0]
             burst_count = aw['burst_length']
+            bytes_in_beat = aw['bytes_in_beat']
+            byteorder = 'big' if self.big_endian else 'little'
+            # The beats of the burst are collected and written to the
+            # memory at once when the burst finishes.
+            burst_data = bytearray(aw['burst_length'] * bytes_in_beat)
+            _st = 0
 
             await clock_re
 
             while True:
                 if self.bus.WREADY.value and self.bus.WVALID.value:
-                    word = self.bus.WDATA.value
-                    word.big_endian = self.big_endian
-                    _burst_diff = aw['burst_length'] - burst_count
-                    _st = (aw['_awaddr']
-                           + (_burst_diff * aw['bytes_in_beat']))  # start
-                    _end = (aw['_awaddr']
-                            + ((_burst_diff + 1) * aw['bytes_in_beat']))  # end
-                    self._memory[_st:_end] = array.array('B', word.buff)
+                    _end = _st + bytes_in_beat
+                    burst_data[_st:_end] = int(self.bus.WDATA.value).to_bytes(
+                        bytes_in_beat, byteorder)
+                    _st = _end
                     burst_count -= 1
                     if burst_count == 0:
                         break
                 await clock_re
 
+            self._memory.write(aw['_awaddr'], burst_data)
+
             if hasattr(self.bus, "BREADY") and hasattr(self.bus, "BVALID"):
                 self.bus.WREADY.value = 0
                 self.bus.BVALID.value = 1
@@ -202,8 +205,8 @@ class AXI4Slave(BusDriver):
                 if self.bus.RREADY.value:
                     _burst_diff = burst_length - burst_count
                     _st = _araddr + (_burst_diff * bytes_in_beat)
-                    _end = _araddr + ((_burst_diff + 1) * bytes_in_beat)
-                    word.buff = self._memory[_st:_end].tobytes()
+                    word.buff = self._memory.read(
+                        _st, bytes_in_beat).tobytes()
                     self.bus.RDATA.value = word
                     if burst_count == 1:
                         self.bus.RLAST.value = 1
@@ -9,10 +9,11 @@
 import cocotb
 from cocotb_bus.drivers.amba import AXI4LiteMaster
 
-from cocotb.clock import Clock
 from cocotb.triggers import ClockCycles, RisingEdge, Timer
 from cocotb.regression import TestFactory
 
+from clocks import start_clock
+
 
 class Axi4LiteTB:
     def __init__(self, dut):
@@ -34,7 +35,7 @@ async def run_test(dut):
     dut.RREADY.value = 0
     dut.rst.value = 1
     dut.clk.value = 0
-    cocotb.start_soon(Clock(dut.clk, 10, units='ns').start())
+    start_clock(dut, 'clk', 10)
     await ClockCycles(dut.clk, 2)
     tb = Axi4LiteTB(dut)
     dut.rst.value = 0
@@ -12,12 +12,16 @@ from amaranth.back.verilog import convert
 
 from maia_hdl.axi4_lite import Axi4LiteRegisterBridge
 from maia_hdl.register import Access, Field, Register, Registers
+from maia_hdl.verilog_cache import argument_parser, write_verilog
 
 
 def main():
-    m = Module()
-    address_width = 2
-    m.submodules.registers = registers = Registers(
+    args = argument_parser().parse_args()
+
+    def generate():
+        m = Module()
+        address_width = 2
+        m.submodules.registers = registers = Registers(
             'registers',
             {
                 0b00: Register('id', [Field('id', Access.R, 32, 0xf001baa2)]),
@@ -25,19 +29,21 @@ def main():
                 0b10: Register('regb', [Field('f2', Access.RW, 32, 0)]),
             },
             address_width)
-    m.submodules.bridge = bridge = Axi4LiteRegisterBridge(address_width)
-    m.d.comb += [
-        registers.ren.eq(bridge.ren),
-        registers.wstrobe.eq(bridge.wstrobe),
-        registers.address.eq(bridge.address),
-        registers.wdata.eq(bridge.wdata),
-        bridge.rdone.eq(registers.rdone),
-        bridge.wdone.eq(registers.wdone),
-        bridge.rdata.eq(registers.rdata),
-    ]
-    with open('dut.v', 'w') as f:
-        f.write(convert(
-            m, name='dut', ports=bridge.axi.ports(), emit_src=False))
+        m.submodules.bridge = bridge = Axi4LiteRegisterBridge(address_width)
+        m.d.comb += [
+            registers.ren.eq(bridge.ren),
+            registers.wstrobe.eq(bridge.wstrobe),
+            registers.address.eq(bridge.address),
+            registers.wdata.eq(bridge.wdata),
+            bridge.rdone.eq(registers.rdone),
+            bridge.wdone.eq(registers.wdone),
+            bridge.rdata.eq(registers.rdata),
+        ]
+        return convert(
+            m, name='dut', ports=bridge.axi.ports(), emit_src=False)
+
+    write_verilog('dut.v', generate, key={'name': 'dut'},
+                  modules=['__main__'], cache=args.cache)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,29 @@
+#
+# Copyright (C) 2024 Daniel Estevez <daniel@destevez.net>
+#
+# This file is part of maia-sdr
+#
+# SPDX-License-Identifier: MIT
+#
+
+import cocotb
+from cocotb.clock import Clock
+
+import json
+import os
+
+
+def start_clock(dut, name, period_ns):
+    """Starts a clock of the testbench
+
+    The clock starts high, so its first rising edge is at the current
+    simulation time. The signal name and period are appended to the file
+    given by the ``MAIA_HDL_SIM_CLOCKS`` environment variable, which is set
+    by metrics.py to compute the number of cycles of each clock.
+    """
+    cocotb.start_soon(Clock(getattr(dut, name), period_ns, units='ns').start())
+    path = os.environ.get('MAIA_HDL_SIM_CLOCKS')
+    if path:
+        with open(path, 'a') as f:
+            f.write(json.dumps({'signal': name, 'period_ns': period_ns})
+                    + '\n')
@@ -7,9 +7,10 @@
 #
 
 import cocotb
-from cocotb.clock import Clock
 from cocotb.triggers import ClockCycles, RisingEdge, FallingEdge
 
+from clocks import start_clock
+
 import random
 
 
@@ -26,8 +27,8 @@ async def test_cmult3x(dut):
     dut.wide_im_a.value = 0
     dut.wide_re_b.value = 0
     dut.wide_im_b.value = 0
-    cocotb.start_soon(Clock(dut.clk, 12, units='ns').start())
-    cocotb.start_soon(Clock(dut.clk3x_clk, 4, units='ns').start())
+    start_clock(dut, 'clk', 12)
+    start_clock(dut, 'clk3x_clk', 4)
     # We need to wait for 100 ns for GSR to go low
     await ClockCycles(dut.clk, 20)
     dut.rst.value = 0
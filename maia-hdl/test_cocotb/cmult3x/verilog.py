@@ -13,6 +13,7 @@ from amaranth.back.verilog import convert
 from maia_hdl.cmult import Cmult3x
 from maia_hdl.clknx import ClkNxCommonEdge
 from maia_hdl.pluto_platform import PlutoPlatform
+from maia_hdl.verilog_cache import argument_parser, write_verilog
 
 
 class Tb(Elaboratable):
@@ -33,20 +34,24 @@ class Tb(Elaboratable):
 
 
 def main():
-    tb = Tb()
-    platform = PlutoPlatform()
-    port_names = ['clken', 're_a', 'im_a', 're_b', 'im_b',
-                  're_out', 'im_out']
-    for n in port_names:
-        getattr(tb.dut_wide, n).name = f'wide_{n}'
-    ports = [getattr(dut, n)
-             for dut in [tb.dut, tb.dut_wide]
-             for n in port_names]
-    with open('dut.v', 'w') as f:
-        f.write('`timescale 1ps/1ps\n')
-        f.write(convert(
+    args = argument_parser().parse_args()
+
+    def generate():
+        tb = Tb()
+        platform = PlutoPlatform()
+        port_names = ['clken', 're_a', 'im_a', 're_b', 'im_b',
+                      're_out', 'im_out']
+        for n in port_names:
+            getattr(tb.dut_wide, n).name = f'wide_{n}'
+        ports = [getattr(dut, n)
+                 for dut in [tb.dut, tb.dut_wide]
+                 for n in port_names]
+        return '`timescale 1ps/1ps\n' + convert(
             tb, name='dut', ports=ports, platform=platform,
-            emit_src=False))
+            emit_src=False)
+
+    write_verilog('dut.v', generate, key={'name': 'dut'},
+                  modules=['__main__'], cache=args.cache)
 
 
 if __name__ == '__main__':
@@ -7,10 +7,11 @@
 #
 
 import cocotb
-from cocotb.clock import Clock
 from cocotb.triggers import ClockCycles, RisingEdge, FallingEdge
 from cocotb.regression import TestFactory
 
+from clocks import start_clock
+
 import random
 
 
@@ -22,8 +23,8 @@ async def run_test(dut, peak_detect=False):
     dut.im_in.value = 0
     dut.real_in.value = 0
     dut.peak_detect.value = peak_detect
-    cocotb.start_soon(Clock(dut.clk, 12, units='ns').start())
-    cocotb.start_soon(Clock(dut.clk3x_clk, 4, units='ns').start())
+    start_clock(dut, 'clk', 12)
+    start_clock(dut, 'clk3x_clk', 4)
     # We need to wait for 100 ns for GSR to go low
     await ClockCycles(dut.clk, 20)
     dut.rst.value = 0
@@ -13,6 +13,7 @@ from amaranth.back.verilog import convert
 from maia_hdl.clknx import ClkNxCommonEdge
 from maia_hdl.cpwr import CpwrPeak
 from maia_hdl.pluto_platform import PlutoPlatform
+from maia_hdl.verilog_cache import argument_parser, write_verilog
 
 
 class Tb(Elaboratable):
@@ -31,16 +32,20 @@ class Tb(Elaboratable):
 
 
 def main():
-    tb = Tb()
-    platform = PlutoPlatform()
-    ports = [tb.dut.clken, tb.dut.re_in, tb.dut.im_in,
-             tb.dut.real_in, tb.dut.peak_detect,
-             tb.dut.out, tb.dut.is_greater]
-    with open('dut.v', 'w') as f:
-        f.write('`timescale 1ps/1ps\n')
-        f.write(convert(
+    args = argument_parser().parse_args()
+
+    def generate():
+        tb = Tb()
+        platform = PlutoPlatform()
+        ports = [tb.dut.clken, tb.dut.re_in, tb.dut.im_in,
+                 tb.dut.real_in, tb.dut.peak_detect,
+                 tb.dut.out, tb.dut.is_greater]
+        return '`timescale 1ps/1ps\n' + convert(
             tb, name='dut', ports=ports, platform=platform,
-            emit_src=False))
+            emit_src=False)
+
+    write_verilog('dut.v', generate, key={'name': 'dut'},
+                  modules=['__main__'], cache=args.cache)
 
 
 if __name__ == '__main__':
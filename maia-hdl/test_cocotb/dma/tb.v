@@ -28,6 +28,7 @@ module tb
    output wire [7:0]  WSTRB,
    output wire        WVALID,
    input wire         start,
+   input wire [12:0]  length,
    output wire        busy,
    output wire [5:0]  last_buffer,
    // These are used by cocotb
@@ -58,7 +59,7 @@ module tb
       .awcache(AWCACHE), .awprot(AWPROT), .awvalid(AWVALID), .awready(AWREADY),
       .wdata(WDATA), .wstrb(WSTRB), .wlast(WLAST), .wvalid(WVALID),
       .wready(WREADY), .bresp(BRESP), .bvalid(BVALID), .bready(BREADY),
-      .clk(clk), .rst(rst), .start(start), .busy(busy),
+      .clk(clk), .rst(rst), .start(start), .length(length), .busy(busy),
       .last_buffer(last_buffer), .raddr(raddr), .rdata(rdata), .ren(ren));
 
 `ifdef COCOTB_SIM
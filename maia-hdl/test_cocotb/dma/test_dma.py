@@ -6,29 +6,30 @@
 # SPDX-License-Identifier: MIT
 #
 
-import array
 import random
-import struct
+
+import numpy as np
 
 import cocotb
 from cocotb_bus.drivers import BitDriver
 
 from axi import AXI4Slave
 from backpressure import RandomReady
+from clocks import start_clock
 from memory import Memory
 
-from cocotb.clock import Clock
 from cocotb.triggers import ClockCycles, RisingEdge
 from cocotb.regression import TestFactory
 
 
+BASE_ADDRESS = 0x08000000
 BRAM_SIZE = 4096
 NUM_WRITES = 3  # write 3 transfers per test
 
 
 class DmaBRAMWriteTB:
     def __init__(self, dut):
-        self.memory = Memory(2 * 1024 * 1024)
+        self.memory = Memory()
         self.subordinate = AXI4Slave(dut, None, dut.clk, self.memory)
         self.backpressure = BitDriver(dut.WREADY, dut.clk)
 
@@ -57,10 +58,11 @@ async def check_address(dut):
 
 
 async def run_test(dut, backpressure_inserter=None):
-    cocotb.start_soon(Clock(dut.clk, 10, units='ns').start())
+    start_clock(dut, 'clk', 10)
     cocotb.start_soon(check_address(dut))
     dut.rst.value = 1
     dut.start.value = 0
+    dut.length.value = BRAM_SIZE
     await ClockCycles(dut.clk, 2)
     tb = DmaBRAMWriteTB(dut)
     dut.rst.value = 0
@@ -82,12 +84,11 @@ async def run_test(dut, backpressure_inserter=None):
             break
 
     assert bytes_written == NUM_WRITES * BRAM_SIZE * 8  # 8 bytes/word
-    expected = array.array('B', [0] * bytes_written)
-    for word in range(bytes_written // bytes_per_word):
-        expected[word*bytes_per_word:(word+1)*bytes_per_word] = (
-            array.array('B', struct.pack('<Q', word % BRAM_SIZE)))
+    words = bytes_written // bytes_per_word
+    expected = np.arange(words, dtype='<u8') % BRAM_SIZE
 
-    assert tb.memory._data[:bytes_written] == expected, \
+    assert np.array_equal(
+        tb.memory.read(BASE_ADDRESS, bytes_written).view('<u8'), expected), \
         'memory contents do not match'
 
 
@@ -11,13 +11,19 @@ from amaranth import *
 from amaranth.back.verilog import convert
 
 from maia_hdl.dma import DmaBRAMWrite
+from maia_hdl.verilog_cache import argument_parser, write_verilog
 
 
 def main():
-    with open('dut.v', 'w') as f:
+    args = argument_parser().parse_args()
+
+    def generate():
         m = DmaBRAMWrite(0x08000000, 6, 12)
-        f.write(convert(
-            m, name='dut', ports=m.ports(), emit_src=False))
+        return convert(
+            m, name='dut', ports=m.ports(), emit_src=False)
+
+    write_verilog('dut.v', generate, key={'name': 'dut'},
+                  modules=['__main__'], cache=args.cache)
 
 
 if __name__ == '__main__':
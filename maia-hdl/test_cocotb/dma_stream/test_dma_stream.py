@@ -6,19 +6,19 @@
 # SPDX-License-Identifier: MIT
 #
 
-import array
 import random
 import math
-import struct
+
+import numpy as np
 
 import cocotb
 from cocotb_bus.drivers import BitDriver
 
 from axi import AXI4Slave
 from backpressure import RandomReady
+from clocks import start_clock
 from memory import Memory
 
-from cocotb.clock import Clock
 from cocotb.triggers import ClockCycles, RisingEdge
 from cocotb.regression import TestFactory
 
@@ -72,7 +72,7 @@ async def stream_data(dut):
 
 
 async def run_test(dut, backpressure_inserter=None):
-    cocotb.start_soon(Clock(dut.clk, 10, units='ns').start())
+    start_clock(dut, 'clk', 10)
     cocotb.start_soon(check_address(dut))
     dut.rst.value = 1
     dut.start.value = 0
@@ -99,15 +99,14 @@ async def run_test(dut, backpressure_inserter=None):
             break
 
     assert bytes_written == NUM_WRITES * MEMORY_BYTES
-    expected = array.array('B', [0] * MEMORY_BYTES)
-    for j, word in enumerate(
-            range((NUM_WRITES - 1) * MEMORY_BYTES // bytes_per_word,
-                  NUM_WRITES * MEMORY_BYTES // bytes_per_word)):
-        address = (bytes_per_word * j + MEMORY_START) % MEMORY_BYTES
-        expected[address:address+bytes_per_word] = (
-            array.array('B', struct.pack('<Q', word)))
-
-    assert tb.memory._data == expected, \
+    # The last write fills the memory with consecutive words, starting at
+    # MEMORY_START, which the memory maps to MEMORY_START % MEMORY_BYTES.
+    expected = np.arange((NUM_WRITES - 1) * MEMORY_BYTES // bytes_per_word,
+                         NUM_WRITES * MEMORY_BYTES // bytes_per_word,
+                         dtype='<u8')
+    expected = np.roll(expected.view('uint8'), MEMORY_START % MEMORY_BYTES)
+
+    assert np.array_equal(tb.memory.read(0, MEMORY_BYTES), expected), \
         'memory contents do not match'
 
 
@@ -1,37 +1,115 @@
 #
-# Copyright (C) 2022-2023 Daniel Estevez <daniel@destevez.net>
+# Copyright (C) 2022-2024 Daniel Estevez <daniel@destevez.net>
 #
 # This file is part of maia-sdr
 #
 # SPDX-License-Identifier: MIT
 #
 
-import array
+import numpy as np
 
 
 class Memory:
-    def __init__(self, size):
-        self._data = array.array('B', [0] * size)
+    """Sparse memory model for the AXI subordinate
 
-    @property
-    def _len(self):
-        return len(self._data)
+    The contents of the memory are stored in NumPy arrays of ``page_size``
+    bytes, which are allocated the first time that they are written. This
+    allows modelling large address ranges, such as the full DDR range used
+    by the recorder, while only using host memory for the data that is
+    actually written. Pages that have never been written read as zeros.
+
+    Addresses wrap around modulo ``size``, so a memory smaller than the
+    address space can be used as a window onto it.
+
+    Parameters
+    ----------
+    size : int
+        Size of the address space in bytes.
+    page_size : int
+        Size of each page in bytes.
+    """
+    def __init__(self, size=2**32, page_size=2**20):
+        self.size = size
+        self.page_size = min(page_size, size)
+        self._pages = {}
+
+    def read(self, address, length):
+        """Reads a range of the memory
+
+        If the range lies within a single page that has been written, a
+        view into the page is returned without copying the data, so it
+        reflects later writes. Otherwise, the returned array is a copy.
+
+        Parameters
+        ----------
+        address : int
+            Start address.
+        length : int
+            Length in bytes.
+
+        Returns
+        -------
+        numpy.ndarray
+            The contents of the memory, as ``uint8``.
+        """
+        chunks = list(self._chunks(address, length))
+        if len(chunks) == 1 and chunks[0][0] in self._pages:
+            page, offset, start, stop = chunks[0]
+            return self._pages[page][offset:offset + stop - start]
+        data = np.zeros(length, 'uint8')
+        for page, offset, start, stop in chunks:
+            if page in self._pages:
+                data[start:stop] = (
+                    self._pages[page][offset:offset + stop - start])
+        return data
+
+    def write(self, address, data):
+        """Writes a range of the memory
+
+        Parameters
+        ----------
+        address : int
+            Start address.
+        data : Union[numpy.ndarray, bytes-like]
+            Data to write. A NumPy array of any dtype is written using its
+            bytes in memory order.
+        """
+        if isinstance(data, np.ndarray):
+            data = np.ascontiguousarray(data).reshape(-1).view('uint8')
+        else:
+            data = np.frombuffer(data, 'uint8')
+        for page, offset, start, stop in self._chunks(address, data.size):
+            if page not in self._pages:
+                self._pages[page] = np.zeros(self._page_length(page), 'uint8')
+            self._pages[page][offset:offset + stop - start] = data[start:stop]
 
     def __getitem__(self, key):
         if isinstance(key, int):
-            return self._data[key % self._len]
+            return int(self.read(key, 1)[0])
         if isinstance(key, slice):
-            return self._data[
-                key.start % self._len:key.stop % self._len]
+            return self.read(key.start, key.stop - key.start)
         raise ValueError('unsupported key')
 
     def __setitem__(self, key, value):
         if isinstance(key, int):
-            self._data[key % self._len] = value
+            self.write(key, np.array([value], 'uint8'))
             return
         if isinstance(key, slice):
-            a = key.start % self._len
-            self._data[
-                a:(key.stop - key.start) + a] = value
+            self.write(key.start, value)
             return
         raise ValueError('unsupported key')
+
+    def _page_length(self, page):
+        return min(self.page_size, self.size - page * self.page_size)
+
+    def _chunks(self, address, length):
+        # Splits an access into pieces that lie within a page. Each piece is
+        # given as (page, offset in page, start in data, stop in data).
+        address %= self.size
+        start = 0
+        while start < length:
+            page, offset = divmod(address, self.page_size)
+            stop = min(length, start + self._page_length(page) - offset)
+            yield page, offset, start, stop
+            address = (address + stop - start) % self.size
+            start = stop
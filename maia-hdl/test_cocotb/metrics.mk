@@ -0,0 +1,7 @@
+# Simulation throughput metrics
+#
+# The simulator is run through metrics.py, which writes the metrics of each
+# test to metrics.jsonl, or appends them to the file given by the
+# MAIA_HDL_SIM_METRICS environment variable. The clock periods are published
+# by the tests, which start their clocks with clocks.start_clock.
+SIM_CMD_PREFIX += python3 $(PWD)/../metrics.py --
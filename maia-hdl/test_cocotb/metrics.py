@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2024 Daniel Estevez <daniel@destevez.net>
+#
+# This file is part of maia-sdr
+#
+# SPDX-License-Identifier: MIT
+#
+
+"""Simulation throughput metrics of the cocotb tests
+
+This script is used as a prefix of the simulator command (see metrics.mk)::
+
+    python3 metrics.py -- COMMAND ...
+
+It runs the simulator, and then writes the metrics of each test, taken
+from the cocotb results file, in the JSON Lines format used by the Amaranth
+tests (see test/sim_metrics.py). The metrics are appended to the file given
+by the MAIA_HDL_SIM_METRICS environment variable or, if it is not set,
+written to metrics.jsonl.
+
+The tests start their clocks with ``clocks.start_clock``, which publishes
+the clock periods in a file given to the simulator by this script. The
+number of cycles of each clock is the number of rising edges in the
+simulated time of the test, counted with ``maia_hdl.util.rising_edges`` as
+for the Amaranth tests. All the tests of a directory run in the same
+simulator process, so their peak RSS is that of the whole run.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import xml.etree.ElementTree as ET
+
+from maia_hdl.util import rising_edges
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Run a cocotb simulation and record its metrics')
+    parser.add_argument(
+        'command', nargs=argparse.REMAINDER,
+        help='Simulator command')
+    args = parser.parse_args()
+    if args.command[:1] == ['--']:
+        del args.command[0]
+    return args
+
+
+def test_metrics(results, clocks, peak_rss):
+    """Computes the metrics of each test in a cocotb results file"""
+    timestamp = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    for testcase in ET.parse(results).iter('testcase'):
+        wall_time = float(testcase.get('time'))
+        sim_time = float(testcase.get('sim_time_ns'))
+        cycles = {signal: rising_edges(sim_time, period)
+                  for signal, period in clocks.items()}
+        yield {
+            'test': f'{testcase.get("classname")}.{testcase.get("name")}',
+            'timestamp': timestamp,
+            'wall_time_s': wall_time,
+            'sim_time_ns': sim_time,
+            'cycles': cycles,
+            'cycles_per_second': {
+                signal: n / wall_time if wall_time > 0 else None
+                for signal, n in cycles.items()},
+            'peak_rss_bytes': peak_rss,
+        }
+
+
+def read_clocks(path):
+    """Reads the clocks published by the tests"""
+    clocks = {}
+    with open(path) as f:
+        for line in f:
+            clock = json.loads(line)
+            signal, period = clock['signal'], float(clock['period_ns'])
+            if clocks.setdefault(signal, period) != period:
+                raise ValueError(
+                    f'clock {signal} started with periods {clocks[signal]} '
+                    f'and {period} ns')
+    return clocks
+
+
+def main():
+    args = parse_args()
+    with tempfile.NamedTemporaryFile(suffix='.jsonl') as clocks_file:
+        env = dict(os.environ, MAIA_HDL_SIM_CLOCKS=clocks_file.name)
+        returncode = subprocess.run(args.command, env=env).returncode
+        clocks = read_clocks(clocks_file.name)
+    # ru_maxrss is given in KiB on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+    results = os.environ.get('COCOTB_RESULTS_FILE', 'results.xml')
+    if os.path.exists(results):
+        output = os.environ.get('MAIA_HDL_SIM_METRICS')
+        mode = 'a' if output else 'w'
+        with open(output or 'metrics.jsonl', mode) as f:
+            for metrics in test_metrics(results, clocks, peak_rss):
+                f.write(json.dumps(metrics) + '\n')
+    return returncode
+
+
+if __name__ == '__main__':
+    sys.exit(main())
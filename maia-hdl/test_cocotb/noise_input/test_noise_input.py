@@ -7,11 +7,13 @@
 #
 
 import cocotb
-from cocotb.clock import Clock
 from cocotb.triggers import ClockCycles, RisingEdge
 from cocotb_bus.drivers.amba import AXI4LiteMaster
 
-import numpy as np
+from clocks import start_clock
+from sources import SampleSource, awgn, cw
+
+NUM_SAMPLES = 20000
 
 
 class TB:
@@ -36,11 +38,11 @@ async def test_noise_input(dut):
     dut.ARADDR.value = 0
     dut.ARPROT.value = 0
     dut.RREADY.value = 0
-    cocotb.start_soon(Clock(dut.sampling_clk, 16, units='ns').start())
-    cocotb.start_soon(Clock(dut.clk, 12, units='ns').start())
-    cocotb.start_soon(Clock(dut.clk2x_clk, 6, units='ns').start())
-    cocotb.start_soon(Clock(dut.clk3x_clk, 4, units='ns').start())
-    cocotb.start_soon(Clock(dut.s_axi_lite_clk, 10, units='ns').start())
+    start_clock(dut, 'sampling_clk', 16)
+    start_clock(dut, 'clk', 12)
+    start_clock(dut, 'clk2x_clk', 6)
+    start_clock(dut, 'clk3x_clk', 4)
+    start_clock(dut, 's_axi_lite_clk', 10)
     await ClockCycles(dut.s_axi_lite_clk, 4)
     tb = TB(dut)
     dut.s_axi_lite_rst.value = 0
@@ -51,21 +53,11 @@ async def test_noise_input(dut):
     await ClockCycles(dut.s_axi_lite_clk, 20)
     assert dut.rst.value == 0
 
-    scale = 1024
-    mask = 2**12 - 1
-    rising = RisingEdge(dut.sampling_clk)
     cw_tone = False  # change to True to use CW tone instead of AWGN
     if cw_tone:
-        phase = 0
-        freq = 0.02
-    for _ in range(20000):
-        if cw_tone:
-            x = np.exp(1j*2*np.pi*phase)
-            phase = (phase + freq) % 1
-            re = np.round(x.real * (2**11 - 1))
-            im = np.round(x.imag * (2**11 - 1))
-        else:
-            re, im = np.round(np.random.randn(2) * scale)
-        dut.re_in.value = int(re) & mask
-        dut.im_in.value = int(im) & mask
-        await rising
+        blocks = cw(0.02, 2**11 - 1)
+    else:
+        blocks = awgn(1024)
+    source = SampleSource(dut.re_in, dut.im_in, dut.sampling_clk, blocks, 12,
+                          capacity=NUM_SAMPLES)
+    await source.run(NUM_SAMPLES)
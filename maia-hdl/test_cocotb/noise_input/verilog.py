@@ -12,14 +12,20 @@ from amaranth.back.verilog import convert
 
 from maia_hdl.maia_sdr import MaiaSDR
 from maia_hdl.pluto_platform import PlutoPlatform
+from maia_hdl.verilog_cache import argument_parser, write_verilog
 
 
 def main():
-    dut = MaiaSDR()
-    with open('dut.v', 'w') as f:
-        f.write(convert(
+    args = argument_parser().parse_args()
+
+    def generate():
+        dut = MaiaSDR()
+        return convert(
             dut, name='dut', ports=dut.ports(), emit_src=False,
-            platform=PlutoPlatform()))
+            platform=PlutoPlatform())
+
+    write_verilog('dut.v', generate, key={'name': 'dut'},
+                  modules=['__main__'], cache=args.cache)
 
 
 if __name__ == '__main__':
@@ -7,7 +7,6 @@
 #
 
 import array
-import random
 import math
 import struct
 
@@ -18,9 +17,10 @@ from cocotb_bus.drivers import BitDriver
 
 from axi import AXI4Slave
 from backpressure import RandomReady
+from clocks import start_clock
 from memory import Memory
+from sources import SampleSource, uniform
 
-from cocotb.clock import Clock
 from cocotb.triggers import ClockCycles, RisingEdge
 from cocotb.regression import TestFactory
 
@@ -32,23 +32,12 @@ MEMORY_BYTES = MEMORY_END - MEMORY_START
 class RecorderTB:
     def __init__(self, dut):
         self.dut = dut
-        self.memory = Memory(MEMORY_BYTES)
+        self.memory = Memory()
         self.subordinate = AXI4Slave(dut, None, dut.clk, self.memory)
         self.backpressure = BitDriver(dut.WREADY, dut.clk)
-
-
-async def iq_data(dut, sample_stream):
-    n = 0
-    rising = RisingEdge(dut.iq_clk)
-    while True:
-        await rising
-        dut.strobe_in.value = 1
-        dut.re_in.value = re = random.randrange(-2**15, 2**15)
-        dut.im_in.value = im = random.randrange(-2**15, 2**15)
-        sample_stream.append((re, im))
-        await rising
-        dut.strobe_in.value = 0
-        await rising
+        self.source = SampleSource(
+            dut.re_in, dut.im_in, dut.iq_clk, uniform(16), 16,
+            strobe=dut.strobe_in, period=3)
 
 
 async def start(dut):
@@ -75,45 +64,64 @@ async def wait_finished(dut):
             return
 
 
-def check_output(tb, sample_stream):
-    written = tb.memory._data[:tb.dut.next_address.value]
-    sample_re = np.array([a[0] for a in sample_stream])
-    sample_im = np.array([a[1] for a in sample_stream])
-    if tb.dut.mode.value == 0:  # 16 bit
-        re = np.array(written, 'uint8').view('int16')[::2]
-        im = np.array(written, 'uint8').view('int16')[1::2]
-    elif tb.dut.mode.value == 2:  # 8 bit
-        re = np.array(written[::2], 'int8').astype('int16') << 8
-        im = np.array(written[1::2], 'int8').astype('int16') << 8
-        sample_re = sample_re >> 8 << 8
-        sample_im = sample_im >> 8 << 8
-    elif tb.dut.mode.value == 1:  # 12 bit
-        L = len(written) // 3 * 3
-        re = ((np.array(written[:L:3], 'int8').astype('int16') << 4)
-              | (np.array(written[1:L:3], 'uint8').astype('int16') >> 4))
-        im = (((np.array(written[1:L:3], 'uint8') << 4).view('int8')
-               .astype('int16') << 4)
-              | np.array(written[2:L:3], 'uint8'))
-        re <<= 4
-        im <<= 4
-        sample_re = sample_re >> 4 << 4
-        sample_im = sample_im >> 4 << 4
-    else:
-        raise ValueError('invalid mode')
-    for j in range(sample_re.size - re.size):
-        if sample_re[j] == re[0]:
-            re_match = np.array_equal(sample_re[j:][:re.size], re)
-            im_match = np.array_equal(sample_im[j:][:re.size], im)
-            if re_match and im_match:
-                break
+def unpack_iq(data, mode):
+    """Unpacks the IQ samples written by the recorder
+
+    The samples are returned as int16 arrays aligned to the MSB, so that
+    they can be compared with the 16-bit input samples after truncating
+    the LSBs that are discarded by the recording mode.
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+        Recording, as uint8.
+    mode : int
+        Recording mode (0: 16 bit, 1: 12 bit, 2: 8 bit).
+
+    Returns
+    -------
+    (re, im, lsbs)
+        The real and imaginary parts, and the number of discarded LSBs.
+    """
+    if mode == 0:  # 16 bit
+        iq = data[:data.size // 4 * 4].view('<i2')
+        return iq[::2], iq[1::2], 0
+    if mode == 2:  # 8 bit
+        iq = data[:data.size // 2 * 2].view('int8').astype('int16') << 8
+        return iq[::2], iq[1::2], 8
+    if mode == 1:  # 12 bit
+        b = data[:data.size // 3 * 3].reshape(-1, 3)
+        re = ((b[:, 0].view('int8').astype('int16') << 4)
+              | (b[:, 1] >> 4).astype('int16'))
+        im = (((b[:, 1] << 4).view('int8').astype('int16') << 4)
+              | b[:, 2].astype('int16'))
+        return re << 4, im << 4, 4
+    raise ValueError('invalid mode')
+
+
+def check_output(tb):
+    length = int(tb.dut.next_address.value) - MEMORY_START
+    written = tb.memory.read(MEMORY_START, length)
+    re, im, lsbs = unpack_iq(written, int(tb.dut.mode.value))
+    samples = tb.source.recorded
+    sample_re = samples[:, 0] >> lsbs << lsbs
+    sample_im = samples[:, 1] >> lsbs << lsbs
+    # Find the offset of the recording in the sample stream, checking only
+    # the candidates whose first sample matches.
+    last = sample_re.size - re.size
+    candidates = np.flatnonzero(
+        (sample_re[:last + 1] == re[0]) & (sample_im[:last + 1] == im[0]))
+    for j in candidates:
+        if (np.array_equal(sample_re[j:j + re.size], re)
+                and np.array_equal(sample_im[j:j + re.size], im)):
+            break
     else:
-        raise Exception('unable to find match in sample_stream')
+        raise Exception('unable to find match in sample stream')
 
 
 async def run_test(dut, backpressure_inserter=None):
-    sample_stream = []
-    cocotb.start_soon(Clock(dut.clk, 10, units='ns').start())
-    cocotb.start_soon(Clock(dut.iq_clk, 12, units='ns').start())
+    start_clock(dut, 'clk', 10)
+    start_clock(dut, 'iq_clk', 12)
     dut.rst.value = 1
     dut.iq_rst.value = 1
     dut.start.value = 0
@@ -128,32 +136,32 @@ async def run_test(dut, backpressure_inserter=None):
     if backpressure_inserter:
         tb.backpressure.start(backpressure_inserter())
 
-    cocotb.start_soon(iq_data(dut, sample_stream))
+    tb.source.start()
 
     await ClockCycles(dut.clk, 10)
-    del sample_stream[:]
+    tb.source.clear()
     await start(dut)
     await wait_finished(dut)
     assert dut.next_address.value == MEMORY_END
     await ClockCycles(dut.clk, 20)
     assert dut.dropped_samples.value == 0
-    check_output(tb, sample_stream)
+    check_output(tb)
 
     await ClockCycles(dut.clk, 100)
     dut.mode.value = 1  # 12 bit
     await ClockCycles(dut.clk, 20)
-    del sample_stream[:]
+    tb.source.clear()
     await start(dut)
     await wait_finished(dut)
     assert dut.next_address.value.integer == MEMORY_END
     await ClockCycles(dut.clk, 20)
     assert dut.dropped_samples.value == 0
-    check_output(tb, sample_stream)
+    check_output(tb)
 
     await ClockCycles(dut.clk, 100)
     dut.mode.value = 2  # 8 bit
     await ClockCycles(dut.clk, 20)
-    del sample_stream[:]
+    tb.source.clear()
     await start(dut)
     await ClockCycles(dut.clk, 1000)
     await stop(dut)
@@ -161,7 +169,7 @@ async def run_test(dut, backpressure_inserter=None):
     assert dut.next_address.value.integer < MEMORY_END
     await ClockCycles(dut.clk, 20)
     assert dut.dropped_samples.value == 0
-    check_output(tb, sample_stream)
+    check_output(tb)
 
 
 factory = TestFactory(run_test)
@@ -11,15 +11,20 @@ from amaranth import *
 from amaranth.back.verilog import convert
 
 from maia_hdl.recorder import Recorder16IQ
+from maia_hdl.verilog_cache import argument_parser, write_verilog
 
 
 def main():
-    m = Recorder16IQ(0x00000000, 0x00001000,
-                     domain_in='iq', domain_dma='sync')
-    with open('dut.v', 'w') as f:
-        f.write('`timescale 1ps/1ps\n')
-        f.write(convert(
-            m, name='dut', ports=m.ports(), emit_src=False))
+    args = argument_parser().parse_args()
+
+    def generate():
+        m = Recorder16IQ(0x00000000, 0x00001000,
+                         domain_in='iq', domain_dma='sync')
+        return '`timescale 1ps/1ps\n' + convert(
+            m, name='dut', ports=m.ports(), emit_src=False)
+
+    write_verilog('dut.v', generate, key={'name': 'dut'},
+                  modules=['__main__'], cache=args.cache)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,264 @@
+#
+# Copyright (C) 2024 Daniel Estevez <daniel@destevez.net>
+#
+# This file is part of maia-sdr
+#
+# SPDX-License-Identifier: MIT
+#
+
+import itertools
+
+import numpy as np
+
+import cocotb
+from cocotb.triggers import ClockCycles, RisingEdge
+
+
+class SampleSource:
+    """IQ sample source driver
+
+    The samples are generated in blocks with NumPy, quantized to the width
+    of the ports and converted to Python integers in bulk, so that driving
+    each sample only involves assigning the ports and waiting for the
+    clock. The samples that are sent are recorded in a preallocated array.
+
+    Parameters
+    ----------
+    re : SimHandle
+        Real part input port.
+    im : SimHandle
+        Imaginary part input port.
+    clock : SimHandle
+        Clock.
+    blocks : Iterable[numpy.ndarray]
+        Complex sample blocks, such as those produced by ``awgn``, ``cw``,
+        ``chirp``, ``uniform`` or ``playback``. The samples are rounded and
+        saturated to ``width`` bits.
+    width : int
+        Width of the ports.
+    strobe : Optional[SimHandle]
+        Strobe input port. If present, it is asserted in the first cycle of
+        each sample.
+    period : int
+        Number of clock cycles per sample.
+    capacity : int
+        Maximum number of samples that are recorded between calls to
+        ``clear``.
+
+    Attributes
+    ----------
+    recorded : numpy.ndarray
+        Samples sent since the last call to ``clear``, as an array of
+        shape ``(n, 2)`` containing the real and imaginary parts.
+    """
+    def __init__(self, re, im, clock, blocks, width, strobe=None, period=1,
+                 capacity=2**20):
+        self.re = re
+        self.im = im
+        self.clock = clock
+        self.blocks = iter(blocks)
+        self.width = width
+        self.strobe = strobe
+        self.period = period
+        self._record = np.empty((capacity, 2), 'int32')
+        # Sample counts since the beginning of the stream: recorded samples
+        # start at _start, _sent samples have been sent to the DUT and
+        # _generated samples have been stored in _record.
+        self._start = 0
+        self._sent = 0
+        self._generated = 0
+
+    @property
+    def recorded(self):
+        return self._record[:self._sent - self._start]
+
+    def clear(self):
+        """Discards the recorded samples"""
+        # The samples of the current block that have not been sent yet
+        # are moved to the beginning of the record.
+        pending = self._record[
+            self._sent - self._start:self._generated - self._start].copy()
+        self._record[:len(pending)] = pending
+        self._start = self._sent
+
+    def start(self, count=None):
+        """Starts sending samples in the background
+
+        Returns the cocotb task that sends the samples. See ``run``.
+        """
+        return cocotb.start_soon(self.run(count))
+
+    async def run(self, count=None):
+        """Sends samples
+
+        Parameters
+        ----------
+        count : Optional[int]
+            Number of samples to send. By default, the samples are sent until
+            the blocks are exhausted.
+        """
+        rising = RisingEdge(self.clock)
+        if self.period > 2:
+            idle = ClockCycles(self.clock, self.period - 2)
+        # Samples generated but not sent by a previous call are discarded
+        self._generated = self._sent
+        sent = 0
+        while count is None or sent < count:
+            block = self._next_block(None if count is None else count - sent)
+            if block is None:
+                return
+            re, im = block
+            if self.strobe is None and self.period == 1:
+                for r, i in zip(re, im):
+                    self.re.value = r
+                    self.im.value = i
+                    self._sent += 1
+                    await rising
+            else:
+                for r, i in zip(re, im):
+                    await rising
+                    if self.strobe is not None:
+                        self.strobe.value = 1
+                    self.re.value = r
+                    self.im.value = i
+                    self._sent += 1
+                    if self.period > 1:
+                        await rising
+                        if self.strobe is not None:
+                            self.strobe.value = 0
+                        if self.period > 2:
+                            await idle
+            sent += len(re)
+
+    def _next_block(self, limit=None):
+        # Generates the next block, truncated to limit samples, records it
+        # and returns the port values as lists of integers.
+        block = next(self.blocks, None)
+        if block is None:
+            return None
+        block = block[:limit]
+        top = 2**(self.width - 1)
+        iq = np.empty((block.size, 2), 'int64')
+        np.clip(np.round(block.real), -top, top - 1, out=iq[:, 0],
+                casting='unsafe')
+        np.clip(np.round(block.imag), -top, top - 1, out=iq[:, 1],
+                casting='unsafe')
+        offset = self._generated - self._start
+        if offset + block.size > self._record.shape[0]:
+            raise RuntimeError('sample record capacity exceeded')
+        self._record[offset:offset + block.size] = iq
+        self._generated += block.size
+        iq &= 2**self.width - 1
+        return iq[:, 0].tolist(), iq[:, 1].tolist()
+
+
+def awgn(scale, block_size=4096, rng=None):
+    """Complex white Gaussian noise
+
+    Parameters
+    ----------
+    scale : float
+        Standard deviation of the real and imaginary parts.
+    block_size : int
+        Number of samples in each block.
+    rng : Optional[numpy.random.Generator]
+        Random number generator.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    while True:
+        yield scale * (rng.standard_normal(block_size)
+                       + 1j * rng.standard_normal(block_size))
+
+
+def uniform(width, block_size=4096, rng=None):
+    """Samples with real and imaginary parts uniformly distributed
+
+    The real and imaginary parts are integers uniformly distributed over
+    the range of a ``width`` bit signed integer.
+
+    Parameters
+    ----------
+    width : int
+        Width of the samples.
+    block_size : int
+        Number of samples in each block.
+    rng : Optional[numpy.random.Generator]
+        Random number generator.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    top = 2**(width - 1)
+    while True:
+        x = rng.integers(-top, top, (2, block_size))
+        yield x[0] + 1j * x[1]
+
+
+def cw(frequency, amplitude, block_size=4096):
+    """CW tone
+
+    Parameters
+    ----------
+    frequency : float
+        Frequency in cycles per sample.
+    amplitude : float
+        Amplitude.
+    block_size : int
+        Number of samples in each block.
+    """
+    n = np.arange(block_size)
+    for start in itertools.count(0, block_size):
+        # The phase is reduced modulo 1 to keep its precision.
+        phase = (frequency * (start + n)) % 1
+        yield amplitude * np.exp(2j * np.pi * phase)
+
+
+def chirp(f0, f1, length, amplitude, block_size=4096):
+    """Linear chirp
+
+    The frequency goes linearly from ``f0`` to ``f1`` in ``length`` samples,
+    and then the chirp is repeated.
+
+    Parameters
+    ----------
+    f0 : float
+        Start frequency in cycles per sample.
+    f1 : float
+        End frequency in cycles per sample.
+    length : int
+        Length of the chirp in samples.
+    amplitude : float
+        Amplitude.
+    block_size : int
+        Number of samples in each block.
+    """
+    n = np.arange(length)
+    phase = (f0 * n + 0.5 * (f1 - f0) / length * n**2) % 1
+    chirp = amplitude * np.exp(2j * np.pi * phase)
+    for start in itertools.count(0, block_size):
+        yield chirp[(start + np.arange(block_size)) % length]
+
+
+def playback(path, dtype='int16', block_size=4096, repeat=False):
+    """Samples read from a file
+
+    The file contains interleaved real and imaginary parts, as in the
+    ``.cs16`` files produced by the Maia SDR recorder.
+
+    Parameters
+    ----------
+    path : str
+        Path of the file.
+    dtype : str
+        Data type of the real and imaginary parts.
+    block_size : int
+        Number of samples in each block.
+    repeat : bool
+        Play the file in a loop.
+    """
+    x = np.fromfile(path, dtype).astype('float')
+    x = x[:x.size // 2 * 2]
+    x = x[::2] + 1j * x[1::2]
+    while True:
+        for start in range(0, x.size, block_size):
+            yield x[start:start + block_size]
+        if not repeat:
+            return